@@ -0,0 +1,82 @@
+"""Micro-benchmark of the link resolution done for every anchor:
+compares the pydantic based helpers of utils (is_valid_url,
+is_external, is_relative_to_base) with UrlCanonicalizer, with a cold
+and a warm cache.
+
+Usage: python benchmarks/bench_canonical.py [--rounds 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'webcrawler'))
+
+from pydantic import HttpUrl
+from canonical import UrlCanonicalizer
+from parsing import extract_links
+import utils
+
+BASE_URL = 'https://google.com'
+
+
+def load_links() -> list[tuple[str, str]]:
+    """Retrieves (href, page url) pairs from the samples and from a set
+    of synthetic pages with relative, absolute and external links"""
+    links: list[tuple[str, str]] = []
+    sample = os.path.join(ROOT, 'tests', 'samples', 'google.html')
+    with open(sample, 'rb') as f:
+        for href in extract_links(f.read()):
+            if href:
+                links.append((href, f'{BASE_URL}/'))
+    for page in range(200):
+        pageUrl = f'{BASE_URL}/section/{page % 10}/page/{page}'
+        for i in range(50):
+            links.append((f'/section/{i % 10}/page/{i}', pageUrl))
+            links.append((f'item-{i}?ref=page{page}#top', pageUrl))
+            links.append((f'https://www.google.com/search?q={i}', pageUrl))
+            links.append((f'https://external{i % 5}.example.com/x', pageUrl))
+    return links
+
+
+def legacy(links: list[tuple[str, str]]) -> None:
+    base = HttpUrl(BASE_URL)
+    for href, _ in links:
+        newLink = utils.is_valid_url(href)
+        if newLink:
+            utils.is_external(newLink, base)
+        else:
+            utils.is_relative_to_base(href, base)
+
+
+def canonical(canonicalizer: UrlCanonicalizer, links: list[tuple[str, str]]) -> None:
+    for href, pageUrl in links:
+        canonicalizer.resolve(href, pageUrl)
+
+
+def timeit(func, *args) -> float:
+    t1 = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - t1
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Link canonicalization benchmark')
+    argparser.add_argument('--rounds', type=int, default=5)
+    args = argparser.parse_args()
+    links = load_links()
+    print(f'{len(links)} links')
+    results: dict[str, float] = {'utils': 0.0, 'canonical (cold)': 0.0, 'canonical (warm)': 0.0}
+    for _ in range(args.rounds):
+        results['utils'] += timeit(legacy, links)
+        canonicalizer = UrlCanonicalizer(BASE_URL)
+        results['canonical (cold)'] += timeit(canonical, canonicalizer, links)
+        results['canonical (warm)'] += timeit(canonical, canonicalizer, links)
+    for name, elapsed in results.items():
+        rate = len(links) * args.rounds / elapsed
+        print(f'{name:>18}: {rate:12.0f} links/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""Reproducible crawl benchmark: runs the crawler against a local
+synthetic website (see synthetic_site.py) for each combination of
+max_producers / max_consumers / max_pages_in_mem and reports pages/s,
+p50/p99 fetch latency and peak RSS. Each configuration runs in its own
+process, so the peak RSS is not shared between the configurations.
+
+The results can be stored as a baseline and the next runs compared
+with it: the exit code is 1 when a configuration regresses more than
+the tolerance.
+
+Usage:
+    python benchmarks/bench_crawl.py --save-baseline
+    python benchmarks/bench_crawl.py --compare
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'webcrawler'))
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_site import SiteConfig, serve
+
+BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def crawl_once(baseUrl: str, producers: int, consumers: int, pagesInMem: int) -> dict:
+    from pydantic import HttpUrl
+    from frontier import Frontier
+    from network.httpmanager import HttpManager
+    from taskmanager import TaskManager
+
+    url = HttpUrl(baseUrl)
+    httpmgr = HttpManager(url)
+    latencies: list[float] = []
+    fetch = httpmgr.fetch
+
+    async def timed_fetch(link):
+        t1 = time.perf_counter()
+        try:
+            return await fetch(link)
+        finally:
+            latencies.append(time.perf_counter() - t1)
+    httpmgr.fetch = timed_fetch
+
+    frontier = Frontier(max_per_host=producers, robots_fetcher=httpmgr.fetch_robots)
+    taskMgr = TaskManager(url, httpmgr=httpmgr, frontier=frontier,
+                          max_producers=producers, max_consumers=consumers,
+                          max_pages_in_mem=pagesInMem)
+    t1 = time.perf_counter()
+    await taskMgr.crawl()
+    elapsed = time.perf_counter() - t1
+    return {'pages': len(latencies),
+            'parsed': taskMgr.get_num_html_pages(),
+            'elapsed': elapsed,
+            'pages_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def run_one(args) -> None:
+    logging.disable(logging.CRITICAL)
+    # the jitter of the retry back-off decides when the crawl ends
+    random.seed(args.seed)
+    result = asyncio.run(crawl_once(args.base_url, args.producers, args.consumers,
+                                    args.pages_in_mem))
+    print(json.dumps(result))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f'synthetic site not listening on port {port}')
+
+
+def config_key(producers: int, consumers: int, pagesInMem: int) -> str:
+    return f'p{producers}-c{consumers}-m{pagesInMem}'
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Retrieves the configurations slower than the baseline"""
+    regressions: list[str] = []
+    for key, result in results.items():
+        base = baseline.get('results', {}).get(key)
+        if not base:
+            continue
+        if result['pages_per_sec'] < base['pages_per_sec'] * (1 - tolerance):
+            regressions.append(f'{key}: pages/s {result["pages_per_sec"]:.1f} '
+                               f'< baseline {base["pages_per_sec"]:.1f}')
+        if result['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            regressions.append(f'{key}: p99 {result["p99_ms"]:.1f} ms '
+                               f'> baseline {base["p99_ms"]:.1f} ms')
+    return regressions
+
+
+def parse_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(',')]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Crawl benchmark on a synthetic website')
+    argparser.add_argument('--producers', type=str, default='1,4,8')
+    argparser.add_argument('--consumers', type=str, default='1,2')
+    argparser.add_argument('--pages-in-mem', type=str, default='1,8')
+    argparser.add_argument('--pages', type=int, default=500)
+    argparser.add_argument('--fanout', type=int, default=20)
+    argparser.add_argument('--page-size', type=int, default=20_000)
+    argparser.add_argument('--latency', type=str, default='lognormal:0.01:0.5')
+    argparser.add_argument('--error-rate', type=float, default=0.02)
+    argparser.add_argument('--redirect-rate', type=float, default=0.05)
+    argparser.add_argument('--redirect-chain', type=int, default=2)
+    argparser.add_argument('--seed', type=int, default=1)
+    argparser.add_argument('--save-baseline', action='store_true')
+    argparser.add_argument('--compare', action='store_true')
+    argparser.add_argument('--tolerance', type=float, default=0.2)
+    argparser.add_argument('--baseline', type=str, default=BASELINE)
+    # internal: run a single configuration against a running site
+    argparser.add_argument('--run-one', action='store_true', help=argparse.SUPPRESS)
+    argparser.add_argument('--base-url', type=str, help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+
+    if args.run_one:
+        args.producers, args.consumers, args.pages_in_mem = (
+            int(args.producers), int(args.consumers), int(args.pages_in_mem))
+        run_one(args)
+        return
+
+    site = SiteConfig(args.pages, args.fanout, args.page_size, args.latency,
+                      args.error_rate, args.redirect_rate, args.redirect_chain, args.seed)
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(site, port), daemon=True)
+    server.start()
+    results: dict[str, dict] = {}
+    try:
+        wait_for_port(port)
+        baseUrl = f'http://127.0.0.1:{port}/'
+        print(f'site: {site.as_dict()}')
+        print(f'{"config":>14} {"pages":>6} {"pages/s":>9} {"p50 ms":>8} {"p99 ms":>8} {"RSS MB":>8}')
+        for producers, consumers, pagesInMem in itertools.product(
+                parse_list(args.producers), parse_list(args.consumers),
+                parse_list(args.pages_in_mem)):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-one',
+                                     '--base-url', baseUrl,
+                                     '--producers', str(producers),
+                                     '--consumers', str(consumers),
+                                     '--pages-in-mem', str(pagesInMem),
+                                     '--seed', str(args.seed)],
+                                    capture_output=True, text=True, check=True)
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            key = config_key(producers, consumers, pagesInMem)
+            results[key] = result
+            print(f'{key:>14} {result["pages"]:>6} {result["pages_per_sec"]:>9.1f} '
+                  f'{result["p50_ms"]:>8.1f} {result["p99_ms"]:>8.1f} {result["peak_rss_mb"]:>8.1f}')
+    finally:
+        server.terminate()
+        server.join()
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'site': site.as_dict(), 'results': results}, f, indent=2)
+        print(f'baseline saved in {args.baseline}')
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('site') != site.as_dict():
+            print('WARNING: the baseline has been recorded with a different site')
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
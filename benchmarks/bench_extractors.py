@@ -0,0 +1,93 @@
+"""Benchmark of the link-extractor engines: measures the throughput
+(MiB/s and pages/s) of each engine on the samples of tests/samples and
+on large synthetic pages, and its agreement with the DOM engine (the
+reference for the extended engines), so the cheapest engine still
+correct for a deployment can be chosen.
+
+Usage: python benchmarks/bench_extractors.py [--pages 50] [--links 2000]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'webcrawler'))
+
+from parsing import EXTRACTORS, LinkExtractor, get_extractor
+
+
+def build_page(idx: int, links: int) -> bytes:
+    """Builds a synthetic html page mixing every kind of link with
+    scripts, comments and text"""
+    head = (f'<head><title>Page {idx}</title><link rel="stylesheet" href="/style.css">'
+            f'<link rel="next" href="/page/{idx + 1}"><script>var a = "<a href=x>";</script>'
+            f'<style>a {{ color: red }}</style></head>')
+    items = []
+    for i in range(links):
+        kind = i % 10
+        if kind == 7:
+            items.append(f'<img alt="{i}" srcset="/img/{i}.jpg 1x, /img/{i}@2x.jpg 2x">')
+        elif kind == 8:
+            items.append(f'<!-- <a href="/old/{i}">old</a> -->')
+        elif kind == 9:
+            items.append(f'<map><area shape="rect" href="/area/{i}"></map>')
+        elif kind == 6:
+            items.append(f'<div class="item"><p>Item {i} of page {idx} &amp; more</p>'
+                         f'<a class="link" href="/page/{idx}/item/{i}?a=1&amp;b={i}">item {i}</a></div>')
+        else:
+            items.append(f'<div class="item"><p>Item {i} of page {idx}</p>'
+                         f'<a href="/page/{idx}/item/{i}" class="link">item {i}</a></div>')
+    return f'<html>{head}<body>{"".join(items)}<iframe src="/frame/{idx}"></iframe></body></html>'.encode()
+
+
+def load_samples() -> list[bytes]:
+    pages = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'tests', 'samples', '*.html'))):
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    return pages
+
+
+def measure(extractor: LinkExtractor, pages: list[bytes], rounds: int) -> tuple[float, int]:
+    """Retrieves the best time of rounds runs and the links found"""
+    best = float('inf')
+    found = 0
+    for _ in range(rounds):
+        t1 = time.perf_counter()
+        found = sum(len(extractor.extract(page)) for page in pages)
+        best = min(best, time.perf_counter() - t1)
+    return best, found
+
+
+def agreement(extractor: LinkExtractor, reference: LinkExtractor, pages: list[bytes]) -> float:
+    """Retrieves the fraction of pages with the same links of reference"""
+    same = sum(extractor.extract(page) == reference.extract(page) for page in pages)
+    return same / len(pages)
+
+
+def report(title: str, pages: list[bytes], rounds: int) -> None:
+    size = sum(len(page) for page in pages)
+    print(f'{title}: {len(pages)} pages, {size / len(pages) / 1024:.1f} KiB/page')
+    reference = get_extractor('dom')
+    for name in EXTRACTORS:
+        extractor = get_extractor(name)
+        elapsed, found = measure(extractor, pages, rounds)
+        print(f'{name:>10}: {size / elapsed / 2 ** 20:8.1f} MiB/s {len(pages) / elapsed:10.1f} pages/s '
+              f'{found:8d} links  {agreement(extractor, reference, pages):6.1%} same as dom')
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Link extractor benchmark')
+    argparser.add_argument('--pages', type=int, default=50)
+    argparser.add_argument('--links', type=int, default=2000)
+    argparser.add_argument('--rounds', type=int, default=5)
+    args = argparser.parse_args()
+
+    report('samples', load_samples(), args.rounds)
+    report('synthetic', [build_page(i, args.links) for i in range(args.pages)], args.rounds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark of the parse backends: measures how many pages per second
+are parsed inline on the event loop and on a PoolParser with a growing
+amount of worker processes.
+
+Usage: python benchmarks/bench_parser.py [--pages 400] [--links 500]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'webcrawler'))
+
+from network.httpmanager import HttpResult
+from parsing import Parser, PoolParser
+
+
+def build_page(idx: int, links: int) -> bytes:
+    """Builds a synthetic html page with the given amount of anchors"""
+    body = ''.join(f'<div class="item"><p>Item {i} of page {idx}</p>'
+                   f'<a href="/page/{idx}/item/{i}">item {i}</a></div>'
+                   for i in range(links))
+    return f'<html><head><title>Page {idx}</title></head><body>{body}</body></html>'.encode()
+
+
+async def run(parser: Parser, pages: list[HttpResult], concurrency: int) -> float:
+    queue: asyncio.Queue[HttpResult] = asyncio.Queue()
+    for page in pages:
+        queue.put_nowait(page)
+
+    async def consumer():
+        while not queue.empty():
+            await parser.parse(queue.get_nowait())
+
+    t1 = time.perf_counter()
+    await asyncio.gather(*[consumer() for _ in range(concurrency)])
+    return time.perf_counter() - t1
+
+
+async def measure(parser: Parser, pages: list[HttpResult], concurrency: int) -> float:
+    # the first round starts the worker processes
+    await run(parser, pages[:concurrency], concurrency)
+    elapsed = await run(parser, pages, concurrency)
+    await parser.close()
+    return elapsed
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Parse backend benchmark')
+    argparser.add_argument('--pages', type=int, default=400)
+    argparser.add_argument('--links', type=int, default=500)
+    argparser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    argparser.add_argument('--batch-size', type=int, default=4)
+    args = argparser.parse_args()
+
+    pages = [HttpResult(build_page(i, args.links), f'page{i}') for i in range(args.pages)]
+    size = sum(len(p.htmlPage) for p in pages) / len(pages)
+    print(f'{args.pages} pages, {args.links} links/page, {size / 1024:.1f} KiB/page')
+
+    elapsed = asyncio.run(measure(Parser(), pages, 1))
+    print(f'{"inline":>10}: {args.pages / elapsed:10.1f} pages/s')
+    workers = 1
+    while workers <= args.max_workers:
+        parser = PoolParser(workers=workers, batch_size=args.batch_size)
+        elapsed = asyncio.run(measure(parser, pages, workers * args.batch_size * 2))
+        print(f'{f"pool x{workers}":>10}: {args.pages / elapsed:10.1f} pages/s')
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Cold-start benchmark of the command line: measures the wall time of
+a new interpreter importing the modules of the crawler, of
+`webcrawler.py --help` and of short single-site crawls against a local
+synthetic website (see synthetic_site.py) on each event loop, and
+lists the modules slowest to import (python -X importtime). Each
+measure runs in a new process, the best and the median of the rounds
+are reported.
+
+Usage: python benchmarks/bench_startup.py [--rounds 10] [--pages 5] [--top 10]
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CLI = os.path.join(ROOT, 'webcrawler', 'webcrawler.py')
+sys.path.insert(0, os.path.join(ROOT, 'webcrawler'))
+sys.path.insert(0, BENCH_DIR)
+
+from runtime import LOOPS
+from synthetic_site import SiteConfig, serve
+from bench_crawl import free_port, wait_for_port
+
+MODULES = ('runtime', 'models', 'parsing', 'network.httpmanager', 'taskmanager')
+
+
+def measure(command: list[str], rounds: int) -> tuple[float, float]:
+    """Retrieves the best and the median wall time of rounds runs of
+    command, started from the root of the repository"""
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, 'webcrawler'))
+    times = []
+    for _ in range(rounds):
+        t1 = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - t1)
+    return min(times), statistics.median(times)
+
+
+def slowest_imports(module: str, top: int) -> list[tuple[int, str]]:
+    """Retrieves the top modules imported by module with the highest
+    cumulative import time in microseconds"""
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, 'webcrawler'))
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    imports = []
+    for line in output.stderr.splitlines():
+        fields = line.removeprefix('import time:').split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            imports.append((int(fields[1]), fields[2].strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def report(title: str, best: float, median: float, interpreter: float) -> None:
+    print(f'{title:>32}: best {best * 1000:8.1f} ms  median {median * 1000:8.1f} ms  '
+          f'(+{(median - interpreter) * 1000:7.1f} ms)')
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Startup benchmark of the command line')
+    argparser.add_argument('--rounds', type=int, default=10)
+    argparser.add_argument('--pages', type=int, default=5)
+    argparser.add_argument('--top', type=int, default=10)
+    args = argparser.parse_args()
+
+    best, interpreter = measure([sys.executable, '-c', 'pass'], args.rounds)
+    report('interpreter', best, interpreter, interpreter)
+    for module in MODULES:
+        report(f'import {module}', *measure([sys.executable, '-c', f'import {module}'],
+                                            args.rounds), interpreter)
+    report('webcrawler.py --help', *measure([sys.executable, CLI, '--help'], args.rounds),
+           interpreter)
+
+    site = SiteConfig(pages=args.pages, fanout=2, page_size=2_000, latency='fixed:0')
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(site, port), daemon=True)
+    server.start()
+    try:
+        wait_for_port(port)
+        for loop in LOOPS:
+            command = [sys.executable, CLI, f'http://127.0.0.1:{port}/', '--loop', loop]
+            report(f'crawl of {args.pages} pages ({loop})', *measure(command, args.rounds),
+                   interpreter)
+    finally:
+        server.terminate()
+        server.join()
+
+    print('slowest imports of taskmanager (cumulative):')
+    for elapsed, module in slowest_imports('taskmanager', args.top):
+        print(f'{elapsed / 1000:10.1f} ms  {module}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Synthetic website used by the crawl benchmarks: an aiohttp server
+generating a deterministic site with a configurable amount of pages,
+fan-out, page size, latency distribution, error rate and redirect
+chains.
+
+Usage: python benchmarks/synthetic_site.py --port 8080 --pages 1000
+"""
+import argparse
+import asyncio
+import random
+import zlib
+
+from aiohttp import web
+
+
+class SiteConfig:
+    """
+    SiteConfig describes the synthetic website
+
+    Attributes:
+        pages (int): amount of pages reachable from the root
+        fanout (int): links inside each page
+        page_size (int): approximate size in bytes of each page
+        latency (str): latency distribution of the responses:
+                       'fixed:<s>', 'uniform:<min>:<max>' or
+                       'lognormal:<median>:<sigma>'
+        error_rate (float): fraction of pages answering 500
+        redirect_rate (float): fraction of links going through a
+                               redirect chain
+        redirect_chain (int): length of the redirect chains
+        seed (int): seed of the generator, the same seed builds the
+                    same website
+    """
+    def __init__(self, pages: int = 500, fanout: int = 20, page_size: int = 20_000,
+                 latency: str = 'fixed:0.005', error_rate: float = 0.0,
+                 redirect_rate: float = 0.0, redirect_chain: int = 2, seed: int = 1):
+        self.pages = pages
+        self.fanout = fanout
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.redirect_rate = redirect_rate
+        self.redirect_chain = redirect_chain
+        self.seed = seed
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def latency_sampler(spec: str, rng: random.Random):
+    """Builds a function returning the latency of a response"""
+    kind, *params = spec.split(':')
+    values = [float(p) for p in params]
+    if kind == 'fixed':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        import math
+        return lambda: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError('Invalid latency distribution', spec)
+
+
+def _fraction(value: int, salt: str) -> float:
+    """Deterministic number in [0, 1) for a page"""
+    return zlib.crc32(f'{salt}{value}'.encode()) / 2**32
+
+
+def build_app(config: SiteConfig) -> web.Application:
+    rng = random.Random(config.seed)
+    sampleLatency = latency_sampler(config.latency, rng)
+    padding = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. '
+
+    def link(target: int) -> str:
+        if target == 0:
+            return '/'
+        if _fraction(target, 'redirect') < config.redirect_rate:
+            return f'/r/{config.redirect_chain}/{target}'
+        return f'/page/{target}'
+
+    def render(idx: int) -> str:
+        pageRng = random.Random(config.seed * 1_000_003 + idx)
+        # the next page keeps the whole site reachable from the root
+        targets = {(idx + 1) % config.pages}
+        while len(targets) < min(config.fanout, config.pages):
+            targets.add(pageRng.randrange(config.pages))
+        anchors = ''.join(f'<li><a href="{link(t)}">page {t}</a></li>' for t in sorted(targets))
+        body = f'<html><head><title>Page {idx}</title></head><body><ul>{anchors}</ul>'
+        missing = config.page_size - len(body)
+        if missing > 0:
+            body += f'<p>{(padding * (missing // len(padding) + 1))[:missing]}</p>'
+        return body + '</body></html>'
+
+    async def page(request: web.Request) -> web.Response:
+        idx = int(request.match_info.get('idx', 0))
+        await asyncio.sleep(sampleLatency())
+        if idx >= config.pages:
+            raise web.HTTPNotFound()
+        if idx and _fraction(idx, 'error') < config.error_rate:
+            raise web.HTTPInternalServerError()
+        return web.Response(text=render(idx), content_type='text/html')
+
+    async def redirect(request: web.Request) -> web.Response:
+        hops = int(request.match_info['hops'])
+        idx = request.match_info['idx']
+        await asyncio.sleep(sampleLatency())
+        target = f'/r/{hops - 1}/{idx}' if hops > 1 else f'/page/{idx}'
+        raise web.HTTPFound(target)
+
+    app = web.Application()
+    app.router.add_get('/', page)
+    app.router.add_get('/page/{idx}', page)
+    app.router.add_get('/r/{hops}/{idx}', redirect)
+    return app
+
+
+def serve(config: SiteConfig, port: int) -> None:
+    """Runs the website until the process is terminated"""
+    web.run_app(build_app(config), host='127.0.0.1', port=port, print=None,
+                access_log=None)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Synthetic website for the crawl benchmarks')
+    argparser.add_argument('--port', type=int, default=8080)
+    argparser.add_argument('--pages', type=int, default=500)
+    argparser.add_argument('--fanout', type=int, default=20)
+    argparser.add_argument('--page-size', type=int, default=20_000)
+    argparser.add_argument('--latency', type=str, default='fixed:0.005')
+    argparser.add_argument('--error-rate', type=float, default=0.0)
+    argparser.add_argument('--redirect-rate', type=float, default=0.0)
+    argparser.add_argument('--redirect-chain', type=int, default=2)
+    argparser.add_argument('--seed', type=int, default=1)
+    args = argparser.parse_args()
+    serve(SiteConfig(args.pages, args.fanout, args.page_size, args.latency,
+                     args.error_rate, args.redirect_rate, args.redirect_chain,
+                     args.seed), args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+from webcrawler.models.graph import LinkGraph, UrlTable
+
+
+class TestUrlTable:
+    def test_intern_same_url_once(self):
+        table = UrlTable()
+        first = table.intern('https://example.com/')
+        second = table.intern('https://example.com/a')
+        assert table.intern('https://example.com/') == first
+        assert (first, second) == (0, 1)
+        assert len(table) == 2
+        assert table.get_url(second) == 'https://example.com/a'
+
+    def test_get_id_unknown_url(self):
+        assert UrlTable().get_id('https://example.com/') is None
+
+
+class TestLinkGraph:
+    def test_add_edge_creates_page(self):
+        graph = LinkGraph()
+        graph.add_edge('https://example.com/', 'https://example.com/a')
+        assert graph.has_page('https://example.com/')
+        assert not graph.has_page('https://example.com/a')
+        assert graph.links('https://example.com/') == ['https://example.com/a']
+
+    def test_add_edge_ignores_duplicates(self):
+        graph = LinkGraph()
+        graph.add_edge('https://example.com/', 'https://example.com/a')
+        graph.add_edge('https://example.com/', 'https://example.com/a')
+        graph.add_edges('https://example.com/', ['https://example.com/a',
+                                                 'https://example.com/b',
+                                                 'https://example.com/b'])
+        assert graph.links('https://example.com/') == ['https://example.com/a',
+                                                      'https://example.com/b']
+        assert graph.num_edges() == 2
+
+    def test_duplicates_ignored_across_recent_pages(self):
+        graph = LinkGraph()
+        graph.RECENT_PAGES = 2
+        pages = [f'https://example.com/{i}' for i in range(4)]
+        # the pages are built link by link, interleaved
+        for link in ['https://example.com/a', 'https://example.com/b'] * 2:
+            for page in pages:
+                graph.add_edge(page, link)
+        graph.add_page('https://example.com/new')
+        graph.add_edge('https://example.com/new', 'https://example.com/a')
+        graph.add_edges('https://example.com/new', ['https://example.com/a',
+                                                    'https://example.com/c'])
+        graph.add_edge('https://example.com/new', 'https://example.com/c')
+        assert all(graph.links(page) == ['https://example.com/a', 'https://example.com/b']
+                   for page in pages)
+        assert graph.links('https://example.com/new') == ['https://example.com/a',
+                                                         'https://example.com/c']
+        assert graph.num_edges() == 10
+
+    def test_pages_keep_insertion_order(self):
+        graph = LinkGraph()
+        graph.add_edge('https://example.com/', 'https://example.com/b')
+        graph.add_page('https://example.com/b')
+        graph.add_page('https://example.com/a')
+        assert list(graph.pages()) == ['https://example.com/',
+                                       'https://example.com/b',
+                                       'https://example.com/a']
+        assert graph.num_pages() == 3
+
+    def test_version_changes_only_on_updates(self):
+        graph = LinkGraph()
+        graph.add_page('https://example.com/')
+        version = graph.version
+        graph.add_page('https://example.com/')
+        assert graph.version == version
+        graph.add_edge('https://example.com/', 'https://example.com/a')
+        assert graph.version > version
@@ -0,0 +1,72 @@
+import pytest
+
+from webcrawler.models.graph import LinkGraph
+from webcrawler.models.graphfile import GraphFile, write_graph
+
+
+@pytest.fixture
+def graph():
+    graph = LinkGraph()
+    graph.add_edges('https://example.com/', ['https://example.com/a',
+                                             'https://example.com/b',
+                                             'https://other.com/'])
+    graph.add_edges('https://example.com/a', ['https://example.com/',
+                                              'https://example.com/é'])
+    graph.add_page('https://example.com/b')
+    return graph
+
+
+def test_roundtrip(graph, tmp_path):
+    path = str(tmp_path / 'graph.bin')
+    write_graph(graph, path, lambda url: not url.startswith('https://example.com'))
+    with GraphFile(path) as graphFile:
+        assert graphFile.num_nodes == 5
+        assert graphFile.num_edges == graph.num_edges() == 5
+        assert graphFile.num_pages() == 3
+        assert list(graphFile.pages()) == list(graph.pages())
+        for pageUrl in graph.pages():
+            assert graphFile.links(pageUrl) == graph.links(pageUrl)
+        assert graphFile.links('https://example.com/é') == []
+        otherId = graphFile.get_id('https://other.com/')
+        assert graphFile.is_external(otherId) and not graphFile.is_visited(otherId)
+        rootId = graphFile.get_id('https://example.com/')
+        assert graphFile.is_visited(rootId) and not graphFile.is_external(rootId)
+        assert graphFile.link_ids(rootId).tolist() == list(graph.link_ids(rootId))
+        loaded = graphFile.to_link_graph()
+    assert loaded.num_edges() == graph.num_edges()
+    assert {url: loaded.links(url) for url in loaded.pages()} == \
+        {url: graph.links(url) for url in graph.pages()}
+
+
+def test_big_endian_host(graph, tmp_path, monkeypatch):
+    path = str(tmp_path / 'graph.bin')
+    write_graph(graph, path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    # on this host the arrays are swapped twice, like a big-endian host
+    # swaps them once when writing and once when reading
+    monkeypatch.setattr('webcrawler.models.graphfile.sys.byteorder', 'big')
+    write_graph(graph, path)
+    with open(path, 'rb') as f:
+        assert f.read() != data
+    with GraphFile(path) as graphFile:
+        assert {url: graphFile.links(url) for url in graphFile.pages()} == \
+            {url: graph.links(url) for url in graph.pages()}
+
+
+def test_empty_graph(tmp_path):
+    path = str(tmp_path / 'graph.bin')
+    write_graph(LinkGraph(), path)
+    with GraphFile(path) as graphFile:
+        assert graphFile.num_nodes == graphFile.num_edges == graphFile.num_pages() == 0
+        assert graphFile.get_id('https://example.com/') is None
+
+
+def test_invalid_file(tmp_path):
+    path = tmp_path / 'graph.bin'
+    path.write_bytes(b'not a graph' * 10)
+    with pytest.raises(ValueError):
+        GraphFile(str(path))
+    path.write_bytes(b'')
+    with pytest.raises(ValueError):
+        GraphFile(str(path))
@@ -0,0 +1,153 @@
+import os
+import time
+import pytest
+import pytest_asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from pydantic import HttpUrl
+from webcrawler.network.httpcache import HttpCache
+from webcrawler.network.httpmanager import HttpManager
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = HttpCache(str(tmp_path / 'cache'))
+    yield cache
+    cache.close()
+
+
+def test_store_and_revalidate(cache: HttpCache):
+    cache.store('https://example.com/a#top', b'<html>a</html>', '"v1"', None, 'utf-8')
+    entry = cache.lookup('https://EXAMPLE.com/a')
+    assert entry.conditional_headers() == {'If-None-Match': '"v1"'}
+    assert cache.hit(entry) == b'<html>a</html>'
+    assert cache.stats()['hits'] == 1
+    # no conditional request has been sent
+    assert cache.stats()['revalidations'] == 0
+
+
+def test_hit_without_request_keeps_age(cache: HttpCache):
+    cache.store('https://example.com/a', b'<html>a</html>', '"v1"', None, 'utf-8')
+    storedAt = cache.lookup('https://example.com/a').stored_at
+    time.sleep(0.01)
+    assert cache.hit(cache.lookup('https://example.com/a'), revalidated=False) == b'<html>a</html>'
+    assert cache.lookup('https://example.com/a').stored_at == storedAt
+    cache.hit(cache.lookup('https://example.com/a'))
+    assert cache.lookup('https://example.com/a').stored_at > storedAt
+
+
+def test_lookup_miss(cache: HttpCache):
+    assert cache.lookup('https://example.com/missing') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_store_without_validators(cache: HttpCache):
+    cache.store('https://example.com/a', b'<html>a</html>', None, None, 'utf-8')
+    assert cache.lookup('https://example.com/a') is None
+
+
+def test_store_without_validators_removes_stale_entry(cache: HttpCache):
+    cache.store('https://example.com/a', b'<html>a</html>', '"v1"', None, 'utf-8')
+    cache.store('https://example.com/a', b'<html>b</html>', None, None, 'utf-8')
+    assert cache.lookup('https://example.com/a') is None
+    assert cache.size() == 0 and cache.stats()['evictions'] == 0
+
+
+def test_expired_entry(tmp_path):
+    cache = HttpCache(str(tmp_path / 'cache'), max_age=0.01)
+    cache.store('https://example.com/a', b'a', None, 'Mon, 01 Jan 2024 00:00:00 GMT', 'utf-8')
+    time.sleep(0.02)
+    assert cache.lookup('https://example.com/a') is None
+    assert cache.size() == 0
+    cache.close()
+
+
+def test_index_survives_reopening(tmp_path):
+    cache = HttpCache(str(tmp_path / 'cache'), commit_every=10)
+    for page in range(25):
+        cache.store(f'https://example.com/{page}', b'body', f'"{page}"', None, 'utf-8')
+    cache.close()
+    cache = HttpCache(str(tmp_path / 'cache'))
+    assert all(cache.lookup(f'https://example.com/{page}') for page in range(25))
+    cache.close()
+
+
+def test_expired_entries_swept(tmp_path):
+    cache = HttpCache(str(tmp_path / 'cache'), max_age=0.01, sweep_every=3)
+    cache.store('https://example.com/a', b'a', '"a"', None, 'utf-8')
+    time.sleep(0.02)
+    cache.store('https://example.com/b', b'b', '"b"', None, 'utf-8')
+    assert cache.stats()['evictions'] == 0
+    cache.store('https://example.com/c', b'c', '"c"', None, 'utf-8')
+    # a has expired, b and c have just been stored
+    assert cache.stats()['evictions'] == 1
+    cache.close()
+
+
+def test_evict_least_recently_used(tmp_path):
+    body = os.urandom(1000)
+    cache = HttpCache(str(tmp_path / 'cache'), max_bytes=2500)
+    for page in ['a', 'b', 'c']:
+        cache.store(f'https://example.com/{page}', body, f'"{page}"', None, 'utf-8')
+    assert cache.lookup('https://example.com/a') is None
+    assert cache.lookup('https://example.com/c') is not None
+    assert cache.size() <= 2500
+    assert cache.stats()['evictions'] == 1
+    cache.close()
+
+
+@pytest.mark.asyncio
+class TestHttpManagerCache:
+
+    @pytest_asyncio.fixture
+    async def local_server(self):
+        requests: list[int] = []
+        async def page(request):
+            if request.headers.get('If-None-Match') == '"v1"':
+                requests.append(304)
+                return web.Response(status=304)
+            requests.append(200)
+            return web.Response(text='<html><a href="/">home</a></html>',
+                                content_type='text/html', headers={'ETag': '"v1"'})
+        app = web.Application()
+        app.router.add_get('/', page)
+        server = TestServer(app)
+        server.requests = requests
+        await server.start_server()
+        yield server
+        await server.close()
+
+    @pytest.mark.asyncio
+    async def test_fetch_revalidates_cached_page(self, local_server: TestServer, cache: HttpCache):
+        url = str(local_server.make_url('/'))
+        manager = HttpManager(HttpUrl(url), cache=cache)
+        try:
+            first = await manager.fetch(url)
+            second = await manager.fetch(url)
+        finally:
+            await manager.close()
+        assert local_server.requests == [200, 304]
+        assert first == second
+        assert first.htmlPage == '<html><a href="/">home</a></html>'
+        stats = manager.get_stats()
+        assert (stats['cache_misses'], stats['cache_hits']) == (1, 1)
+        assert stats['cache_revalidations'] == 1
+        # read from the cache without any request
+        assert await manager.fetch_cached(url) == first
+        assert manager.get_stats()['cache_revalidations'] == 1
+
+    @pytest.mark.asyncio
+    async def test_fetch_downloads_page_with_lost_body(self, local_server: TestServer,
+                                                       cache: HttpCache):
+        url = str(local_server.make_url('/'))
+        manager = HttpManager(HttpUrl(url), cache=cache)
+        try:
+            await manager.fetch(url)
+            os.remove(cache._path(cache.key(url)))
+            response = await manager.fetch(url)
+        finally:
+            await manager.close()
+        # the 304 can't be served, the page is requested without validators
+        assert local_server.requests == [200, 304, 200]
+        assert response.htmlPage == '<html><a href="/">home</a></html>'
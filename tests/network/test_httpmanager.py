@@ -1,3 +1,5 @@
+import asyncio
+import gzip
 import pytest
 import pytest_asyncio
 import sys
@@ -5,11 +7,16 @@ import sys
 sys.path.append('..')
 
 #from aioresponses import aioresponses
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from pydantic import HttpUrl
-from webcrawler.network.httpmanager import HttpManager, HttpResult
+from webcrawler.network.httpmanager import HttpManager, HttpResult, detect_encoding
+from webcrawler.metrics import MetricsRegistry
 #from utils.utility import read_file_content
 # webcrawler/network/test_httpmanager.py
 
+RELEASE = web.AppKey('release', asyncio.Event)
+
 
 @pytest.mark.asyncio
 class TestHttpManager:
@@ -57,4 +64,264 @@ class TestHttpManager:
         #    response = await http_manager.fetch(url)
         #    assert response is None
         #    captured = capsys.readouterr()
-        #    assert "Error: 500 at" in captured.out
\ No newline at end of file
+        #    assert "Error: 500 at" in captured.out
+
+@pytest.mark.asyncio
+class TestHttpManagerPooled:
+
+    @pytest_asyncio.fixture
+    async def local_server(self):
+        async def page(request):
+            return web.Response(text='<html><a href="/child">child</a></html>',
+                                content_type='text/html')
+
+        async def slow(request):
+            await request.app[RELEASE].wait()
+            return await page(request)
+        app = web.Application()
+        app[RELEASE] = asyncio.Event()
+        app.router.add_get('/', page)
+        app.router.add_get('/child', page)
+        app.router.add_get('/slow', slow)
+        server = TestServer(app)
+        await server.start_server()
+        yield server
+        await server.close()
+
+    @pytest.mark.asyncio
+    async def test_fetch_reuses_connection(self, local_server: TestServer):
+        manager = HttpManager(HttpUrl(str(local_server.make_url('/'))))
+        try:
+            for path in ['/', '/child', '/']:
+                response = await manager.fetch(str(local_server.make_url(path)))
+                assert 'child' in response.htmlPage
+        finally:
+            await manager.close()
+        stats = manager.get_stats()
+        assert stats['new_connections'] == 1
+        assert stats['reused_connections'] == 2
+        assert stats['sessions_created'] == 1
+
+    @pytest.mark.asyncio
+    async def test_fetch_not_pooled_opens_new_connections(self, local_server: TestServer):
+        manager = HttpManager(HttpUrl(str(local_server.make_url('/'))), pooled=False)
+        try:
+            for path in ['/', '/child']:
+                await manager.fetch(str(local_server.make_url(path)))
+        finally:
+            await manager.close()
+        stats = manager.get_stats()
+        assert stats['new_connections'] == 2
+        assert stats['reused_connections'] == 0
+        assert stats['sessions_created'] == 2
+
+    @pytest.mark.asyncio
+    async def test_session_recreated_after_failures(self, local_server: TestServer):
+        manager = HttpManager(HttpUrl(str(local_server.make_url('/'))), max_failures=2)
+        try:
+            await manager.fetch(str(local_server.make_url('/')))
+            for _ in range(2):
+                await manager.fetch('http://127.0.0.1:1/')
+            await manager.fetch(str(local_server.make_url('/')))
+        finally:
+            await manager.close()
+        assert manager.get_stats()['sessions_created'] == 2
+
+    @pytest.mark.asyncio
+    async def test_session_recreated_while_requests_run(self, local_server: TestServer):
+        manager = HttpManager(HttpUrl(str(local_server.make_url('/'))), max_failures=2)
+        try:
+            running = asyncio.create_task(manager.fetch(str(local_server.make_url('/slow'))))
+            await asyncio.sleep(0.1)
+            for _ in range(2):
+                await manager.fetch('http://127.0.0.1:1/')
+            await manager.fetch(str(local_server.make_url('/')))
+            local_server.app[RELEASE].set()
+            response = await running
+            assert response.status == 200
+            assert 'child' in response.htmlPage
+        finally:
+            await manager.close()
+        assert manager.get_stats()['sessions_created'] == 2
+        assert not manager._inflight
+
+
+@pytest.mark.asyncio
+class TestHttpManagerStreaming:
+
+    @pytest_asyncio.fixture
+    async def local_server(self):
+        async def page(request):
+            size = int(request.match_info['size'])
+            body = '<html><a href="/é">link</a>' + 'x' * size + '</html>'
+            return web.Response(body=body.encode('utf-8'),
+                                content_type='text/html', charset='utf-8')
+        app = web.Application()
+        app.router.add_get('/{size}', page)
+        server = TestServer(app)
+        await server.start_server()
+        yield server
+        await server.close()
+
+    @pytest.mark.asyncio
+    async def test_fetch_stream_keeps_bytes(self, local_server: TestServer):
+        manager = HttpManager(HttpUrl(str(local_server.make_url('/'))),
+                              stream=True, chunk_size=16)
+        try:
+            response = await manager.fetch(str(local_server.make_url('/100')))
+        finally:
+            await manager.close()
+        assert isinstance(response.htmlPage, bytes)
+        assert response.htmlPage.startswith('<html><a href="/é">'.encode('utf-8'))
+
+    @pytest.mark.asyncio
+    async def test_fetch_text_decodes_page(self, local_server: TestServer):
+        manager = HttpManager(HttpUrl(str(local_server.make_url('/'))))
+        try:
+            response = await manager.fetch(str(local_server.make_url('/10')))
+        finally:
+            await manager.close()
+        assert response.htmlPage == '<html><a href="/é">link</a>' + 'x' * 10 + '</html>'
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('body, page', [
+        ('<html><a href="/é">link</a></html>'.encode('utf-8'), '<html><a href="/é">link</a></html>'),
+        ('<meta charset="iso-8859-1"><a href="/é">'.encode('latin-1'),
+         '<meta charset="iso-8859-1"><a href="/é">'),
+    ])
+    async def test_fetch_text_without_charset(self, body, page):
+        async def handler(request):
+            # no charset parameter in the Content-Type
+            return web.Response(body=body, headers={'Content-Type': 'text/html'})
+        app = web.Application()
+        app.router.add_get('/', handler)
+        server = TestServer(app)
+        await server.start_server()
+        manager = HttpManager(HttpUrl(str(server.make_url('/'))))
+        try:
+            response = await manager.fetch(str(server.make_url('/')))
+        finally:
+            await manager.close()
+            await server.close()
+        assert response.htmlPage == page
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('stream', [True, False])
+    async def test_fetch_discards_big_page(self, local_server: TestServer, stream):
+        manager = HttpManager(HttpUrl(str(local_server.make_url('/'))),
+                              stream=stream, max_body_size=1000)
+        url = str(local_server.make_url('/5000'))
+        try:
+            response = await manager.fetch(url)
+        finally:
+            await manager.close()
+        assert response == HttpResult(htmlPage='', url=url)
+
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('compress', [True, False])
+    async def test_stream_resource(self, compress):
+        document = b'<urlset>' + b'<url><loc>/p</loc></url>' * 1000 + b'</urlset>'
+        async def sitemap(request):
+            return web.Response(body=gzip.compress(document) if compress else document)
+        app = web.Application()
+        app.router.add_get('/sitemap.xml', sitemap)
+        server = TestServer(app)
+        await server.start_server()
+        url = str(server.make_url('/sitemap.xml'))
+        manager = HttpManager(HttpUrl(str(server.make_url('/'))), chunk_size=256,
+                              max_resource_size=10_000)
+        try:
+            chunks = [chunk async for chunk in manager.stream_resource(url)]
+            truncated = b''.join(chunks)
+            manager._maxResourceSize = len(document)
+            complete = b''.join([chunk async for chunk in manager.stream_resource(url)])
+        finally:
+            await manager.close()
+            await server.close()
+        assert max(len(chunk) for chunk in chunks) <= 256
+        assert document.startswith(truncated) and len(truncated) <= 10_000
+        assert complete == document
+
+@pytest.mark.asyncio
+class TestHttpManagerRetries:
+
+    @pytest_asyncio.fixture
+    async def local_server(self):
+        calls: dict[str, int] = {}
+        async def flaky(request):
+            calls['flaky'] = calls.get('flaky', 0) + 1
+            if calls['flaky'] <= 2:
+                return web.Response(status=503)
+            return web.Response(text='<html>ok</html>', content_type='text/html')
+        async def throttled(request):
+            calls['throttled'] = calls.get('throttled', 0) + 1
+            return web.Response(status=429, headers={'Retry-After': '120'})
+        async def slow(request):
+            calls['slow'] = calls.get('slow', 0) + 1
+            response = web.StreamResponse(headers={'Content-Type': 'text/html'})
+            await response.prepare(request)
+            await asyncio.sleep(1)
+            return response
+        app = web.Application()
+        app.router.add_get('/flaky', flaky)
+        app.router.add_get('/throttled', throttled)
+        app.router.add_get('/slow', slow)
+        server = TestServer(app)
+        await server.start_server()
+        server.calls = calls
+        yield server
+        await server.close()
+
+    @pytest.mark.asyncio
+    async def test_transient_errors_are_retried(self, local_server: TestServer):
+        metrics = MetricsRegistry()
+        manager = HttpManager(HttpUrl(str(local_server.make_url('/'))),
+                              backoff=0.01, metrics=metrics)
+        try:
+            response = await manager.fetch(str(local_server.make_url('/flaky')))
+        finally:
+            await manager.close()
+        assert response.htmlPage == '<html>ok</html>'
+        assert response.status == 200
+        assert metrics.get('retries').total() == 2
+
+    @pytest.mark.asyncio
+    async def test_long_retry_after_is_not_waited(self, local_server: TestServer):
+        manager = HttpManager(HttpUrl(str(local_server.make_url('/'))), max_retry_after=30)
+        try:
+            response = await manager.fetch(str(local_server.make_url('/throttled')))
+        finally:
+            await manager.close()
+        assert (response.status, response.retry_after) == (429, 120)
+        assert response.is_host_failure()
+        assert local_server.calls['throttled'] == 1
+
+    @pytest.mark.asyncio
+    async def test_read_timeout(self, local_server: TestServer):
+        manager = HttpManager(HttpUrl(str(local_server.make_url('/'))),
+                              read_timeout=0.1, retries=1, backoff=0.01)
+        try:
+            response = await manager.fetch(str(local_server.make_url('/slow')))
+        finally:
+            await manager.close()
+        assert response.error == 'timeout'
+        assert local_server.calls['slow'] == 2
+
+
+@pytest.mark.parametrize('charset, body, encoding', [
+    ('ISO-8859-1', b'<meta charset="utf-8">', 'iso8859-1'),
+    (None, b'<head><meta charset=windows-1252></head>', 'cp1252'),
+    (None, b'<meta http-equiv="Content-Type" content="text/html; charset=Shift_JIS">', 'shift_jis'),
+    ('unknown', b'<meta charset="also-unknown">', 'utf-8'),
+    (None, b' ' * 2000 + b'<meta charset="latin-1">', 'utf-8'),
+])
+def test_detect_encoding(charset, body, encoding):
+    assert detect_encoding(charset, body) == encoding
+
+
+def test_parse_retry_after():
+    assert HttpManager.parse_retry_after('5') == 5
+    assert HttpManager.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert HttpManager.parse_retry_after('soon') is None
+    assert HttpManager.parse_retry_after(None) is None
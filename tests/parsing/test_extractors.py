@@ -0,0 +1,70 @@
+import pytest
+
+from tests.utils.utility import read_file_content, extract_link
+from webcrawler.network.httpmanager import HttpResult
+from webcrawler.parsing import (AnchorExtractor, DomExtractor, Parser, PoolParser,
+                                ScanExtractor, get_extractor, parse_srcset)
+
+PAGE = '''<html><head><title><a href="/title">x</a></title>
+<link rel="stylesheet" href="/style.css"><link rel="Next" href="/page/2">
+<script>var s = '<a href="/script">';</script><style>a { color: red }</style></head>
+<body><!-- <a href="/comment">old</a> -->
+<a href='/q?a=1&amp;b=2'>q</a><a href>empty</a><a name="top">top</a>
+<a href="/gt" title="a>b">gt</a><A HREF=" /upper ">upper</A>
+<map><area shape="rect" href="/area"></map><iframe src="/frame"></iframe>
+<img srcset="/img/1.jpg 1x, /img/2.jpg 2x"><textarea><a href="/textarea"></textarea>
+</body></html>'''
+
+LINKS = ['/page/2', '/q?a=1&b=2', '/gt', '/upper', '/area', '/frame', '/img/1.jpg', '/img/2.jpg']
+
+
+@pytest.fixture(params=['google.html', 'example_nolink.html'])
+def htmlfile(request):
+    return request.param
+
+
+@pytest.mark.parametrize('engine', [DomExtractor, ScanExtractor])
+def test_extended_engines(engine):
+    assert engine().extract(PAGE) == LINKS
+    assert engine().extract(PAGE.encode()) == LINKS
+
+
+@pytest.mark.parametrize('engine', [DomExtractor, ScanExtractor])
+def test_base_href(engine):
+    page = '<a href="/a">a</a><base href="https://b.com/x/"><base href="https://c.com/"><a href="b">b</a>'
+    assert engine().extract(page) == ['https://b.com/a', 'https://b.com/x/b']
+
+
+def test_engines_agree_on_samples(htmlfile):
+    html_page = read_file_content(htmlfile)
+    assert ScanExtractor().extract(html_page) == DomExtractor().extract(html_page)
+    assert AnchorExtractor().extract(html_page) == extract_link(html_page)
+
+
+@pytest.mark.parametrize('value, urls', [
+    ('a.jpg 1x, b.jpg 2x', ['a.jpg', 'b.jpg']),
+    ('a.jpg,b,c.jpg 640w', ['a.jpg,b,c.jpg']),
+    ('a.jpg,, b.jpg', ['a.jpg', 'b.jpg']),
+    (' ', []),
+])
+def test_parse_srcset(value, urls):
+    assert parse_srcset(value) == urls
+
+
+def test_get_extractor():
+    assert isinstance(get_extractor('scan'), ScanExtractor)
+    with pytest.raises(ValueError):
+        get_extractor('regex')
+
+
+def test_parser_with_extractor():
+    assert Parser(ScanExtractor()).get_links(HttpResult(PAGE, 'page')) == LINKS
+
+
+@pytest.mark.asyncio
+async def test_pool_parser_with_extractor():
+    parser = PoolParser(workers=1, batch_size=1, extractor=ScanExtractor())
+    try:
+        assert await parser.parse(HttpResult(PAGE, 'page')) == LINKS
+    finally:
+        await parser.close()
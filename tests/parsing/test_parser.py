@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+import pytest_asyncio
+
+from tests.utils.utility import read_file_content, extract_link
+from webcrawler.network.httpmanager import HttpResult
+from webcrawler.parsing import Parser, PoolParser, extract_links
+
+
+@pytest.fixture(params=['google.html', 'example_nolink.html'])
+def htmlfile(request):
+    return request.param
+
+
+def test_extract_links_from_bytes(htmlfile):
+    html_page = read_file_content(htmlfile)
+    assert extract_links(html_page.encode('utf-8')) == extract_links(html_page)
+
+
+def test_parser_get_links(htmlfile):
+    html_page = read_file_content(htmlfile)
+    links = Parser().get_links(HttpResult(html_page, htmlfile))
+    assert sorted(links) == sorted(extract_link(html_page))
+
+
+@pytest.mark.asyncio
+class TestPoolParser:
+
+    @pytest_asyncio.fixture
+    async def pool_parser(self):
+        parser = PoolParser(workers=2, batch_size=3)
+        yield parser
+        await parser.close()
+
+    @pytest.mark.asyncio
+    async def test_parse_on_pool(self, pool_parser: PoolParser, htmlfile):
+        html_page = read_file_content(htmlfile)
+        links = await pool_parser.parse(HttpResult(html_page, htmlfile))
+        assert links == extract_links(html_page)
+
+    @pytest.mark.asyncio
+    async def test_parse_batch_keeps_pages_order(self, pool_parser: PoolParser):
+        pages = [HttpResult(f'<a href="/page/{i}">{i}</a>'.encode(), f'page{i}')
+                 for i in range(7)]
+        results = await asyncio.gather(*[pool_parser.parse(page) for page in pages])
+        assert results == [[f'/page/{i}'] for i in range(7)]
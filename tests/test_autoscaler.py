@@ -0,0 +1,82 @@
+import pytest
+
+from webcrawler.autoscaler import Autoscaler
+from webcrawler.metrics import MetricsRegistry
+
+
+def test_producers_additive_increase():
+    autoscaler = Autoscaler(max_producers=3)
+    producers = 1
+    for _ in range(5):
+        producers = autoscaler.decide_producers(producers, queued=10, pagesFull=False,
+                                                latency=0.1, errorRate=0.0, loopLag=0.0)
+    assert producers == 3
+
+
+def test_producers_stop_growing_without_work():
+    autoscaler = Autoscaler()
+    assert autoscaler.decide_producers(4, queued=0, pagesFull=False, latency=0.1,
+                                       errorRate=0.0, loopLag=0.0) == 4
+    assert autoscaler.decide_producers(4, queued=10, pagesFull=True, latency=0.1,
+                                       errorRate=0.0, loopLag=0.0) == 4
+
+
+def test_producers_capped_by_frontier_capacity():
+    autoscaler = Autoscaler(max_producers=32, increase=4)
+    # a single host with max_per_host=2
+    assert autoscaler.decide_producers(1, queued=1000, pagesFull=False, latency=0.1,
+                                       errorRate=0.0, loopLag=0.0, capacity=2) == 2
+    assert autoscaler.decide_producers(2, queued=1000, pagesFull=False, latency=0.1,
+                                       errorRate=0.0, loopLag=0.0, capacity=2) == 2
+    assert autoscaler.decide_producers(4, queued=1000, pagesFull=False, latency=0.1,
+                                       errorRate=0.0, loopLag=0.0, capacity=2) == 4
+
+
+@pytest.mark.parametrize('latency, errorRate, loopLag', [(0.1, 0.5, 0.0),
+                                                         (0.1, 0.0, 1.0),
+                                                         (1.0, 0.0, 0.0)])
+def test_producers_multiplicative_decrease(latency, errorRate, loopLag):
+    autoscaler = Autoscaler(min_producers=2, latency_factor=3.0)
+    # the first window sets the lowest latency
+    autoscaler.decide_producers(8, queued=10, pagesFull=False, latency=0.1,
+                                errorRate=0.0, loopLag=0.0)
+    assert autoscaler.decide_producers(8, queued=10, pagesFull=False, latency=latency,
+                                       errorRate=errorRate, loopLag=loopLag) == 4
+    assert autoscaler.decide_producers(3, queued=10, pagesFull=False, latency=latency,
+                                       errorRate=errorRate, loopLag=loopLag) == 2
+
+
+def test_consumers_follow_pages_queue():
+    autoscaler = Autoscaler(max_consumers=2)
+    assert autoscaler.decide_consumers(1, pagesQueued=4, pagesCapacity=4, loopLag=0.0) == 2
+    assert autoscaler.decide_consumers(2, pagesQueued=4, pagesCapacity=4, loopLag=0.0) == 2
+    assert autoscaler.decide_consumers(1, pagesQueued=4, pagesCapacity=4, loopLag=1.0) == 1
+    assert autoscaler.decide_consumers(2, pagesQueued=2, pagesCapacity=4, loopLag=0.0) == 2
+    assert autoscaler.decide_consumers(2, pagesQueued=0, pagesCapacity=4, loopLag=0.0) == 1
+    assert autoscaler.decide_consumers(1, pagesQueued=100, pagesCapacity=0, loopLag=0.0) == 1
+    # a page buffer limited by bytes is full without a page capacity
+    assert autoscaler.decide_consumers(1, pagesQueued=3, pagesCapacity=0, loopLag=0.0,
+                                       pagesFull=True) == 2
+
+
+def test_window_error_rate():
+    autoscaler = Autoscaler()
+    metrics = MetricsRegistry()
+    fetch = metrics.histogram('fetch_seconds')
+    responses = metrics.counter('responses', label='code')
+    for code in ['200', '200', '503', '429']:
+        fetch.observe(0.5)
+        responses.inc(label=code)
+    # a request failed without a response
+    fetch.observe(0.5)
+    latency, errorRate = autoscaler._window(metrics)
+    assert latency == pytest.approx(0.5)
+    assert errorRate == pytest.approx(0.6)
+    assert autoscaler._window(metrics) == (None, 0.0)
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        Autoscaler(min_producers=4, max_producers=2)
+    with pytest.raises(ValueError):
+        Autoscaler(decrease=1.5)
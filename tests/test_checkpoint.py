@@ -0,0 +1,115 @@
+import os
+import pytest
+
+from webcrawler.checkpoint import Checkpoint
+
+
+@pytest.mark.asyncio
+class TestCheckpoint:
+
+    @pytest.mark.asyncio
+    async def test_load_state(self, tmp_path):
+        checkpoint = Checkpoint(str(tmp_path))
+        for url in ['https://a.com/', 'https://a.com/1', 'https://a.com/2', 'https://a.com/3']:
+            checkpoint.enqueued(url)
+        checkpoint.page('https://a.com/', ['https://a.com/1', 'https://b.com/'])
+        checkpoint.done('https://a.com/2')
+        await checkpoint.flush()
+
+        state = Checkpoint(str(tmp_path)).load()
+        assert state.pending == ['https://a.com/1', 'https://a.com/3']
+        assert state.pages == {'https://a.com/': ['https://a.com/1', 'https://b.com/']}
+        assert state.seen == {'https://a.com/', 'https://a.com/1',
+                              'https://a.com/2', 'https://a.com/3'}
+
+    @pytest.mark.asyncio
+    async def test_load_aliases(self, tmp_path):
+        checkpoint = Checkpoint(str(tmp_path))
+        for url in ['https://a.com/', 'https://a.com/?sid=1', 'https://a.com/1']:
+            checkpoint.enqueued(url)
+        checkpoint.page('https://a.com/', ['https://a.com/?sid=1', 'https://a.com/1'])
+        checkpoint.alias('https://a.com/?sid=1', 'https://a.com/')
+        await checkpoint.flush()
+
+        state = Checkpoint(str(tmp_path)).load()
+        assert state.pending == ['https://a.com/1']
+        assert state.pages == {'https://a.com/': ['https://a.com/?sid=1', 'https://a.com/1']}
+        assert state.aliases == {'https://a.com/?sid=1': 'https://a.com/'}
+        assert 'https://a.com/?sid=1' in state.seen
+
+    @pytest.mark.asyncio
+    async def test_compaction_keeps_state(self, tmp_path):
+        checkpoint = Checkpoint(str(tmp_path), compact_after=5)
+        for i in range(5):
+            checkpoint.enqueued(f'https://a.com/{i}')
+        for i in range(3):
+            checkpoint.done(f'https://a.com/{i}')
+        await checkpoint.flush()
+        with open(os.path.join(str(tmp_path), 'frontier.log')) as f:
+            assert len(f.readlines()) == 5
+        state = checkpoint.load()
+        assert state.pending == ['https://a.com/3', 'https://a.com/4']
+        assert len(state.seen) == 5
+
+    @pytest.mark.asyncio
+    async def test_compaction_waits_for_log_to_double(self, tmp_path):
+        checkpoint = Checkpoint(str(tmp_path), compact_after=5)
+        compactions: list[int] = []
+        compact = checkpoint._compact
+        def counted_compact():
+            compactions.append(checkpoint._records)
+            compact()
+        checkpoint._compact = counted_compact
+        for i in range(8):
+            checkpoint.enqueued(f'https://a.com/{i}')
+        await checkpoint.flush()
+        for i in range(8, 17):
+            checkpoint.enqueued(f'https://a.com/{i}')
+            await checkpoint.flush()
+        # compacted at 8 records, then only when the 8 left have doubled
+        assert compactions == [8, 17]
+
+    @pytest.mark.asyncio
+    async def test_truncated_records_ignored(self, tmp_path):
+        checkpoint = Checkpoint(str(tmp_path))
+        checkpoint.enqueued('https://a.com/')
+        checkpoint.page('https://a.com/', ['https://a.com/1'])
+        await checkpoint.flush()
+        with open(os.path.join(str(tmp_path), 'graph.log'), 'a') as f:
+            f.write('https://a.com/1\thttps://a.com/')
+        with open(os.path.join(str(tmp_path), 'frontier.log'), 'a') as f:
+            f.write('+')
+        state = checkpoint.load()
+        assert list(state.pages) == ['https://a.com/']
+        assert state.pending == []
+
+    @pytest.mark.asyncio
+    async def test_resume_after_torn_write(self, tmp_path):
+        checkpoint = Checkpoint(str(tmp_path))
+        checkpoint.enqueued('https://a.com/')
+        checkpoint.page('https://a.com/', ['https://a.com/1', 'https://a.com/2'])
+        checkpoint.enqueued('https://a.com/1')
+        await checkpoint.flush()
+        # crash in the middle of a record
+        with open(os.path.join(str(tmp_path), 'graph.log'), 'a') as f:
+            f.write('https://a.com/1\thttps://a.c')
+        with open(os.path.join(str(tmp_path), 'frontier.log'), 'a') as f:
+            f.write('+\thttps://a.com/')
+        resumed = Checkpoint(str(tmp_path))
+        assert list(resumed.load().pages) == ['https://a.com/']
+        # the records written after the resume are not glued to the torn ones
+        resumed.enqueued('https://a.com/2')
+        resumed.page('https://a.com/1', ['https://a.com/3'])
+        await resumed.flush()
+        state = Checkpoint(str(tmp_path)).load()
+        assert state.pages == {'https://a.com/': ['https://a.com/1', 'https://a.com/2'],
+                               'https://a.com/1': ['https://a.com/3']}
+        assert state.pending == ['https://a.com/2']
+
+    @pytest.mark.asyncio
+    async def test_reset(self, tmp_path):
+        checkpoint = Checkpoint(str(tmp_path))
+        checkpoint.enqueued('https://a.com/')
+        await checkpoint.flush()
+        checkpoint.reset()
+        assert checkpoint.load().is_empty()
@@ -0,0 +1,86 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from webcrawler.dedup import ContentDeduplicator, content_hash, simhash
+
+
+def make_page(words: list[str], links: list[str], stamp: str = '') -> str:
+    anchors = ''.join(f'<a href="{link}">link</a>' for link in links)
+    return f'<html><body><p>{" ".join(words)}</p>{anchors}<!-- {stamp} --></body></html>'
+
+
+@pytest.fixture
+def words():
+    rnd = random.Random(1)
+    vocabulary = [f'word{i}' for i in range(2000)]
+    return [rnd.choice(vocabulary) for _ in range(600)]
+
+
+def test_simhash_distance(words):
+    page = make_page(words, ['/a', '/b']).encode()
+    edited = words.copy()
+    edited[300] = 'changed'
+    near = make_page(edited, ['/a', '/b']).encode()
+    other = make_page(list(reversed(words)), ['/c']).encode()
+    assert simhash(page) == simhash(page)
+    # the features are hashed with hash(), the distances vary with the seed
+    assert (simhash(page) ^ simhash(near)).bit_count() <= 10
+    assert (simhash(page) ^ simhash(other)).bit_count() > 16
+    assert content_hash(page) != content_hash(near)
+
+
+def test_exact_duplicate(words):
+    dedup = ContentDeduplicator(near_duplicates=False)
+    page = make_page(words, ['/a'])
+    assert dedup.check('https://a.com/', page) is None
+    # the same url fetched again is not a duplicate of itself
+    assert dedup.check('https://a.com/', page) is None
+    assert dedup.check('https://a.com/?utm_source=x', page) == ('https://a.com/', 'exact')
+    assert dedup.check('https://a.com/?sid=1', page.encode()) == ('https://a.com/', 'exact')
+    assert dedup.canonical('https://a.com/?sid=1') == 'https://a.com/'
+    assert dedup.stats() == {'unique': 1, 'exact_duplicates': 2, 'near_duplicates': 0}
+
+
+def test_near_duplicate(words):
+    dedup = ContentDeduplicator()
+    assert dedup.check('https://a.com/', make_page(words, ['/a'], 'generated 10:00')) is None
+    duplicate = dedup.check('https://www.a.com/', make_page(words, ['/a'], 'generated 10:01'))
+    assert duplicate == ('https://a.com/', 'near')
+    # an exact copy of the near-duplicate is an alias of the canonical page
+    assert dedup.check('https://a.com/index.html', make_page(words, ['/a'], 'generated 10:01')) \
+        == ('https://a.com/', 'exact')
+    assert dedup.aliases == {'https://www.a.com/': 'https://a.com/',
+                             'https://a.com/index.html': 'https://a.com/'}
+    assert dedup.stats() == {'unique': 1, 'exact_duplicates': 1, 'near_duplicates': 1}
+
+
+def test_distinct_pages(words):
+    dedup = ContentDeduplicator()
+    assert dedup.check('https://a.com/1', make_page(words, ['/a'])) is None
+    assert dedup.check('https://a.com/2', make_page(words[::-1], ['/a'])) is None
+    # same text with other links is a different page
+    links = [f'/page/{i}' for i in range(40)]
+    assert dedup.check('https://a.com/3', make_page(words, links)) is None
+    # short pages are compared only by the exact hash
+    assert dedup.check('https://a.com/4', make_page(['home'], ['/'], '1')) is None
+    assert dedup.check('https://a.com/5', make_page(['home'], ['/'], '2')) is None
+    assert dedup.aliases == {}
+
+
+def test_fingerprint_in_thread(words):
+    dedup = ContentDeduplicator()
+    page = make_page(words, ['/a'], 'generated 10:00')
+    near = make_page(words, ['/a'], 'generated 10:01')
+    with ThreadPoolExecutor(2) as pool:
+        fingerprints = list(pool.map(dedup.fingerprint, [page, near]))
+    # computing the fingerprints doesn't register the pages
+    assert dedup.stats() == {'unique': 0, 'exact_duplicates': 0, 'near_duplicates': 0}
+    assert dedup.match('https://a.com/', fingerprints[0]) is None
+    assert dedup.match('https://www.a.com/', fingerprints[1]) == ('https://a.com/', 'near')
+    assert dedup.fingerprint(make_page(['home'], ['/']))[1:] == (None, None)
+
+
+def test_invalid_distance():
+    with pytest.raises(ValueError):
+        ContentDeduplicator(max_distance=64)
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+import pytest
+import pytest_asyncio
+from collections import Counter
+from multiprocessing import Pipe
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from webcrawler.distributed import ConnectionWriter, Coordinator, shard_of
+
+
+def test_shard_of_is_stable_and_balanced():
+    urls = [f'https://example.com/page/{i}' for i in range(1000)]
+    shards = [shard_of(url, 4) for url in urls]
+    assert shards == [shard_of(url, 4) for url in urls]
+    assert all(150 < count < 350 for count in Counter(shards).values())
+
+
+def test_shard_of_by_host():
+    assert len({shard_of(f'https://example.com/{i}', 8, 'host') for i in range(100)}) == 1
+
+
+def test_connection_writer_never_blocks():
+    reader, conn = Pipe(duplex=False)
+    writer = ConnectionWriter(conn)
+    # far more than the buffer of the pipe, nothing is read meanwhile
+    batch = ['https://example.com/' + 'x' * 1000] * 100
+    t1 = time.perf_counter()
+    for i in range(50):
+        writer.send(('urls', i, batch))
+    assert time.perf_counter() - t1 < 1
+    assert [reader.recv()[1] for _ in range(50)] == list(range(50))
+    writer.close(timeout=5)
+    conn.close()
+    reader.close()
+
+
+def test_coordinator_invalid_arguments():
+    with pytest.raises(ValueError):
+        Coordinator('https://example.com', 0)
+    with pytest.raises(ValueError):
+        Coordinator('https://example.com', 2, partition='domain')
+
+
+@pytest.mark.asyncio
+class TestShardedCrawl:
+
+    @pytest_asyncio.fixture
+    async def local_site(self):
+        # 20 pages, each one links to the next three and to the root
+        hits: Counter = Counter()
+        async def page(request):
+            idx = int(request.match_info.get('idx', 0))
+            hits[request.path] += 1
+            links = ''.join(f'<a href="/page/{i}">{i}</a>' for i in range(idx + 1, min(idx + 4, 20)))
+            return web.Response(text=f'<html><a href="/">home</a>{links}</html>',
+                                content_type='text/html')
+        app = web.Application()
+        app.router.add_get('/', page)
+        app.router.add_get('/page/{idx}', page)
+        server = TestServer(app)
+        await server.start_server()
+        server.hits = hits
+        yield server
+        await server.close()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('shards', [1, 3])
+    async def test_sharded_crawl_visits_each_page_once(self, local_site: TestServer, shards):
+        coordinator = Coordinator(str(local_site.make_url('/')), shards,
+                                  max_producers=2, flush_interval=0.01)
+        graph = await asyncio.wait_for(asyncio.to_thread(coordinator.run), timeout=60)
+        assert graph.num_pages() == 20
+        assert len(local_site.hits) == 20
+        assert all(count == 1 for count in local_site.hits.values())
+        assert sum(stats['fetch_seconds']['count'] for stats in coordinator.stats) == 20
+        root = str(local_site.make_url('/'))
+        assert set(graph.links(root)) == {root, f'{root}page/1', f'{root}page/2', f'{root}page/3'}
+
+    @pytest.mark.asyncio
+    async def test_sharded_crawl_with_cache(self, local_site: TestServer, tmp_path):
+        coordinator = Coordinator(str(local_site.make_url('/')), 2, max_producers=2,
+                                  flush_interval=0.01, cache_dir=str(tmp_path))
+        graph = await asyncio.wait_for(asyncio.to_thread(coordinator.run), timeout=60)
+        assert graph.num_pages() == 20
+        # each shard keeps the cache of the urls it owns
+        assert sorted(os.listdir(tmp_path)) == ['shard-0', 'shard-1']
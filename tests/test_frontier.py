@@ -0,0 +1,206 @@
+import asyncio
+import time
+import pytest
+
+from webcrawler.frontier import CircuitBreaker, Frontier, TokenBucket
+
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(rate=10, burst=1)
+    now = time.monotonic()
+    assert bucket.next_available(now) == now
+    bucket.consume(now)
+    assert bucket.next_available(now) == pytest.approx(now + 0.1)
+
+
+def test_token_bucket_unlimited():
+    bucket = TokenBucket(rate=None)
+    now = time.monotonic()
+    bucket.consume(now)
+    assert bucket.next_available(now) == now
+
+
+def test_circuit_breaker_states():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_time=1.0, max_trips=2)
+    breaker.record(True, 0.0)
+    assert breaker.ready_at(0.0) == 0.0
+    breaker.record(True, 0.0)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.ready_at(0.5) == 1.0
+    # half-open: a single probe
+    assert breaker.ready_at(1.0) == 1.0
+    breaker.acquire()
+    assert breaker.ready_at(1.0) is None
+    # the probe fails, the circuit is open for twice the time
+    breaker.record(True, 1.0)
+    assert breaker.ready_at(1.5) == 3.0
+    assert breaker.given_up
+
+
+def test_circuit_breaker_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=1.0)
+    breaker.record(True, 0.0)
+    breaker.ready_at(1.0)
+    breaker.acquire()
+    breaker.record(False, 1.0)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.ready_at(1.0) == 1.0
+    assert breaker.trips == 0
+
+
+@pytest.mark.asyncio
+class TestFrontier:
+
+    @pytest.mark.asyncio
+    async def test_get_alternates_hosts(self):
+        frontier = Frontier(max_per_host=1)
+        for url in ['https://a.com/1', 'https://a.com/2', 'https://b.com/1']:
+            assert await frontier.put(url)
+        first = await frontier.get()
+        second = await frontier.get()
+        assert {first, second} == {'https://a.com/1', 'https://b.com/1'}
+        assert frontier.qsize() == 1
+
+    @pytest.mark.asyncio
+    async def test_max_concurrent_requests_per_host(self):
+        frontier = Frontier(max_per_host=1)
+        await frontier.put('https://a.com/1')
+        await frontier.put('https://a.com/2')
+        url = await frontier.get()
+        waiting = asyncio.create_task(frontier.get())
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        frontier.release(url)
+        assert await asyncio.wait_for(waiting, 1) == 'https://a.com/2'
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_per_host(self):
+        frontier = Frontier(rate_per_host=20, max_per_host=10)
+        for i in range(4):
+            await frontier.put(f'https://a.com/{i}')
+        t1 = time.monotonic()
+        for _ in range(4):
+            frontier.release(await frontier.get())
+        # the first request is immediate, the others are spaced by 50 ms
+        assert time.monotonic() - t1 >= 0.14
+
+    @pytest.mark.asyncio
+    async def test_robots_rules(self):
+        robots = 'User-agent: *\nDisallow: /private\nCrawl-delay: 2\n'
+        fetched: list[str] = []
+        async def fetcher(url):
+            fetched.append(url)
+            return robots
+        frontier = Frontier(robots_fetcher=fetcher)
+        assert await frontier.put('https://a.com/public')
+        assert not await frontier.put('https://a.com/private/page')
+        assert await frontier.put('https://a.com/other')
+        assert fetched == ['https://a.com/robots.txt']
+        assert frontier.stats()['disallowed'] == 1
+        assert frontier._hosts['a.com'].bucket.rate == 0.5
+
+    @pytest.mark.asyncio
+    async def test_put_many(self):
+        fetched: list[str] = []
+        async def fetcher(url):
+            fetched.append(url)
+            return 'User-agent: *\nDisallow: /private\n'
+        frontier = Frontier(robots_fetcher=fetcher)
+        added = await frontier.put_many(['https://a.com/1', 'https://b.com/1',
+                                         'https://a.com/private', 'https://a.com/2'])
+        assert added == ['https://a.com/1', 'https://a.com/2', 'https://b.com/1']
+        assert sorted(fetched) == ['https://a.com/robots.txt', 'https://b.com/robots.txt']
+        assert frontier.qsize() == 3
+        assert frontier.stats()['disallowed'] == 1
+        assert len(frontier._ready) == 2
+
+    @pytest.mark.asyncio
+    async def test_robots_not_available(self):
+        async def fetcher(url):
+            return None
+        frontier = Frontier(robots_fetcher=fetcher)
+        assert await frontier.put('https://a.com/private')
+        assert await frontier.get() == 'https://a.com/private'
+
+    @pytest.mark.asyncio
+    async def test_circuit_breaker_suspends_failing_host(self):
+        frontier = Frontier(failure_threshold=1, recovery_time=0.1)
+        for url in ['https://a.com/1', 'https://a.com/2', 'https://b.com/1']:
+            await frontier.put(url)
+        urls = [await frontier.get(), await frontier.get()]
+        assert urls == ['https://a.com/1', 'https://b.com/1']
+        frontier.release('https://a.com/1', failed=True)
+        frontier.release('https://b.com/1')
+        assert frontier.stats()['open_circuits'] == 1
+        t1 = time.monotonic()
+        assert await asyncio.wait_for(frontier.get(), 1) == 'https://a.com/2'
+        assert time.monotonic() - t1 >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_failing_host_is_discarded(self):
+        discarded: list[str] = []
+        frontier = Frontier(failure_threshold=1, recovery_time=0.01, max_trips=2,
+                            on_discard=discarded.append)
+        for i in range(4):
+            await frontier.put(f'https://a.com/{i}')
+        frontier.release(await frontier.get(), failed=True)
+        frontier.release(await asyncio.wait_for(frontier.get(), 1), failed=True)
+        assert discarded == ['https://a.com/2', 'https://a.com/3']
+        assert frontier.empty()
+        assert not await frontier.put('https://a.com/4')
+        assert frontier.stats()['dropped'] == 3
+
+    @pytest.mark.asyncio
+    async def test_capacity(self):
+        frontier = Frontier(max_per_host=1)
+        assert frontier.capacity() == 0
+        for url in ['https://a.com/1', 'https://a.com/2', 'https://b.com/1']:
+            await frontier.put(url)
+        assert frontier.capacity() == 2
+        urls = [await frontier.get(), await frontier.get()]
+        assert frontier.capacity() == 2
+        for url in urls:
+            frontier.release(url)
+        # only a.com has a url left
+        assert frontier.capacity() == 1
+        assert frontier.stats()['active'] == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_getter_passes_wakeup_on(self):
+        frontier = Frontier()
+        first = asyncio.create_task(frontier.get())
+        second = asyncio.create_task(frontier.get())
+        await asyncio.sleep(0)
+        await frontier.put('https://a.com/1')
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await asyncio.wait_for(second, 1) == 'https://a.com/1'
+
+    @pytest.mark.asyncio
+    async def test_retry_after_pauses_host(self):
+        frontier = Frontier()
+        await frontier.put('https://a.com/1')
+        await frontier.put('https://a.com/2')
+        t1 = time.monotonic()
+        frontier.release(await frontier.get(), failed=True, retry_after=0.1)
+        assert await asyncio.wait_for(frontier.get(), 1) == 'https://a.com/2'
+        assert time.monotonic() - t1 >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_retry_is_served_after_its_delay(self):
+        frontier = Frontier()
+        await frontier.put('https://a.com/1')
+        await frontier.put('https://b.com/1')
+        url = await frontier.get()
+        frontier.release(url, failed=True)
+        t1 = time.monotonic()
+        frontier.retry(url, 0.1)
+        assert frontier.qsize() == 2
+        other = await asyncio.wait_for(frontier.get(), 1)
+        assert other != url and time.monotonic() - t1 < 0.09
+        frontier.release(other)
+        assert await asyncio.wait_for(frontier.get(), 1) == url
+        assert time.monotonic() - t1 >= 0.09
+        frontier.release(url)
+        assert frontier.empty()
@@ -0,0 +1,124 @@
+import logging
+import queue
+import threading
+import pytest
+from logging.handlers import QueueHandler
+
+from webcrawler.logqueue import DeferredQueueHandler, LogQueue, RateLimitFilter, SamplingFilter
+
+
+class ListHandler(logging.Handler):
+    def __init__(self, level: int = logging.NOTSET):
+        super().__init__(level)
+        self.messages: list[str] = []
+        self.threads: set[str] = set()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+        self.threads.add(threading.current_thread().name)
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger('test_logqueue')
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = ListHandler(logging.INFO)
+    # only the handler of the test, whatever the capture plugin attached
+    handlers, logger.handlers = logger.handlers, [handler]
+    yield logger
+    logger.handlers = handlers
+
+
+def emit(logger: logging.Logger, level: int, times: int) -> None:
+    for i in range(times):
+        logger.log(level, 'message %d', i)
+
+
+def test_sampling_filter(logger):
+    sampling = SamplingFilter(every=3)
+    logger.handlers[0].addFilter(sampling)
+    emit(logger, logging.INFO, 7)
+    emit(logger, logging.WARNING, 2)
+    assert logger.handlers[0].messages == ['message 0', 'message 3', 'message 6',
+                                           'message 0', 'message 1']
+    assert sampling.dropped == 4
+
+
+def test_rate_limit_filter(logger, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('webcrawler.logqueue.time.monotonic', lambda: now[0])
+    rateLimit = RateLimitFilter(rate=2, burst=2)
+    logger.handlers[0].addFilter(rateLimit)
+    emit(logger, logging.INFO, 5)
+    emit(logger, logging.ERROR, 1)
+    now[0] += 0.5
+    emit(logger, logging.INFO, 1)
+    assert logger.handlers[0].messages == ['message 0', 'message 1', 'message 0',
+                                           'message 0 [3 similar messages dropped]']
+    assert rateLimit.dropped == 3
+
+
+def test_log_queue(logger):
+    handler = logger.handlers[0]
+    logQueue = LogQueue(sample_every=2)
+    logQueue.start()
+    try:
+        queueHandler, = [h for h in logger.handlers if isinstance(h, QueueHandler)]
+        assert handler not in logger.handlers
+        # no handler writes the debug records, they're discarded first
+        assert queueHandler.level == logging.INFO
+        emit(logger, logging.DEBUG, 2)
+        emit(logger, logging.INFO, 4)
+    finally:
+        logQueue.stop()
+    assert handler.messages == ['message 0', 'message 2']
+    # written by the listener thread
+    assert threading.main_thread().name not in handler.threads
+    assert logQueue.stats() == {'sampled': 2, 'rate_limited': 0}
+    assert handler in logger.handlers and logger.level == logging.DEBUG
+
+
+def test_deferred_queue_handler():
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    logger = logging.getLogger('test_logqueue.deferred')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        links = ['a']
+        logger.warning('%d links in %s', 2, 'page')
+        logger.warning('links %s', links)
+        links.append('b')
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            logger.exception('failed')
+    finally:
+        logger.removeHandler(handler)
+    deferred, frozen, failed = (records.get_nowait() for _ in range(3))
+    # the message of immutable arguments is built by the listener
+    assert (deferred.msg, deferred.args) == ('%d links in %s', (2, 'page'))
+    assert deferred.getMessage() == '2 links in page'
+    assert (frozen.getMessage(), frozen.args) == ("links ['a']", None)
+    assert failed.exc_info is None and 'ValueError: boom' in failed.exc_text
+    assert 'ValueError: boom' in logging.Formatter().format(failed)
+
+
+def test_log_queue_shares_the_listener():
+    first, second = ListHandler(), ListHandler()
+    loggers = [logging.getLogger('test_logqueue.a'), logging.getLogger('test_logqueue.b')]
+    loggers[0].addHandler(first)
+    loggers[0].addHandler(second)
+    # the same handlers in another order
+    loggers[1].addHandler(second)
+    loggers[1].addHandler(first)
+    logQueue = LogQueue()
+    logQueue.start()
+    try:
+        assert loggers[0].handlers == loggers[1].handlers
+        assert len([l for l in logQueue._listeners if first in l.handlers]) == 1
+    finally:
+        logQueue.stop()
+        for logger in loggers:
+            logger.handlers.clear()
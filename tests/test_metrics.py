@@ -0,0 +1,65 @@
+import json
+import pytest
+from aiohttp import ClientSession
+
+from webcrawler.metrics import COUNT_BUCKETS, MetricsRegistry, MetricsServer
+
+
+def test_histogram_buckets_and_quantiles():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('fetch_seconds', 'fetch')
+    for value in [0.002] * 90 + [2.0] * 10:
+        histogram.observe(value)
+    assert histogram.count == 100
+    assert histogram.sum == pytest.approx(0.18 + 20)
+    assert histogram.quantile(0.5) == 0.0025
+    assert histogram.quantile(0.99) == 2.5
+    assert registry.histogram('fetch_seconds') is histogram
+
+
+def test_counter_with_label():
+    registry = MetricsRegistry()
+    responses = registry.counter('responses', 'responses', 'code')
+    responses.inc(label='200')
+    responses.inc(label='200')
+    responses.inc(label='404')
+    assert responses.get('200') == 2
+    assert responses.total() == 3
+    assert registry.to_dict()['responses'] == {'200': 2, '404': 1}
+
+
+def test_prometheus_format():
+    registry = MetricsRegistry()
+    registry.counter('responses', 'Responses', 'code').inc(label='200')
+    registry.gauge('queued', 'Queued', lambda: 7)
+    links = registry.histogram('links_per_page', 'Links', COUNT_BUCKETS)
+    links.observe(3)
+    text = registry.to_prometheus()
+    assert 'webcrawler_responses{code="200"} 1' in text
+    assert 'webcrawler_queued 7' in text
+    assert 'webcrawler_links_per_page_bucket{le="5"} 1' in text
+    assert 'webcrawler_links_per_page_bucket{le="1"} 0' in text
+    assert 'webcrawler_links_per_page_count 1' in text
+
+
+def test_summary_skips_empty_histograms():
+    registry = MetricsRegistry()
+    registry.histogram('parse_seconds', 'parse')
+    registry.counter('bytes_downloaded', 'bytes').inc(100)
+    assert registry.summary() == 'bytes_downloaded=100'
+
+
+@pytest.mark.asyncio
+async def test_metrics_server():
+    registry = MetricsRegistry()
+    registry.counter('bytes_downloaded', 'bytes').inc(42)
+    server = MetricsServer(registry, port=0)
+    await server.start()
+    try:
+        async with ClientSession() as session:
+            async with session.get(f'http://127.0.0.1:{server.port}/metrics') as response:
+                assert 'webcrawler_bytes_downloaded 42' in await response.text()
+            async with session.get(f'http://127.0.0.1:{server.port}/metrics.json') as response:
+                assert json.loads(await response.text()) == {'bytes_downloaded': 42}
+    finally:
+        await server.stop()
@@ -0,0 +1,68 @@
+import asyncio
+import csv
+import json
+import pytest
+
+from webcrawler.output import CallbackSink, CsvSink, JsonlSink, StreamSink, open_sink
+
+
+@pytest.mark.asyncio
+async def test_jsonl_sink_buffers_writes(tmp_path):
+    path = tmp_path / 'pages.jsonl'
+    sink = JsonlSink(str(path), buffer_size=2)
+    await sink.write('https://a.com/', ['https://a.com/1', 'https://b.com/'])
+    assert path.read_text() == ''
+    await sink.write('https://a.com/1', [])
+    assert len(path.read_text().splitlines()) == 2
+    await sink.write('https://a.com/2', ['https://a.com/'])
+    await sink.close()
+    pages = [json.loads(line) for line in path.read_text().splitlines()]
+    assert pages == [{'url': 'https://a.com/', 'links': ['https://a.com/1', 'https://b.com/']},
+                     {'url': 'https://a.com/1', 'links': []},
+                     {'url': 'https://a.com/2', 'links': ['https://a.com/']}]
+
+
+@pytest.mark.asyncio
+async def test_csv_sink_writes_edges(tmp_path):
+    path = tmp_path / 'pages.csv'
+    sink = CsvSink(str(path))
+    await sink.write('https://a.com/', ['https://a.com/?q=1,2', 'https://a.com/1'])
+    await sink.write('https://a.com/1', [])
+    await sink.close()
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows == [['page', 'link'],
+                    ['https://a.com/', 'https://a.com/?q=1,2'],
+                    ['https://a.com/', 'https://a.com/1'],
+                    ['https://a.com/1', '']]
+
+
+@pytest.mark.asyncio
+async def test_callback_sink():
+    pages = []
+    async def collect(pageUrl, links):
+        pages.append((pageUrl, links))
+    await CallbackSink(collect).write('https://a.com/', [])
+    await CallbackSink(lambda pageUrl, links: pages.append(pageUrl)).write('https://a.com/1', [])
+    assert pages == [('https://a.com/', []), 'https://a.com/1']
+
+
+@pytest.mark.asyncio
+async def test_stream_sink_backpressure():
+    sink = StreamSink(max_pending=2)
+    await sink.write('https://a.com/1', [])
+    await sink.write('https://a.com/2', [])
+    writer = asyncio.create_task(sink.write('https://a.com/3', []))
+    await asyncio.sleep(0.01)
+    assert not writer.done()
+    assert await anext(sink) == ('https://a.com/1', [])
+    await asyncio.wait_for(writer, timeout=1)
+    await sink.close()
+    assert [pageUrl async for pageUrl, _ in sink] == ['https://a.com/2', 'https://a.com/3']
+
+
+def test_open_sink(tmp_path):
+    assert isinstance(open_sink(str(tmp_path / 'out.jsonl')), JsonlSink)
+    assert isinstance(open_sink(str(tmp_path / 'out.txt'), 'csv'), CsvSink)
+    with pytest.raises(ValueError):
+        open_sink(str(tmp_path / 'out.xml'))
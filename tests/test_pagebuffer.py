@@ -0,0 +1,120 @@
+import asyncio
+import os
+import threading
+import pytest
+
+from webcrawler.metrics import MetricsRegistry
+from webcrawler.network.httpmanager import HttpResult
+from webcrawler.pagebuffer import PageBuffer, SpillSegment
+
+
+def page(idx: int, size: int, text: bool = False) -> HttpResult:
+    body = f'<html>{idx}</html>'.ljust(size, 'x')
+    return HttpResult(body if text else body.encode(), f'https://a.com/{idx}')
+
+
+async def blocked(coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coroutine)
+    await asyncio.sleep(0.01)
+    assert not task.done()
+    return task
+
+
+@pytest.mark.asyncio
+async def test_max_pages():
+    buffer = PageBuffer(max_pages=1)
+    await buffer.put(page(0, 10))
+    assert buffer.full()
+    waiting = await blocked(buffer.put(page(1, 10)))
+    _, first = await buffer.get()
+    await asyncio.wait_for(waiting, 1)
+    assert first.pageUrl == 'https://a.com/0'
+    assert buffer.qsize() == 1
+
+
+@pytest.mark.asyncio
+async def test_max_bytes():
+    buffer = PageBuffer(max_pages=0, max_bytes=100)
+    # a page bigger than the budget is accepted when nothing is buffered
+    await buffer.put(page(0, 150))
+    waiting = await blocked(buffer.put(page(1, 50)))
+    await buffer.get()
+    await asyncio.wait_for(waiting, 1)
+    await buffer.put(page(2, 50))
+    assert buffer.nbytes() == 100 and buffer.full()
+    (await blocked(buffer.put(page(3, 1)))).cancel()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('text', [False, True])
+async def test_spill_to_disk(tmp_path, text):
+    metrics = MetricsRegistry()
+    buffer = PageBuffer(max_pages=0, max_bytes=100, spill=True, spill_dir=str(tmp_path),
+                        segment_bytes=250, metrics=metrics)
+    pages = [page(i, 100, text) for i in range(6)]
+    bodies = [p.htmlPage for p in pages]
+    for p in pages:
+        await asyncio.wait_for(buffer.put(p), 1)
+    assert buffer.nbytes() == 100
+    assert buffer.stats() == {'queued': 6, 'bytes': 100, 'spilled': 5,
+                              'spilled_bytes': 500, 'segments': 3}
+    assert metrics.get('pages_spilled_bytes').get() == 500
+    received = [(await buffer.get())[1] for _ in range(6)]
+    assert [p.htmlPage for p in received] == bodies
+    assert [p.pageUrl for p in received] == [f'https://a.com/{i}' for i in range(6)]
+    # the segments read back are removed, the current one is kept
+    assert buffer.stats()['segments'] == 1
+    assert metrics.get('spilled_pages').total() == 5
+    buffer.close()
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_max_spill_bytes(tmp_path):
+    buffer = PageBuffer(max_pages=0, max_bytes=100, spill=True, spill_dir=str(tmp_path),
+                        max_spill_bytes=200)
+    for i in range(3):
+        await buffer.put(page(i, 100))
+    waiting = await blocked(buffer.put(page(3, 100)))
+    # the memory freed first takes the page
+    await buffer.get()
+    await asyncio.wait_for(waiting, 1)
+    assert buffer.stats() == {'queued': 3, 'bytes': 100, 'spilled': 2,
+                              'spilled_bytes': 200, 'segments': 1}
+    buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_get_cancelled_while_reading(tmp_path, monkeypatch):
+    buffer = PageBuffer(max_pages=0, max_bytes=100, spill=True, spill_dir=str(tmp_path))
+    spilled = page(1, 100)
+    body = spilled.htmlPage
+    await buffer.put(page(0, 100))
+    await buffer.put(spilled)
+    await buffer.get()
+    reading, release = threading.Event(), threading.Event()
+    read = SpillSegment.read
+    def slow_read(segment, offset, length):
+        reading.set()
+        release.wait(1)
+        return read(segment, offset, length)
+    monkeypatch.setattr(SpillSegment, 'read', slow_read)
+    claimed = []
+    getting = asyncio.create_task(buffer.get(lambda: claimed.append(True)))
+    await asyncio.to_thread(reading.wait, 1)
+    assert claimed and buffer.empty()
+    getting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await getting
+    release.set()
+    # the page is queued again, its body still on disk
+    assert buffer.qsize() == 1 and buffer.stats()['spilled_bytes'] == 100
+    _, again = await buffer.get()
+    assert again.pageUrl == 'https://a.com/1' and again.htmlPage == body
+    buffer.close()
+
+
+def test_task_done():
+    buffer = PageBuffer()
+    with pytest.raises(ValueError):
+        buffer.task_done()
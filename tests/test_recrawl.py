@@ -0,0 +1,84 @@
+from webcrawler.recrawl import CrawlHistory
+
+
+def test_new_page_is_due(tmp_path):
+    history = CrawlHistory(str(tmp_path / 'history.db'))
+    assert history.is_due('https://a.com/')
+    history.close()
+
+
+def test_lastmod_decides(tmp_path):
+    history = CrawlHistory(str(tmp_path / 'history.db'))
+    history.record('https://a.com/', '<html>1</html>', now=1000)
+    history.observe('https://a.com/', lastmod=900)
+    assert not history.is_due('https://a.com/', now=10 ** 6)
+    history.observe('https://a.com/', lastmod=1100)
+    assert history.is_due('https://a.com/', now=1200)
+    history.close()
+
+
+def test_max_interval_bounds_lastmod(tmp_path):
+    history = CrawlHistory(str(tmp_path / 'history.db'))
+    history.observe('https://a.com/', lastmod=100)
+    history.record('https://a.com/', '<html>1</html>', now=200)
+    assert not history.is_due('https://a.com/', now=200 + history.max_interval - 1)
+    assert history.is_due('https://a.com/', now=200 + 10 * 365 * 86400)
+    history.observe('https://a.com/', changefreq='never')
+    assert history.is_due('https://a.com/', now=200 + history.max_interval)
+    history.close()
+
+
+def test_undeclared_lastmod_is_forgotten(tmp_path):
+    path = str(tmp_path / 'history.db')
+    history = CrawlHistory(path, min_interval=10)
+    history.observe('https://a.com/', lastmod=100)
+    history.observe('https://a.com/b', lastmod=100)
+    history.record('https://a.com/', '<html>1</html>', now=200)
+    history.save()
+    history.close()
+    history = CrawlHistory(path, min_interval=10)
+    history.observe('https://a.com/b', lastmod=150)
+    history.forget_undeclared()
+    history.save()
+    assert history.get('https://a.com/').lastmod is None
+    assert history.get('https://a.com/b').lastmod == 150
+    assert history.is_due('https://a.com/', now=200 + history.get('https://a.com/').interval)
+    history.close()
+
+
+def test_changefreq_decides(tmp_path):
+    history = CrawlHistory(str(tmp_path / 'history.db'))
+    history.observe('https://a.com/', changefreq='hourly')
+    history.record('https://a.com/', '<html>1</html>', now=0)
+    assert not history.is_due('https://a.com/', now=1800)
+    assert history.is_due('https://a.com/', now=3600)
+    history.close()
+
+
+def test_interval_adapts_to_changes(tmp_path):
+    history = CrawlHistory(str(tmp_path / 'history.db'), min_interval=10, max_interval=10 ** 6)
+    url = 'https://a.com/'
+    assert history.record(url, 'v1', now=0)
+    interval = history.get(url).interval
+    assert not history.record(url, 'v1', now=1)
+    assert history.get(url).interval == interval * 2
+    assert history.record(url, 'v2', now=2)
+    assert history.get(url).interval == interval
+    assert not history.is_due(url, now=2 + interval - 1)
+    assert history.is_due(url, now=2 + interval)
+    assert history.stats() == {'pages': 1, 'due': 1, 'not_due': 1}
+    history.close()
+
+
+def test_history_is_saved(tmp_path):
+    path = str(tmp_path / 'history.db')
+    history = CrawlHistory(path)
+    history.observe('https://a.com/', lastmod=50)
+    history.record('https://a.com/', 'v1', now=100)
+    history.save()
+    history.close()
+    history = CrawlHistory(path)
+    page = history.get('https://a.com/')
+    assert (page.fetched_at, page.lastmod) == (100, 50)
+    assert not history.is_due('https://a.com/', now=200)
+    history.close()
@@ -0,0 +1,38 @@
+import asyncio
+import logging
+import sys
+import pytest
+
+from webcrawler.runtime import loop_factory, run
+
+
+async def running_loop() -> str:
+    await asyncio.sleep(0)
+    return type(asyncio.get_running_loop()).__module__
+
+
+def test_run_on_asyncio():
+    assert loop_factory('asyncio') is None
+    assert run(running_loop()).startswith('asyncio')
+
+
+def test_uvloop_falls_back_to_asyncio(monkeypatch, caplog):
+    # a None entry makes the import fail as if uvloop was not installed
+    monkeypatch.setitem(sys.modules, 'uvloop', None)
+    with caplog.at_level(logging.WARNING, logger='webcrawler'):
+        assert run(running_loop(), 'uvloop').startswith('asyncio')
+    assert 'uvloop is not installed' in caplog.text
+
+
+def test_uvloop():
+    uvloop = pytest.importorskip('uvloop')
+    assert loop_factory('uvloop') is uvloop.new_event_loop
+    assert run(running_loop(), 'uvloop').startswith('uvloop')
+
+
+def test_unknown_loop():
+    coroutine = running_loop()
+    with pytest.raises(ValueError):
+        run(coroutine, 'trio')
+    # the coroutine is closed, it's not reported as never awaited
+    assert coroutine.cr_frame is None
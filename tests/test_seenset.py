@@ -0,0 +1,89 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from webcrawler.seenset import BloomSeenSet, DiskSeenSet, MemorySeenSet
+
+
+@pytest.fixture(params=['memory', 'bloom', 'disk'])
+def seen_set(request, tmp_path):
+    if request.param == 'memory':
+        seen = MemorySeenSet()
+    elif request.param == 'bloom':
+        seen = BloomSeenSet(capacity=1000, error_rate=0.001)
+    else:
+        seen = DiskSeenSet(str(tmp_path / 'seen.db'), commit_every=10)
+    yield seen
+    seen.close()
+
+
+def test_add_new_url(seen_set):
+    assert seen_set.add('https://example.com/')
+    assert 'https://example.com/' in seen_set
+    assert 'https://example.com/other' not in seen_set
+    assert len(seen_set) == 1
+
+
+def test_add_same_url_twice(seen_set):
+    assert seen_set.add('https://example.com/')
+    assert not seen_set.add('https://example.com/')
+    assert len(seen_set) == 1
+
+
+def test_add_many(seen_set):
+    assert seen_set.add('https://example.com/1')
+    urls = ['https://example.com/2', 'https://example.com/1', 'https://example.com/3',
+            'https://example.com/2']
+    assert seen_set.add_many(urls) == ['https://example.com/2', 'https://example.com/3']
+    assert seen_set.add_many(urls) == []
+    assert len(seen_set) == 3
+    assert 'https://example.com/3' in seen_set
+
+
+def test_bloom_size_from_capacity():
+    seen = BloomSeenSet(capacity=10_000_000, error_rate=0.01)
+    stats = seen.stats()
+    # ~9.6 bits per url for a 1% false positive rate
+    assert 11_500_000 < stats['memory_bytes'] < 12_500_000
+    assert stats['hashes'] == 7
+
+
+def test_bloom_false_positive_rate():
+    seen = BloomSeenSet(capacity=2000, error_rate=0.01)
+    for i in range(2000):
+        seen.add(f'https://example.com/page/{i}')
+    falsePositives = sum(f'https://example.com/other/{i}' in seen for i in range(2000))
+    assert falsePositives / 2000 < 0.03
+    assert 0.005 < seen.false_positive_rate() < 0.02
+    assert 0 < seen.stats()['fill_ratio'] < 1
+
+
+def test_bloom_invalid_parameters():
+    with pytest.raises(ValueError):
+        BloomSeenSet(capacity=0)
+    with pytest.raises(ValueError):
+        BloomSeenSet(error_rate=1.5)
+
+
+def test_disk_seen_set_reopen(tmp_path):
+    path = str(tmp_path / 'seen.db')
+    seen = DiskSeenSet(path)
+    seen.add('https://example.com/')
+    seen.close()
+    seen = DiskSeenSet(path)
+    assert 'https://example.com/' in seen
+    assert len(seen) == 1
+    assert not seen.add('https://example.com/')
+    seen.close()
+
+
+def test_disk_seen_set_add_many_in_threads(tmp_path):
+    seen = DiskSeenSet(str(tmp_path / 'seen.db'), commit_every=100)
+    urls = [f'https://example.com/{i}' for i in range(2000)]
+    batches = [urls[i::4] + urls[:100] for i in range(4)]
+    with ThreadPoolExecutor(4) as pool:
+        added = [url for batch in pool.map(seen.add_many, batches) for url in batch]
+    assert sorted(added) == sorted(urls)
+    assert len(seen) == 2000
+    seen.close()
+    seen = DiskSeenSet(str(tmp_path / 'seen.db'))
+    assert len(seen) == 2000
+    seen.close()
@@ -0,0 +1,94 @@
+import pytest
+
+from webcrawler.sitemaps import SitemapEntry, SitemapParser, SitemapSeeder, parse_date
+
+URLSET = b'''<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"
+        xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">
+  <url>
+    <loc>https://a.com/</loc>
+    <lastmod>2024-05-01</lastmod>
+    <changefreq>daily</changefreq>
+    <priority>0.8</priority>
+    <image:image><image:loc>https://a.com/logo.png</image:loc></image:image>
+  </url>
+  <url><loc>https://a.com/about</loc></url>
+</urlset>'''
+
+INDEX = b'''<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://a.com/sitemap-1.xml.gz</loc><lastmod>2024-05-01T10:00:00Z</lastmod></sitemap>
+</sitemapindex>'''
+
+RSS = b'''<rss version="2.0"><channel><title>a</title><link>https://a.com/</link>
+  <item><title>post</title><link>https://a.com/post</link>
+  <pubDate>Wed, 01 May 2024 10:00:00 GMT</pubDate></item>
+</channel></rss>'''
+
+ATOM = b'''<feed xmlns="http://www.w3.org/2005/Atom"><link href="https://a.com/"/>
+  <entry><link rel="edit" href="https://a.com/edit/1"/><link href="https://a.com/post/1"/>
+  <updated>2024-05-01T10:00:00+00:00</updated></entry>
+</feed>'''
+
+
+def parse(document: bytes, chunk: int = 7) -> tuple[str, list[SitemapEntry]]:
+    parser = SitemapParser()
+    entries = []
+    for i in range(0, len(document), chunk):
+        entries.extend(parser.feed(document[i:i + chunk]))
+    entries.extend(parser.close())
+    return parser.kind, entries
+
+
+def test_parse_date():
+    assert parse_date('2024-05-01') == parse_date('2024-05-01T00:00:00Z') == 1714521600
+    assert parse_date('Wed, 01 May 2024 00:00:00 GMT') == 1714521600
+    assert parse_date('yesterday') is None
+
+
+def test_parse_urlset_in_chunks():
+    kind, entries = parse(URLSET)
+    assert kind == 'urlset'
+    assert entries == [SitemapEntry('https://a.com/', parse_date('2024-05-01'), 'daily', 0.8),
+                       SitemapEntry('https://a.com/about')]
+
+
+def test_parse_sitemap_index():
+    kind, entries = parse(INDEX)
+    assert kind == 'sitemapindex'
+    assert entries == [SitemapEntry('https://a.com/sitemap-1.xml.gz',
+                                    parse_date('2024-05-01T10:00:00Z'), sitemap=True)]
+
+
+@pytest.mark.parametrize('document, kind, url', [(RSS, 'rss', 'https://a.com/post'),
+                                                 (ATOM, 'feed', 'https://a.com/post/1')])
+def test_parse_feeds(document, kind, url):
+    parsedKind, entries = parse(document)
+    assert parsedKind == kind
+    assert entries == [SitemapEntry(url, parse_date('2024-05-01T10:00:00Z'))]
+
+
+@pytest.mark.asyncio
+async def test_seeder_follows_indexes():
+    documents = {'https://a.com/sitemap.xml': INDEX,
+                 'https://a.com/sitemap-1.xml.gz': URLSET,
+                 'https://a.com/feed': b'<rss><broken'}
+    fetched = []
+    async def fetcher(url):
+        fetched.append(url)
+        if url in documents:
+            yield documents[url]
+    seeder = SitemapSeeder(['https://a.com/feed'])
+    entries = [entry.url async for entry in seeder.entries(fetcher, 'https://a.com/', [])]
+    assert entries == ['https://a.com/', 'https://a.com/about']
+    assert fetched == ['https://a.com/feed', 'https://a.com/sitemap.xml',
+                       'https://a.com/sitemap-1.xml.gz']
+
+
+@pytest.mark.asyncio
+async def test_seeder_limits():
+    async def fetcher(url):
+        yield URLSET
+    seeder = SitemapSeeder(discover=False, max_urls=1)
+    assert [entry async for entry in seeder.entries(fetcher, 'https://a.com/')] == []
+    seeder = SitemapSeeder(['https://a.com/s.xml'], discover=False, max_urls=1)
+    assert [entry.url async for entry in seeder.entries(fetcher, 'https://a.com/')] == ['https://a.com/']
@@ -1,11 +1,30 @@
 import pytest
 import pytest_asyncio
 import asyncio
+import gzip
+import json
+import os
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 
 from .utils.utility import read_file_content, extract_link
 from webcrawler.taskmanager import TaskManager
 from webcrawler.models import HttpUrl, Page, Link
 from webcrawler.network.httpmanager import HttpManager, HttpResult
+from webcrawler.parsing import Parser, PoolParser
+from webcrawler.seenset import BloomSeenSet, DiskSeenSet
+from webcrawler.frontier import Frontier
+from webcrawler.pagebuffer import PageBuffer
+from webcrawler.checkpoint import Checkpoint
+from webcrawler.autoscaler import Autoscaler
+from webcrawler.output import StreamSink, open_sink
+from webcrawler.models import GraphFile
+from webcrawler.dedup import ContentDeduplicator
+from webcrawler.urlfilter import UrlFilter
+from webcrawler.sitemaps import SitemapSeeder
+from webcrawler.recrawl import CrawlHistory
+from webcrawler.network.httpcache import HttpCache
 
 @pytest.mark.asyncio(loop_scope='class')
 class TestTaskManager:
@@ -26,7 +45,8 @@ class TestTaskManager:
 
     @pytest_asyncio.fixture()
     async def task_manager(self, base_page: HttpUrl, http_manager: HttpManager):
-        taskMgr = TaskManager(base_page)
+        # no robots.txt download in the unit tests
+        taskMgr = TaskManager(base_page, frontier=Frontier())
         yield taskMgr
         await taskMgr.shutdown()
 
@@ -132,6 +152,42 @@ class TestTaskManager:
         assert page_url in pages
         assert pages[page_url] == expectedPage
 
+    @pytest.mark.asyncio()
+    async def test_process_link_relative_to_page(self, task_manager: TaskManager):
+        page_url = 'https://google.com/a/b'
+        await task_manager.process_link(pageUrl=page_url, link='child')
+        await task_manager.process_link(pageUrl=page_url, link='https://www.google.com/c')
+        pages = task_manager.get_all_pages()
+        assert pages[page_url] == Page(url=Link(url=page_url),
+                                       links={Link(url='https://google.com/a/child'),
+                                              Link(url='https://google.com/c')})
+
+    @pytest.mark.asyncio()
+    async def test_process_links_in_batch(self, task_manager: TaskManager):
+        page_url = 'https://google.com/a/b'
+        await task_manager.process_link(pageUrl=page_url, link='https://google.com/seen')
+        puts: list[list[str]] = []
+        put_many = task_manager._frontier.put_many
+        async def tracked_put_many(urls):
+            puts.append(list(urls))
+            return await put_many(urls)
+        task_manager._frontier.put_many = tracked_put_many
+        links = await task_manager.process_links(
+            ['child', '', 'child', '/a/child#top', 'https://google.com/seen',
+             'mailto:a@b.com', 'https://example.com/x', 'other'], page_url)
+        assert links == ['https://google.com/a/child', 'https://google.com/seen',
+                         'https://example.com/x', 'https://google.com/a/other']
+        # one enqueue of the new internal links only
+        assert puts == [['https://google.com/a/child', 'https://google.com/a/other']]
+        assert task_manager._frontier.qsize() == 3
+        assert task_manager.get_graph().links(page_url) == ['https://google.com/seen', *links[:1],
+                                                            *links[2:]]
+
+    @pytest.mark.asyncio()
+    async def test_process_links_without_links(self, task_manager: TaskManager):
+        assert await task_manager.process_links(['mailto:a@b.com'], 'https://google.com/') == []
+        assert task_manager.get_graph().has_page('https://google.com/')
+
     @pytest.mark.asyncio
     async def test_get_links(self, htmlfile, task_manager: TaskManager):
         html_page = read_file_content(htmlfile)
@@ -153,3 +209,447 @@ class TestTaskManager:
 
 
 
+@pytest.mark.asyncio
+class TestTaskManagerCrawl:
+
+    @pytest_asyncio.fixture
+    async def local_site(self):
+        # page i links to page i+1 and back to the root
+        async def page(request):
+            idx = int(request.match_info.get('idx', 0))
+            body = '<a href="/">home</a>'
+            if idx < 5:
+                body += f'<a href="/page/{idx + 1}">next</a>'
+            await asyncio.sleep(0.01)
+            return web.Response(text=f'<html>{body}</html>', content_type='text/html')
+        app = web.Application()
+        app.router.add_get('/', page)
+        app.router.add_get('/page/{idx}', page)
+        server = TestServer(app)
+        await server.start_server()
+        yield server
+        await server.close()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('producers, consumers', [(1, 1), (3, 2)])
+    async def test_crawl_completes_when_frontier_is_drained(self, local_site: TestServer,
+                                                            producers, consumers):
+        taskMgr = TaskManager(HttpUrl(str(local_site.make_url('/'))),
+                              max_producers=producers, max_consumers=consumers)
+        await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        assert taskMgr.get_num_html_pages() == 6
+
+    @pytest.mark.asyncio
+    async def test_crawl_fills_metrics(self, local_site: TestServer):
+        taskMgr = TaskManager(HttpUrl(str(local_site.make_url('/'))),
+                              max_producers=2, max_consumers=2)
+        await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        metrics = taskMgr.get_metrics().to_dict()
+        assert metrics['responses'] == {'200': 6}
+        assert metrics['fetch_seconds']['count'] == 6
+        # the pages and robots.txt
+        assert metrics['ttfb_seconds']['count'] == 7
+        assert metrics['connect_seconds']['count'] >= 1
+        assert metrics['frontier_wait_seconds']['count'] == 6
+        assert metrics['pages_wait_seconds']['count'] == 6
+        assert metrics['parse_seconds']['count'] == 6
+        assert metrics['links_per_page']['count'] == 6
+        assert metrics['bytes_downloaded'] > 0
+        assert metrics['frontier_queued'] == metrics['pending_work'] == 0
+
+    @pytest.mark.asyncio
+    async def test_crawl_with_autoscaler(self, local_site: TestServer):
+        autoscaler = Autoscaler(max_producers=4, max_consumers=2, interval=0.01)
+        taskMgr = TaskManager(HttpUrl(str(local_site.make_url('/'))), autoscaler=autoscaler)
+        await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        assert taskMgr.get_num_html_pages() == 6
+        assert taskMgr.get_metrics().get('loop_lag_seconds').count > 0
+
+    @pytest.mark.asyncio
+    async def test_scale_tasks_during_crawl(self, local_site: TestServer):
+        taskMgr = TaskManager(HttpUrl(str(local_site.make_url('/'))))
+        fetch = taskMgr._httpmanager.fetch
+        async def scaling_fetch(url):
+            # grow while the crawl is running, then shrink back
+            if taskMgr.get_load()['producers'] == 1:
+                taskMgr.set_producers(4)
+                taskMgr.set_consumers(3)
+            else:
+                taskMgr.set_producers(1)
+                taskMgr.set_consumers(1)
+            return await fetch(url)
+        taskMgr._httpmanager.fetch = scaling_fetch
+        await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        assert taskMgr.get_num_html_pages() == 6
+
+    @pytest.mark.asyncio
+    async def test_idle_tasks_retire_immediately(self):
+        taskMgr = TaskManager(HttpUrl('https://example.com'), frontier=Frontier())
+        taskMgr.set_producers(3)
+        taskMgr.set_consumers(2)
+        await asyncio.sleep(0)
+        assert taskMgr.get_load()['producers'] == 3
+        taskMgr.set_producers(1)
+        taskMgr.set_consumers(1)
+        await asyncio.sleep(0)
+        load = taskMgr.get_load()
+        assert (load['producers'], load['consumers']) == (1, 1)
+        assert len(taskMgr._producers) == len(taskMgr._consumers) == 1
+        await taskMgr.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_crawl_streams_pages_without_graph(self, local_site: TestServer):
+        root = str(local_site.make_url('/'))
+        sink = StreamSink(max_pending=1)
+        taskMgr = TaskManager(HttpUrl(root), output=sink, keep_graph=False)
+        crawl = asyncio.create_task(taskMgr.crawl())
+        pages = {pageUrl: links async for pageUrl, links in sink}
+        await asyncio.wait_for(crawl, timeout=5)
+        assert len(pages) == taskMgr.get_num_html_pages() == 6
+        assert pages[root] == [root, f'{root}page/1']
+        assert taskMgr.get_graph().num_pages() == 0
+
+    @pytest.mark.asyncio
+    async def test_crawl_writes_graph(self, local_site: TestServer, tmp_path):
+        path = str(tmp_path / 'graph.bin')
+        taskMgr = TaskManager(HttpUrl(str(local_site.make_url('/'))), graph_out=path)
+        await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        with GraphFile(path) as graphFile:
+            assert graphFile.num_pages() == 6
+            assert graphFile.num_edges == taskMgr.get_graph().num_edges()
+
+    @pytest.mark.asyncio
+    async def test_crawl_skips_duplicate_pages(self):
+        # /mirror/ serves the same page as /, so its links are never enqueued
+        async def page(request):
+            body = '<a href="/mirror/">mirror</a><a href="/1">one</a>'
+            return web.Response(text=f'<html>{body}</html>', content_type='text/html')
+        async def leaf(request):
+            return web.Response(text='<html><a href="/">home</a></html>', content_type='text/html')
+        app = web.Application()
+        app.router.add_get('/', page)
+        app.router.add_get('/mirror/', page)
+        app.router.add_get('/1', leaf)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            root = str(server.make_url('/'))
+            taskMgr = TaskManager(HttpUrl(root), dedup=ContentDeduplicator())
+            await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        finally:
+            await server.close()
+        assert taskMgr.get_aliases() == {f'{root}mirror/': root}
+        assert sorted(taskMgr.get_graph().pages()) == [root, f'{root}1']
+        metrics = taskMgr.get_metrics()
+        assert metrics.get('duplicate_pages').get('exact') == 1
+        assert metrics.get('links_saved').total() == 2
+
+    @pytest.mark.asyncio
+    async def test_crawl_records_duplicate_pages(self, tmp_path):
+        async def page(request):
+            body = '<a href="/mirror/">mirror</a><a href="/1">one</a>'
+            return web.Response(text=f'<html>{body}</html>', content_type='text/html')
+        async def leaf(request):
+            return web.Response(text='<html><a href="/">home</a></html>', content_type='text/html')
+        app = web.Application()
+        app.router.add_get('/', page)
+        app.router.add_get('/mirror/', page)
+        app.router.add_get('/1', leaf)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            root = str(server.make_url('/'))
+            sink = StreamSink()
+            taskMgr = TaskManager(HttpUrl(root), dedup=ContentDeduplicator(), output=sink,
+                                  checkpoint=Checkpoint(str(tmp_path)))
+            crawl = asyncio.create_task(taskMgr.crawl())
+            pages = {pageUrl: links async for pageUrl, links in sink}
+            await asyncio.wait_for(crawl, timeout=5)
+            # the resumed crawl knows the duplicate and doesn't fetch it again
+            resumed = TaskManager(HttpUrl(root), dedup=ContentDeduplicator(),
+                                  checkpoint=Checkpoint(str(tmp_path)), resume=True)
+            await asyncio.wait_for(resumed.crawl(), timeout=5)
+        finally:
+            await server.close()
+        assert pages[f'{root}mirror/'] == [root]
+        state = Checkpoint(str(tmp_path)).load()
+        assert state.aliases == {f'{root}mirror/': root}
+        assert f'{root}mirror/' not in state.pages
+        assert resumed.get_aliases() == {f'{root}mirror/': root}
+        assert sorted(resumed.get_graph().pages()) == [root, f'{root}1']
+
+    @pytest.mark.asyncio
+    async def test_crawl_filters_links_before_fetching(self):
+        async def page(request):
+            body = '<a href="/doc.pdf">pdf</a><a href="/p?utm_source=x">p</a><a href="/p">p</a>'
+            return web.Response(text=f'<html>{body}</html>', content_type='text/html')
+        app = web.Application()
+        app.router.add_get('/', page)
+        app.router.add_get('/p', page)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            root = str(server.make_url('/'))
+            taskMgr = TaskManager(HttpUrl(root), url_filter=UrlFilter())
+            fetched: list[str] = []
+            fetch = taskMgr._httpmanager.fetch
+            async def tracked_fetch(url):
+                fetched.append(url)
+                return await fetch(url)
+            taskMgr._httpmanager.fetch = tracked_fetch
+            await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        finally:
+            await server.close()
+        assert sorted(fetched) == [root, f'{root}p']
+        # the links filtered are still in the graph
+        assert taskMgr.get_graph().links(root) == [f'{root}doc.pdf', f'{root}p']
+        assert taskMgr.get_metrics().get('filtered_urls').get('extension') == 1
+
+    @pytest.mark.asyncio
+    async def test_add_urls_applies_url_filter(self):
+        taskMgr = TaskManager(HttpUrl('https://google.com'), frontier=Frontier(),
+                              url_filter=UrlFilter())
+        await taskMgr.add_urls(['https://google.com/a', 'https://google.com/a.pdf'])
+        assert taskMgr._frontier.qsize() == 1
+        await taskMgr.shutdown()
+
+    @pytest_asyncio.fixture
+    async def sitemap_site(self):
+        # the pages are only listed in the gzipped sitemap, not linked
+        sitemap = gzip.compress(b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                                b'<url><loc>/a</loc><lastmod>2024-05-01</lastmod></url>'
+                                b'<url><loc>/b</loc></url>'
+                                b'<url><loc>https://elsewhere.com/c</loc></url></urlset>')
+        requests: list[str] = []
+        async def page(request):
+            requests.append(request.path)
+            return web.Response(text=f'<html>{request.path}</html>', content_type='text/html',
+                                headers={'ETag': f'"{request.path}"'})
+        async def robots(request):
+            return web.Response(text=f'Sitemap: {request.url.with_path("/map.xml.gz")}')
+        async def sitemap_file(request):
+            return web.Response(body=sitemap, content_type='application/octet-stream')
+        app = web.Application()
+        app.router.add_get('/robots.txt', robots)
+        app.router.add_get('/map.xml.gz', sitemap_file)
+        for path in ('/', '/a', '/b'):
+            app.router.add_get(path, page)
+        server = TestServer(app)
+        await server.start_server()
+        server.requests = requests
+        yield server
+        await server.close()
+
+    @pytest.mark.asyncio
+    async def test_crawl_seeds_from_sitemaps(self, sitemap_site: TestServer):
+        root = str(sitemap_site.make_url('/'))
+        taskMgr = TaskManager(HttpUrl(root), sitemaps=SitemapSeeder())
+        await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        assert sorted(taskMgr.get_graph().pages()) == [root, f'{root}a', f'{root}b']
+        assert taskMgr.get_metrics().get('seeded_urls').total() == 2
+
+    @pytest.mark.asyncio
+    async def test_recrawl_skips_pages_not_changed(self, sitemap_site: TestServer, tmp_path):
+        root = HttpUrl(str(sitemap_site.make_url('/')))
+        async def crawl():
+            history = CrawlHistory(str(tmp_path / 'history.db'))
+            cache = HttpCache(str(tmp_path / 'cache'))
+            httpMgr = HttpManager(root, cache=cache)
+            taskMgr = TaskManager(root, httpmgr=httpMgr, sitemaps=SitemapSeeder(),
+                                  history=history)
+            await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+            history.close()
+            cache.close()
+            return taskMgr
+        await crawl()
+        assert sorted(sitemap_site.requests) == ['/', '/a', '/b']
+        sitemap_site.requests.clear()
+        taskMgr = await crawl()
+        # /a is older than its download, / and /b are within their interval
+        assert sitemap_site.requests == []
+        assert taskMgr.get_metrics().get('not_due_pages').total() == 3
+        assert len(list(taskMgr.get_graph().pages())) == 3
+
+    @pytest.mark.asyncio
+    async def test_crawl_discards_failing_host(self):
+        async def page(request):
+            body = ''.join(f'<a href="/dead/{i}">{i}</a>' for i in range(5))
+            return web.Response(text=f'<html>{body}</html>', content_type='text/html')
+        async def dead(request):
+            return web.Response(status=503)
+        app = web.Application()
+        app.router.add_get('/', page)
+        app.router.add_get('/dead/{idx}', dead)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            root = HttpUrl(str(server.make_url('/')))
+            frontier = Frontier(max_per_host=1, failure_threshold=2, max_trips=1)
+            taskMgr = TaskManager(root, frontier=frontier,
+                                  httpmgr=HttpManager(root, retries=0))
+            await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        finally:
+            await server.close()
+        assert taskMgr._numFetched == 3
+        assert frontier.stats()['dropped'] == 3
+
+    @pytest.mark.asyncio
+    async def test_crawl_retries_through_frontier(self):
+        calls: list[str] = []
+        async def page(request):
+            calls.append(request.path)
+            return web.Response(text='<html><a href="/flaky">f</a><a href="/throttled">t</a>'
+                                '<a href="/ok">o</a></html>', content_type='text/html')
+        async def flaky(request):
+            calls.append(request.path)
+            if calls.count('/flaky') == 1:
+                return web.Response(status=503)
+            return web.Response(text='<html>flaky</html>', content_type='text/html')
+        async def throttled(request):
+            calls.append(request.path)
+            if calls.count('/throttled') == 1:
+                return web.Response(status=429, headers={'Retry-After': '1'})
+            return web.Response(text='<html>throttled</html>', content_type='text/html')
+        async def ok(request):
+            calls.append(request.path)
+            return web.Response(text='<html>ok</html>', content_type='text/html')
+        app = web.Application()
+        app.router.add_get('/', page)
+        app.router.add_get('/flaky', flaky)
+        app.router.add_get('/throttled', throttled)
+        app.router.add_get('/ok', ok)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            root = HttpUrl(str(server.make_url('/')))
+            # the Retry-After longer than max_retry_after is retried too
+            taskMgr = TaskManager(root, max_producers=1,
+                                  httpmgr=HttpManager(root, backoff=0.3, max_retry_after=0.1))
+            await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        finally:
+            await server.close()
+        assert sorted(calls) == ['/', '/flaky', '/flaky', '/ok', '/throttled', '/throttled']
+        assert taskMgr.get_metrics().get('retries').total() == 2
+        assert len(list(taskMgr.get_graph().pages())) == 4
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('disk', [False, True])
+    async def test_crawl_fetches_each_page_once(self, local_site: TestServer, tmp_path, disk):
+        seenSet = DiskSeenSet(str(tmp_path / 'seen.db')) if disk \
+            else BloomSeenSet(capacity=1000, error_rate=0.001)
+        taskMgr = TaskManager(HttpUrl(str(local_site.make_url('/'))), seen_set=seenSet,
+                              max_producers=3, max_consumers=2)
+        fetched: list[str] = []
+        fetch = taskMgr._httpmanager.fetch
+        async def tracked_fetch(url):
+            fetched.append(url)
+            return await fetch(url)
+        taskMgr._httpmanager.fetch = tracked_fetch
+        await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        assert len(fetched) == len(set(fetched)) == 6
+
+    @pytest.mark.asyncio
+    async def test_crawl_with_spilling_page_buffer(self, tmp_path):
+        async def root(request):
+            body = ''.join(f'<a href="/page/{i}">{i}</a>' for i in range(8))
+            return web.Response(text=f'<html>{body}</html>', content_type='text/html')
+        async def leaf(request):
+            return web.Response(text='<html><a href="/">home</a></html>', content_type='text/html')
+        class SlowParser(Parser):
+            async def parse(self, htmlPage):
+                await asyncio.sleep(0.02)
+                return self.get_links(htmlPage)
+        app = web.Application()
+        app.router.add_get('/', root)
+        app.router.add_get('/page/{idx}', leaf)
+        server = TestServer(app)
+        await server.start_server()
+        # the pages are bigger than the budget: one in memory, the others on disk
+        pageBuffer = PageBuffer(max_pages=0, max_bytes=10, spill=True, spill_dir=str(tmp_path))
+        try:
+            taskMgr = TaskManager(HttpUrl(str(server.make_url('/'))), page_buffer=pageBuffer,
+                                  parser=SlowParser(), max_producers=4)
+            await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        finally:
+            await server.close()
+        assert len(list(taskMgr.get_graph().pages())) == 9
+        assert taskMgr.get_load()['pages_bytes'] == 0
+        assert pageBuffer.spilled > 0
+        assert os.listdir(tmp_path) == []
+
+    @pytest.mark.asyncio
+    async def test_crawl_resume_from_checkpoint(self, local_site: TestServer, tmp_path):
+        baseUrl = HttpUrl(str(local_site.make_url('/')))
+        fetched: list[str] = []
+
+        def track(taskMgr: TaskManager, limit: int | None):
+            fetch = taskMgr._httpmanager.fetch
+            async def tracked_fetch(url):
+                if limit is not None and len(fetched) >= limit:
+                    # simulate a crawl interrupted while downloading
+                    await asyncio.sleep(3600)
+                fetched.append(url)
+                return await fetch(url)
+            taskMgr._httpmanager.fetch = tracked_fetch
+
+        taskMgr = TaskManager(baseUrl, checkpoint=Checkpoint(str(tmp_path)))
+        track(taskMgr, 3)
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(taskMgr.crawl(), timeout=1)
+        await taskMgr.shutdown()
+        firstRun = list(fetched)
+
+        fetched.clear()
+        taskMgr = TaskManager(baseUrl, checkpoint=Checkpoint(str(tmp_path)), resume=True)
+        track(taskMgr, None)
+        await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        assert not set(firstRun) & set(fetched)
+        assert len(firstRun) + len(fetched) == 6
+        assert taskMgr.get_num_html_pages() == 6
+
+    @pytest.mark.asyncio
+    async def test_crawl_resume_with_output(self, local_site: TestServer, tmp_path):
+        baseUrl = HttpUrl(str(local_site.make_url('/')))
+        outPath = str(tmp_path / 'out.jsonl')
+        checkpointDir = str(tmp_path / 'checkpoint')
+        parsed = asyncio.Event()
+
+        taskMgr = TaskManager(baseUrl, checkpoint=Checkpoint(checkpointDir),
+                              output=open_sink(outPath), keep_graph=False)
+        fetch = taskMgr._httpmanager.fetch
+        async def interrupted_fetch(url):
+            if parsed.is_set():
+                # simulate a crawl interrupted while downloading
+                await asyncio.sleep(3600)
+            return await fetch(url)
+        taskMgr._httpmanager.fetch = interrupted_fetch
+        write = taskMgr._output.write
+        async def tracked_write(pageUrl, links):
+            await write(pageUrl, links)
+            parsed.set()
+        taskMgr._output.write = tracked_write
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(taskMgr.crawl(), timeout=1)
+        await taskMgr.shutdown()
+
+        taskMgr = TaskManager(baseUrl, checkpoint=Checkpoint(checkpointDir), resume=True,
+                              output=open_sink(outPath), keep_graph=False)
+        await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        with open(outPath) as f:
+            urls = [json.loads(line)['url'] for line in f]
+        assert len(urls) == len(set(urls)) == 6
+
+    @pytest.mark.asyncio
+    async def test_crawl_with_streaming_fetch(self, local_site: TestServer):
+        baseUrl = HttpUrl(str(local_site.make_url('/')))
+        taskMgr = TaskManager(baseUrl, httpmgr=HttpManager(baseUrl, stream=True))
+        await asyncio.wait_for(taskMgr.crawl(), timeout=5)
+        assert taskMgr.get_num_html_pages() == 6
+
+    @pytest.mark.asyncio
+    async def test_crawl_with_pool_parser(self, local_site: TestServer):
+        taskMgr = TaskManager(HttpUrl(str(local_site.make_url('/'))),
+                              parser=PoolParser(workers=2, batch_size=2),
+                              max_producers=2, max_consumers=4)
+        await asyncio.wait_for(taskMgr.crawl(), timeout=10)
+        assert taskMgr.get_num_html_pages() == 6
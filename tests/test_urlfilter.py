@@ -0,0 +1,49 @@
+import pytest
+
+from webcrawler.metrics import MetricsRegistry
+from webcrawler.urlfilter import UrlFilter
+
+
+@pytest.mark.parametrize('url, rule', [
+    ('https://a.com/doc/report.PDF', 'extension'),
+    ('https://a.com/img/logo.png?v=2', 'extension'),
+    ('https://a.com/media/clip.m4v', 'mime_type'),
+    ('https://a.com/a/b/a/b/a/b/a/b', 'trap'),
+    ('https://a.com/page.html', None),
+    ('https://a.com/v1.2/', None),
+    ('https://a.com/', None),
+])
+def test_check_rules(url, rule):
+    assert UrlFilter().check(url) == rule
+
+
+def test_rewrite_strips_tracking_params():
+    urlFilter = UrlFilter()
+    assert urlFilter.rewrite('https://a.com/p?id=1&utm_source=x&UTM_medium=y') == 'https://a.com/p?id=1'
+    assert urlFilter.rewrite('https://a.com/p?gclid=abc') == 'https://a.com/p'
+    assert urlFilter.rewrite('https://a.com/p?id=1') == 'https://a.com/p?id=1'
+    assert urlFilter.stripped == 2
+
+
+def test_rewrite_with_allowed_params():
+    urlFilter = UrlFilter(allowed_params=['page'])
+    assert urlFilter.rewrite('https://a.com/list?page=2&sort=asc&color=red') == 'https://a.com/list?page=2'
+
+
+def test_max_depth():
+    urlFilter = UrlFilter(max_depth=2)
+    assert urlFilter.allow('https://a.com/a/b')
+    assert urlFilter.check('https://a.com/a/b/c') == 'depth'
+
+
+def test_max_urls_per_pattern():
+    metrics = MetricsRegistry()
+    urlFilter = UrlFilter(max_urls_per_pattern=2, metrics=metrics)
+    assert UrlFilter.pattern('/calendar/2024/05/01', 'view=day&tz=1') == '/calendar/#/#/#?tz&view'
+    assert urlFilter.allow('https://a.com/calendar/2024/05/01')
+    assert urlFilter.allow('https://a.com/calendar/2024/05/02')
+    assert urlFilter.check('https://a.com/calendar/2024/05/03') == 'pattern'
+    # another pattern has its own limit
+    assert urlFilter.allow('https://a.com/calendar/2024/05/01?view=week')
+    assert urlFilter.stats()['pattern'] == 1
+    assert metrics.get('filtered_urls').get('pattern') == 1
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+from webcrawler import webcrawler
+from webcrawler.distributed import PARTITIONS
+from webcrawler.parsing import EXTRACTORS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_choices_match_the_modules():
+    assert webcrawler.EXTRACTORS == tuple(EXTRACTORS)
+    assert webcrawler.PARTITIONS == PARTITIONS
+
+
+def test_help_does_not_import_the_crawler():
+    code = ('import runpy, sys\n'
+            'sys.argv = ["webcrawler.py", "--help"]\n'
+            'try:\n'
+            '    runpy.run_path("webcrawler/webcrawler.py", run_name="__main__")\n'
+            'except SystemExit:\n'
+            '    pass\n'
+            'print(*sorted(m for m in ("asyncio", "aiohttp", "pydantic", "selectolax") '
+            'if m in sys.modules))\n')
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True,
+                            text=True, check=True,
+                            env=dict(os.environ, PYTHONPATH=os.path.join(ROOT, 'webcrawler')))
+    assert '--loop {asyncio,uvloop}' in output.stdout
+    assert output.stdout.splitlines()[-1] == ''
+
+
+def test_shards_reject_the_single_process_options():
+    output = subprocess.run([sys.executable, 'webcrawler/webcrawler.py', 'http://example.com',
+                             '--shards', '2', '--checkpoint-dir', 'checkpoint'],
+                            cwd=ROOT, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=os.path.join(ROOT, 'webcrawler')))
+    assert output.returncode == 2
+    assert '--checkpoint-dir is not supported with --shards' in output.stderr
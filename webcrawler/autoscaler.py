@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from metrics import MetricsRegistry
+
+logger = logging.getLogger('taskmanager')
+
+
+class Autoscaler:
+    """Autoscaler grows and shrinks the amount of producer and consumer
+    tasks of a crawl between the configured bounds, so the concurrency
+    doesn't need to be tuned for each domain.
+    Every interval seconds it looks at the requests completed in the
+    last window and at the queue depths:
+    - producers follow an AIMD rule: one more producer (additive
+      increase) while urls are waiting in the frontier, the frontier
+      can serve more downloads at the same time (its hosts ready
+      times max_per_host) and the pages queue has room; the
+      producers are multiplied by decrease
+      (multiplicative decrease) when the window shows congestion, that
+      is an error rate above max_error_rate (5xx, 429 and connection
+      errors), a fetch latency above latency_factor times the lowest
+      latency observed or an event loop lag above max_loop_lag.
+    - consumers grow by one while the pages queue is full and the
+      event loop is responsive, and shrink by one while it's empty.
+
+    Attributes:
+        min_producers, max_producers: bounds of the producer tasks
+        min_consumers, max_consumers: bounds of the consumer tasks
+        interval: seconds between two decisions
+        increase: producers added when there is no congestion
+        decrease: factor applied to the producers on congestion
+        max_error_rate: highest error rate without congestion
+        latency_factor: highest ratio between the fetch latency and the
+                        lowest latency observed without congestion
+        max_loop_lag: highest event loop lag in seconds without congestion
+    """
+    def __init__(self, min_producers: int = 1, max_producers: int = 32,
+                 min_consumers: int = 1, max_consumers: int = 4,
+                 interval: float = 1.0, increase: int = 1, decrease: float = 0.5,
+                 max_error_rate: float = 0.05, latency_factor: float = 3.0,
+                 max_loop_lag: float = 0.1):
+        if min_producers < 1 or min_consumers < 1 or \
+            max_producers < min_producers or max_consumers < min_consumers:
+            raise ValueError('Invalid autoscaling bounds')
+        if not 0 < decrease < 1:
+            raise ValueError('decrease must be between 0 and 1', decrease)
+        self.min_producers = min_producers
+        self.max_producers = max_producers
+        self.min_consumers = min_consumers
+        self.max_consumers = max_consumers
+        self.interval = interval
+        self.increase = increase
+        self.decrease = decrease
+        self.max_error_rate = max_error_rate
+        self.latency_factor = latency_factor
+        self.max_loop_lag = max_loop_lag
+        self._baseLatency: float | None = None
+        self._lastRequests: int = 0
+        self._lastLatency: float = 0.0
+        self._lastOk: int = 0
+        self.scale_ups: int = 0
+        self.scale_downs: int = 0
+
+    def decide_producers(self, producers: int, queued: int, pagesFull: bool,
+                         latency: float | None, errorRate: float, loopLag: float,
+                         capacity: int | None = None) -> int:
+        """Retrieves the amount of producers for the next window
+
+        Args:
+            producers: current amount of producers
+            queued: urls waiting in the frontier
+            pagesFull: True if the pages queue is full
+            latency: mean fetch latency of the window, None without requests
+            errorRate: fraction of failed requests in the window
+            loopLag: event loop lag measured in the window
+            capacity: downloads the frontier can serve at the same
+                      time, None if unknown
+        """
+        if latency is not None and (self._baseLatency is None or latency < self._baseLatency):
+            self._baseLatency = latency
+        congested = errorRate > self.max_error_rate or loopLag > self.max_loop_lag or \
+            (latency is not None and latency > self._baseLatency * self.latency_factor)
+        if congested:
+            return max(self.min_producers, int(producers * self.decrease))
+        if queued > 0 and not pagesFull and (capacity is None or producers < capacity):
+            target = producers + self.increase
+            if capacity is not None:
+                target = min(target, capacity)
+            return min(self.max_producers, target)
+        return max(self.min_producers, min(self.max_producers, producers))
+
+    def decide_consumers(self, consumers: int, pagesQueued: int, pagesCapacity: int,
+                         loopLag: float, pagesFull: bool | None = None) -> int:
+        """Retrieves the amount of consumers for the next window
+
+        Args:
+            consumers: current amount of consumers
+            pagesQueued: pages waiting to be parsed
+            pagesCapacity: maximum amount of pages in the queue, 0 if unbounded
+            loopLag: event loop lag measured in the window
+            pagesFull: True if the pages queue blocks the producers (such
+                       as a PageBuffer out of bytes), by default it's
+                       full when pagesCapacity pages are queued
+        """
+        if pagesFull is None:
+            pagesFull = 0 < pagesCapacity <= pagesQueued
+        if pagesFull and loopLag <= self.max_loop_lag:
+            return min(self.max_consumers, consumers + 1)
+        if pagesQueued == 0:
+            return max(self.min_consumers, consumers - 1)
+        return max(self.min_consumers, min(self.max_consumers, consumers))
+
+    def _window(self, metrics: MetricsRegistry) -> tuple[float | None, float]:
+        """Retrieves mean latency and error rate of the requests
+        completed since the previous call"""
+        fetch = metrics.get('fetch_seconds')
+        responses = metrics.get('responses')
+        if fetch is None:
+            return None, 0.0
+        requests = fetch.count - self._lastRequests
+        latency = fetch.sum - self._lastLatency
+        ok = sum(value for code, value in responses.values.items()
+                 if int(code) < 500 and code != '429') if responses else fetch.count
+        completed = ok - self._lastOk
+        self._lastRequests, self._lastLatency, self._lastOk = fetch.count, fetch.sum, ok
+        if requests <= 0:
+            return None, 0.0
+        return latency / requests, max(0.0, 1 - completed / requests)
+
+    async def run(self, crawler) -> None:
+        """Coroutine updating the tasks of crawler (a TaskManager)
+        every interval seconds"""
+        loop = asyncio.get_running_loop()
+        metrics = crawler.get_metrics()
+        loopLag = metrics.histogram('loop_lag_seconds', 'Event loop lag')
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            loopLag.observe(lag)
+            latency, errorRate = self._window(metrics)
+            load = crawler.get_load()
+            pagesFull = load.get('pages_full', 0 < load['pages_capacity'] <= load['pages_queued'])
+            producers = self.decide_producers(load['producers'], load['frontier_queued'],
+                                              pagesFull, latency, errorRate, lag,
+                                              load.get('frontier_capacity'))
+            consumers = self.decide_consumers(load['consumers'], load['pages_queued'],
+                                              load['pages_capacity'], lag, pagesFull)
+            for before, after in ((load['producers'], producers), (load['consumers'], consumers)):
+                if after > before:
+                    self.scale_ups += 1
+                elif after < before:
+                    self.scale_downs += 1
+            if producers != load['producers'] or consumers != load['consumers']:
+                logger.info(f'[Autoscaler] producers {load["producers"]} -> {producers}, '
+                            f'consumers {load["consumers"]} -> {consumers} '
+                            f'(latency {latency}, errors {errorRate:.2f}, lag {lag:.3f})')
+            crawler.set_producers(producers)
+            crawler.set_consumers(consumers)
@@ -0,0 +1,170 @@
+import re
+from functools import lru_cache
+from urllib.parse import quote, urljoin, urlsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+PATH_SAFE = "/%:@!$&'()*+,;=-._~"
+QUERY_SAFE = "/?%:@!$&'()*+,;=-._~"
+PERCENT_REGEX = re.compile(r'%([0-9A-Fa-f]{2})')
+# characters which never require a normalization in path and query
+PLAIN_REGEX = re.compile(r"[A-Za-z0-9/?:@!$&'()*+,;=\-._~]*")
+
+
+def _normalize_percent(match: re.Match) -> str:
+    char = chr(int(match.group(1), 16))
+    return char if char in UNRESERVED else f'%{match.group(1).upper()}'
+
+
+def _normalize_component(component: str, safe: str) -> str:
+    if PLAIN_REGEX.fullmatch(component):
+        return component
+    return quote(PERCENT_REGEX.sub(_normalize_percent, component), safe=safe)
+
+
+@lru_cache(maxsize=1024)
+def _origin(base: str) -> str:
+    parts = urlsplit(base)
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+def _remove_dot_segments(path: str) -> str:
+    """Removes '.' and '..' segments from the path (RFC 3986 5.2.4)"""
+    if '.' not in path:
+        return path
+    output: list[str] = []
+    segments = path.split('/')
+    for segment in segments:
+        if segment == '..':
+            if len(output) > 1:
+                output.pop()
+        elif segment != '.':
+            output.append(segment)
+    if segments[-1] in ('.', '..'):
+        output.append('')
+    return '/'.join(output)
+
+
+def canonicalize(url: str, base: str | None = None) -> str | None:
+    """Builds the canonical form of an HTTP/HTTPS url:
+    - relative urls are resolved against base (RFC 3986)
+    - scheme and host are lowercased, the host is IDNA encoded
+    - default ports, user info and fragment are removed
+    - dot segments are removed and the empty path becomes '/'
+    - percent-encoding is normalized: unreserved characters are
+      decoded, the others are uppercased and the unsafe characters
+      are encoded
+
+    Args:
+        url: absolute or relative url
+        base: url of the page containing the link
+
+    Returns:
+        The canonical url or None if it isn't a valid HTTP/HTTPS url
+    """
+    url = url.strip()
+    if base:
+        if url.startswith('/') and not url.startswith('//'):
+            # path-absolute reference, only the origin of base is needed
+            url = _origin(base) + url
+        else:
+            url = urljoin(base, url)
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return None
+    host = parts.hostname
+    if not host:
+        return None
+    if not host.isascii():
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            return None
+    if ':' in host:
+        host = f'[{host}]'
+    netloc = host if port is None or port == DEFAULT_PORTS[scheme] else f'{host}:{port}'
+    path = _remove_dot_segments(parts.path) or '/'
+    path = _normalize_component(path, PATH_SAFE)
+    if parts.query:
+        query = _normalize_component(parts.query, QUERY_SAFE)
+        return f'{scheme}://{netloc}{path}?{query}'
+    return f'{scheme}://{netloc}{path}'
+
+
+def strip_www(host: str) -> str:
+    """Retrieves the host without the 'www.' prefix"""
+    return host[4:] if host.startswith('www.') else host
+
+
+class UrlCanonicalizer:
+    """UrlCanonicalizer resolves the links found inside the pages of
+    a website into canonical urls and it checks if they belong to the
+    website itself.
+    The host of the website and its 'www.' variant are considered the
+    same host: when fold_www is enabled the links towards the variant
+    are rewritten with the host of the base url, so the same page is
+    not downloaded twice. Subdomains are considered external.
+    The results are kept in a bounded LRU cache, the absolute links
+    are cached independently from the page where they have been found.
+
+    Attributes:
+        base_url: url of the website to crawl
+        fold_www: rewrite the 'www.' variant of the host
+        cache_size: maximum amount of links in the cache
+    """
+    def __init__(self, base_url: str, fold_www: bool = True, cache_size: int = 65536):
+        canonicalBase = canonicalize(str(base_url))
+        if canonicalBase is None:
+            raise ValueError('Invalid base url', base_url)
+        self.base_url: str = canonicalBase
+        self.fold_www: bool = fold_www
+        self._host: str = urlsplit(canonicalBase).netloc
+        site = strip_www(self._host)
+        self._variants: frozenset[str] = frozenset({site, f'www.{site}'})
+        self._resolve = lru_cache(maxsize=cache_size)(self._resolve_uncached)
+
+    def resolve(self, href: str, pageUrl: str | None = None) -> tuple[str, bool] | None:
+        """Resolves the link found in a page
+
+        Args:
+            href: value of the href attribute
+            pageUrl: url of the page containing the link
+
+        Returns:
+            A tuple (canonical url, True if it belongs to the website)
+            or None if the link isn't a valid HTTP/HTTPS url
+        """
+        if href.startswith(('http://', 'https://', 'HTTP://', 'HTTPS://')):
+            return self._resolve(href, None)
+        return self._resolve(href, pageUrl)
+
+    def canonicalize(self, href: str, pageUrl: str | None = None) -> str | None:
+        """Retrieves only the canonical url of the link"""
+        resolved = self.resolve(href, pageUrl)
+        return resolved[0] if resolved else None
+
+    def is_internal(self, url: str) -> bool:
+        """Checks if a canonical url belongs to the website"""
+        resolved = self.resolve(url)
+        return resolved is not None and resolved[1]
+
+    def cache_info(self):
+        return self._resolve.cache_info()
+
+    def _resolve_uncached(self, href: str, pageUrl: str | None) -> tuple[str, bool] | None:
+        url = canonicalize(href, pageUrl)
+        if url is None:
+            return None
+        start = url.index('://') + 3
+        end = url.find('/', start)
+        host = url[start:end]
+        if host not in self._variants:
+            return url, False
+        if self.fold_www and host != self._host:
+            url = f'{url[:start]}{self._host}{url[end:]}'
+        return url, True
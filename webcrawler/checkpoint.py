@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger('taskmanager')
+
+FRONTIER_LOG = 'frontier.log'
+GRAPH_LOG = 'graph.log'
+# frontier.log records: url enqueued, url completed, url seen and completed
+ENQUEUED = '+'
+DONE = '-'
+SEEN = '='
+# graph.log record of a duplicate page: alias, url, url of the canonical page
+ALIAS = '@'
+
+
+class CheckpointState:
+    """
+    CheckpointState is the crawl state rebuilt from a checkpoint
+
+    Attributes:
+        pending (list[str]): urls enqueued but not completed
+        seen (set[str]): all urls enqueued, completed or not
+        pages (dict[str, list[str]]): parsed pages with their links
+        aliases (dict[str, str]): duplicate pages with their canonical page
+    """
+    def __init__(self):
+        self.pending: list[str] = []
+        self.seen: set[str] = set()
+        self.pages: dict[str, list[str]] = {}
+        self.aliases: dict[str, str] = {}
+
+    def is_empty(self) -> bool:
+        return not self.seen and not self.pages
+
+
+class Checkpoint:
+    """Checkpoint stores the state of a crawl on disk so it can be
+    resumed after a crash or an interruption without downloading again
+    the pages already completed.
+    The state is kept in two append-only logs inside directory:
+    - frontier.log: one record for each url enqueued and completed
+    - graph.log: one line for each parsed page with its links and
+      for each duplicate page with its canonical page
+    The records are buffered in memory and appended by flush(), which
+    TaskManager calls every interval seconds from a thread, so the
+    crawl is never blocked by the disk. When frontier.log has more than
+    compact_after records, and at least twice the records left by the
+    previous compaction, it is compacted: each couple enqueued /
+    completed becomes a single record.
+
+    Attributes:
+        directory: folder of the checkpoint
+        interval: seconds between two flushes
+        compact_after: records of frontier.log which trigger a compaction
+    """
+    def __init__(self, directory: str, interval: float = 30.0,
+                 compact_after: int = 100_000):
+        self.directory = directory
+        self.interval = interval
+        self.compact_after = compact_after
+        os.makedirs(directory, exist_ok=True)
+        self._frontierPath = os.path.join(directory, FRONTIER_LOG)
+        self._graphPath = os.path.join(directory, GRAPH_LOG)
+        self._frontierBuffer: list[str] = []
+        self._graphBuffer: list[str] = []
+        self._records: int = 0
+        # records left by the last compaction (or found by load)
+        self._compacted: int = 0
+        self._flushLock: asyncio.Lock = asyncio.Lock()
+
+    def enqueued(self, url: str) -> None:
+        """Records a url added to the frontier"""
+        self._frontierBuffer.append(f'{ENQUEUED}\t{url}\n')
+
+    def done(self, url: str) -> None:
+        """Records a url downloaded without a page to parse"""
+        self._frontierBuffer.append(f'{DONE}\t{url}\n')
+
+    def page(self, url: str, links: list[str]) -> None:
+        """Records a page parsed with its links"""
+        self._graphBuffer.append('\t'.join([url, *links]) + '\n')
+        self._frontierBuffer.append(f'{DONE}\t{url}\n')
+
+    def alias(self, url: str, canonical: str) -> None:
+        """Records a duplicate page, not parsed, with its canonical page"""
+        self._graphBuffer.append(f'{ALIAS}\t{url}\t{canonical}\n')
+        self._frontierBuffer.append(f'{DONE}\t{url}\n')
+
+    def reset(self) -> None:
+        """Removes the previous checkpoint"""
+        for path in (self._frontierPath, self._graphPath):
+            if os.path.exists(path):
+                os.remove(path)
+        self._records = 0
+        self._compacted = 0
+
+    async def flush(self) -> None:
+        """Appends the buffered records to the logs"""
+        async with self._flushLock:
+            frontierLines, self._frontierBuffer = self._frontierBuffer, []
+            graphLines, self._graphBuffer = self._graphBuffer, []
+            if frontierLines or graphLines:
+                await asyncio.to_thread(self._write, frontierLines, graphLines)
+
+    async def run(self) -> None:
+        """Coroutine flushing the records every interval seconds"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except OSError as e:
+                logger.error(f'[Checkpoint] - Error writing checkpoint: {e}')
+
+    def _write(self, frontierLines: list[str], graphLines: list[str]) -> None:
+        # the graph is written first: a page in graph.log is completed
+        # even if its record in frontier.log has been lost
+        if graphLines:
+            with open(self._graphPath, 'a', encoding='utf-8') as f:
+                f.writelines(graphLines)
+                f.flush()
+                os.fsync(f.fileno())
+        if frontierLines:
+            with open(self._frontierPath, 'a', encoding='utf-8') as f:
+                f.writelines(frontierLines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._records += len(frontierLines)
+        # the log left by a compaction already holds a record for each
+        # url, it's compacted again only when it has doubled
+        if self._records > max(self.compact_after, 2 * self._compacted):
+            self._compact()
+
+    def _read_frontier(self) -> tuple[list[str], set[str]]:
+        """Retrieves the urls still pending (in order) and the completed ones"""
+        enqueued: dict[str, None] = {}
+        completed: set[str] = set()
+        if os.path.exists(self._frontierPath):
+            with open(self._frontierPath, encoding='utf-8') as f:
+                for line in f:
+                    record, _, url = line.rstrip('\n').partition('\t')
+                    if not url or not line.endswith('\n'):
+                        # truncated line written during a crash
+                        continue
+                    if record == ENQUEUED:
+                        enqueued[url] = None
+                    elif record in (DONE, SEEN):
+                        completed.add(url)
+        pending = [url for url in enqueued if url not in completed]
+        return pending, completed
+
+    def _compact(self) -> None:
+        pending, completed = self._read_frontier()
+        tmpPath = f'{self._frontierPath}.tmp'
+        with open(tmpPath, 'w', encoding='utf-8') as f:
+            f.writelines(f'{SEEN}\t{url}\n' for url in completed)
+            f.writelines(f'{ENQUEUED}\t{url}\n' for url in pending)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpPath, self._frontierPath)
+        self._records = self._compacted = len(pending) + len(completed)
+        logger.info(f'[Checkpoint] - Compacted frontier log: {self._records} records')
+
+    @staticmethod
+    def _truncate_torn_line(path: str, chunkSize: int = 4096) -> None:
+        """Cuts the log back to its last complete line: a line without
+        newline has been torn by a crash, the records appended after
+        the resume would be glued to it"""
+        with open(path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - chunkSize)
+                f.seek(start)
+                chunk = f.read(position - start)
+                newline = chunk.rfind(b'\n')
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                logger.warning(f'[Checkpoint] - Dropped a torn record of {end - position} '
+                               f'bytes at the end of {path}')
+                f.truncate(position)
+
+    def load(self) -> CheckpointState:
+        """Rebuilds the crawl state from the logs (blocking)"""
+        state = CheckpointState()
+        for path in (self._graphPath, self._frontierPath):
+            if os.path.exists(path):
+                self._truncate_torn_line(path)
+        if os.path.exists(self._graphPath):
+            with open(self._graphPath, encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        continue
+                    url, *links = line.rstrip('\n').split('\t')
+                    if url == ALIAS:
+                        state.aliases[links[0]] = links[1]
+                    else:
+                        state.pages[url] = links
+        pending, completed = self._read_frontier()
+        state.pending = [url for url in pending
+                         if url not in state.pages and url not in state.aliases]
+        state.seen = completed.union(pending, state.pages, state.aliases)
+        self._records = self._compacted = len(pending) + len(completed)
+        return state
@@ -0,0 +1,191 @@
+import hashlib
+import re
+
+TAG_REGEX = re.compile(rb'<script.*?</script>|<style.*?</style>|<[^>]*>', re.S | re.I)
+WORD_REGEX = re.compile(rb'\w+')
+HREF_REGEX = re.compile(rb'''\shref\s*=\s*["']?([^"'\s>]+)''', re.I)
+
+MASK_64 = (1 << 64) - 1
+FIELD_BITS = 12
+FIELD_MASK = (1 << FIELD_BITS) - 1
+# SPREAD[byte] has the bit b of byte at position b * FIELD_BITS
+SPREAD = [sum(1 << (FIELD_BITS * bit) for bit in range(8) if value >> bit & 1)
+          for value in range(256)]
+
+EXACT = 'exact'
+NEAR = 'near'
+
+
+def content_hash(body: bytes) -> bytes:
+    """Retrieves the exact fingerprint of a body"""
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+def text_features(body: bytes, shingle: int = 4) -> set[int]:
+    """Retrieves the SimHash features of an html page: the shingles of
+    shingle words of the text, without tags, scripts and styles.
+    The features are hashed with hash(), so they can be compared only
+    inside the same process.
+    """
+    words = WORD_REGEX.findall(TAG_REGEX.sub(b' ', body).lower())
+    return {hash(gram) & MASK_64 for gram in zip(*(words[i:] for i in range(shingle)))}
+
+
+def links_hash(body: bytes) -> bytes:
+    """Retrieves the fingerprint of the set of links (href) of a page"""
+    return content_hash(b'\n'.join(sorted(set(HREF_REGEX.findall(body)))))
+
+
+def simhash(body: bytes | set[int], shingle: int = 4, max_features: int = 512) -> int:
+    """Retrieves the 64-bit SimHash of the text of an html page (or of
+    its features). When there are more than max_features features only the
+    ones with the smallest hashes are used (a uniform sample of the
+    features), which bounds the cost of big pages.
+    """
+    features = body if isinstance(body, set) else text_features(body, shingle)
+    if len(features) > max_features:
+        limit = MASK_64 // len(features) * max_features
+        features = [feature for feature in features if feature <= limit]
+    # the bits of each byte of the features are summed in parallel,
+    # each bit in its own field of FIELD_BITS bits
+    fingerprint = 0
+    for shift in range(0, 64, 8):
+        counts = sum(SPREAD[(feature >> shift) & 0xFF] for feature in features)
+        for bit in range(8):
+            if 2 * ((counts >> (FIELD_BITS * bit)) & FIELD_MASK) > len(features):
+                fingerprint |= 1 << (shift + bit)
+    return fingerprint
+
+
+class ContentDeduplicator:
+    """ContentDeduplicator detects the pages whose content has already
+    been seen at another url (mirrors, tracking parameters, session
+    ids), so they are not parsed again and their links are not
+    enqueued again.
+    Each body is checked with an exact hash (blake2b) and, with
+    near_duplicates=True, with a SimHash fingerprint: two pages are
+    near-duplicates when their fingerprints differ by at most
+    max_distance bits and they have the same links, so a page skipped
+    never hides a link. The pages with less than min_features features
+    are checked only with the exact hash, the SimHash of a short page
+    is not reliable. The fingerprints are indexed by max_distance+1
+    blocks of bits: two fingerprints within max_distance bits share at
+    least one block, so only the fingerprints sharing a block are
+    compared.
+    A duplicate is recorded as alias of the first url with that content.
+
+    Attributes:
+        near_duplicates: detect the near-duplicates too
+        max_distance: maximum amount of different bits of two near-duplicates
+        shingle: words of each SimHash feature
+        min_features: features required for the near-duplicates check
+        aliases: url of each duplicate with the url of its canonical page
+        exact_duplicates: pages detected by the exact hash
+        near_duplicates_found: pages detected by the SimHash
+    """
+    def __init__(self, near_duplicates: bool = True, max_distance: int = 3, shingle: int = 4,
+                 min_features: int = 16):
+        if not 0 <= max_distance < 64:
+            raise ValueError('max_distance must be between 0 and 63', max_distance)
+        self.near_duplicates = near_duplicates
+        self.max_distance = max_distance
+        self.shingle = shingle
+        self.min_features = min_features
+        self.aliases: dict[str, str] = {}
+        self.exact_duplicates: int = 0
+        self.near_duplicates_found: int = 0
+        self._hashes: dict[bytes, str] = {}
+        self._blocks = self._block_masks(max_distance + 1)
+        # fingerprint, links hash and url of the pages for each block value
+        self._index: list[dict[int, list[tuple[int, bytes, str]]]] = [{} for _ in self._blocks]
+
+    @staticmethod
+    def _block_masks(blocks: int) -> list[tuple[int, int]]:
+        """Splits 64 bits in blocks, retrieves (shift, mask) of each one"""
+        masks = []
+        start = 0
+        for i in range(blocks):
+            size = 64 // blocks + (1 if i < 64 % blocks else 0)
+            masks.append((start, (1 << size) - 1))
+            start += size
+        return masks
+
+    def fingerprint(self, body: str | bytes) -> tuple[bytes, int | None, bytes | None]:
+        """Computes the fingerprints of a body without registering it,
+        it's the expensive part of check() and it can run in a thread.
+        The SimHash depends on hash(), so the fingerprints must be
+        matched in the same process.
+
+        Returns:
+            A tuple with the exact hash, the SimHash and the hash of the
+            links, the last two are None when the near-duplicates of the
+            body are not checked
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8', errors='surrogatepass')
+        digest = content_hash(body)
+        if not self.near_duplicates:
+            return digest, None, None
+        pageFeatures = text_features(body, self.shingle)
+        if len(pageFeatures) < self.min_features:
+            return digest, None, None
+        return digest, simhash(pageFeatures), links_hash(body)
+
+    def match(self, url: str, fingerprints: tuple[bytes, int | None, bytes | None]
+              ) -> tuple[str, str] | None:
+        """Checks if the content with fingerprints (see fingerprint())
+        has already been seen at another url, otherwise it's registered
+        as the content of url
+
+        Returns:
+            A tuple with the url of the canonical page and the kind of
+            duplicate ('exact' or 'near'), None for a new content
+        """
+        digest, fingerprint, links = fingerprints
+        canonical = self._hashes.get(digest)
+        if canonical is not None:
+            if canonical == url:
+                return None
+            self.exact_duplicates += 1
+            self.aliases[url] = canonical
+            return canonical, EXACT
+        self._hashes[digest] = url
+        if fingerprint is None:
+            return None
+        canonical = self._find_near(fingerprint, links)
+        if canonical is not None and canonical != url:
+            self.near_duplicates_found += 1
+            self.aliases[url] = canonical
+            # the exact copies of this page are aliases of the canonical one too
+            self._hashes[digest] = canonical
+            return canonical, NEAR
+        for (shift, mask), index in zip(self._blocks, self._index):
+            index.setdefault((fingerprint >> shift) & mask, []).append((fingerprint, links, url))
+        return None
+
+    def check(self, url: str, body: str | bytes) -> tuple[str, str] | None:
+        """Checks if the body has already been seen at another url,
+        otherwise it's registered as the content of url
+
+        Returns:
+            A tuple with the url of the canonical page and the kind of
+            duplicate ('exact' or 'near'), None for a new content
+        """
+        return self.match(url, self.fingerprint(body))
+
+    def _find_near(self, fingerprint: int, links: bytes) -> str | None:
+        for (shift, mask), index in zip(self._blocks, self._index):
+            for candidate, candidateLinks, url in index.get((fingerprint >> shift) & mask, ()):
+                if candidateLinks == links and \
+                        (candidate ^ fingerprint).bit_count() <= self.max_distance:
+                    return url
+        return None
+
+    def canonical(self, url: str) -> str:
+        """Retrieves the url of the page with the same content as url"""
+        return self.aliases.get(url, url)
+
+    def stats(self) -> dict[str, int]:
+        return {'unique': len(self._hashes) - self.near_duplicates_found,
+                'exact_duplicates': self.exact_duplicates,
+                'near_duplicates': self.near_duplicates_found}
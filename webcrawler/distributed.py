@@ -0,0 +1,429 @@
+"""Sharded crawling: the urls are partitioned by host or by canonical
+url across N workers, each one running its own TaskManager (fetch and
+parse pipeline) inside its own process. The links owned by another
+shard are routed in batches through a Coordinator, which detects the
+end of the crawl and merges the link graphs of the workers.
+
+The workers connect to the Coordinator with a multiprocessing
+connection (a local socket by default), so they can also be started
+on other nodes:
+    python webcrawler/distributed.py --connect <host>:<port> --authkey <key>
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener, wait
+from urllib.parse import urlsplit
+
+from canonical import canonicalize
+from models import LinkGraph
+from runtime import run
+
+logger = logging.getLogger('taskmanager')
+
+PARTITIONS = ('url', 'host')
+
+
+def shard_of(url: str, shards: int, partition: str = 'url') -> int:
+    """Retrieves the shard owning the url. The hash is stable across
+    processes and nodes (unlike hash())."""
+    key = urlsplit(url).netloc if partition == 'host' else url
+    digest = hashlib.blake2b(key.encode('utf-8', errors='surrogatepass'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+
+class ConnectionWriter:
+    """ConnectionWriter sends the messages of a connection from its own
+    thread, in order. send() only queues the message, so a peer slow to
+    read never blocks the event loop of a worker or the receive loop of
+    the Coordinator: two processes blocked in send() on each other's
+    full socket buffer would never read again.
+    The messages must not be changed after send(), they are pickled by
+    the thread.
+    """
+    _STOP = object()
+
+    def __init__(self, conn: Connection, name: str = 'ConnectionWriter'):
+        self._conn = conn
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def send(self, message: tuple) -> None:
+        """Queues a message, it never blocks"""
+        self._queue.put(message)
+
+    def _run(self) -> None:
+        while True:
+            message = self._queue.get()
+            if message is self._STOP:
+                return
+            try:
+                self._conn.send(message)
+            except (OSError, ValueError) as e:
+                # the peer is gone, the receive side reports it
+                logger.error(f'[{self._thread.name}] - Connection lost: {e!r}')
+                return
+
+    def close(self, timeout: float | None = None) -> None:
+        """Sends the messages queued and stops the thread (blocking)"""
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+
+class ShardRouter:
+    """ShardRouter connects the TaskManager of a worker to the
+    Coordinator: the links owned by other shards are buffered per
+    shard and sent in batches of batch_size urls (or every
+    flush_interval seconds), the batches received are enqueued in the
+    local TaskManager.
+    Each url is sent only once by a worker, the owner shard checks it
+    against its own SeenSet. The messages are sent by a
+    ConnectionWriter, the event loop never waits for the Coordinator.
+
+    Attributes:
+        shard: id of the local shard
+        shards: amount of shards
+        partition: 'url' or 'host'
+        batch_size: urls buffered for a shard before sending them
+        flush_interval: maximum seconds a url stays in the buffers
+        sent: batches sent to the Coordinator
+        received: batches received from the Coordinator
+    """
+    def __init__(self, conn: Connection, shard: int, shards: int,
+                 partition: str = 'url', batch_size: int = 256,
+                 flush_interval: float = 0.05):
+        if partition not in PARTITIONS:
+            raise ValueError('Invalid partition', partition)
+        self.shard = shard
+        self.shards = shards
+        self.partition = partition
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sent: int = 0
+        self.received: int = 0
+        self._conn = conn
+        self._writer = ConnectionWriter(conn, f'Shard_{shard}_writer')
+        self._buffers: dict[int, list[str]] = {}
+        self._routed: set[str] = set()
+        self._stopped: bool = False
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._adding: set[asyncio.Task] = set()
+
+    def is_local(self, url: str) -> bool:
+        return shard_of(url, self.shards, self.partition) == self.shard
+
+    def send(self, url: str) -> None:
+        """Routes a url owned by another shard"""
+        if url in self._routed:
+            return
+        self._routed.add(url)
+        target = shard_of(url, self.shards, self.partition)
+        buffer = self._buffers.setdefault(target, [])
+        buffer.append(url)
+        if len(buffer) >= self.batch_size:
+            self._send_batch(target)
+
+    def flush(self) -> None:
+        for target in list(self._buffers):
+            self._send_batch(target)
+
+    def _send_batch(self, target: int) -> None:
+        urls = self._buffers.pop(target, None)
+        if urls:
+            self._writer.send(('urls', target, urls))
+            self.sent += 1
+
+    def _on_readable(self, crawler) -> None:
+        try:
+            while self._conn.poll():
+                message = self._conn.recv()
+                if message[0] == 'urls':
+                    self.received += 1
+                    # the urls are registered as work before returning to
+                    # the loop, so the crawl can't be seen idle meanwhile
+                    task = crawler.add_urls(message[1])
+                    self._adding.add(task)
+                    task.add_done_callback(self._adding.discard)
+                elif message[0] == 'stop':
+                    self._stopped = True
+                self._wakeup.set()
+        except (EOFError, OSError):
+            logger.error(f'[Shard {self.shard}] - Coordinator connection lost')
+            self._stopped = True
+            self._wakeup.set()
+            asyncio.get_running_loop().remove_reader(self._conn.fileno())
+
+    async def run(self, crawler) -> None:
+        """Coroutine receiving the urls for crawler (a TaskManager) and
+        flushing the buffers every flush_interval seconds"""
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self._conn.fileno(), self._on_readable, crawler)
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                self.flush()
+        finally:
+            loop.remove_reader(self._conn.fileno())
+
+    async def idle(self, tracker) -> bool:
+        """Notifies the Coordinator that the local crawl has no work left
+        and waits for new urls or for the end of the crawl
+
+        Returns:
+            True if the whole crawl is completed
+        """
+        if tracker.pending():
+            return False
+        self.flush()
+        self._wakeup.clear()
+        self._writer.send(('status', self.received))
+        await self._wakeup.wait()
+        return self._stopped
+
+    async def close(self, result: tuple) -> None:
+        """Sends the result of the shard after the messages queued"""
+        self._writer.send(result)
+        await asyncio.to_thread(self._writer.close)
+
+
+async def _run_shard(conn: Connection, shard: int, shards: int, partition: str,
+                     baseUrl: str, options: dict) -> None:
+    from pydantic import HttpUrl
+    from autoscaler import Autoscaler
+    from dedup import ContentDeduplicator
+    from metrics import MetricsRegistry
+    from network.httpcache import HttpCache
+    from network.httpmanager import HttpManager
+    from pagebuffer import PageBuffer
+    from parsing import Parser, get_extractor
+    from taskmanager import TaskManager
+    from urlfilter import UrlFilter
+
+    urlFilter = None
+    if options.get('url_filter') or options.get('max_depth') is not None or \
+        options.get('max_urls_per_pattern') is not None:
+        urlFilter = UrlFilter(max_depth=options.get('max_depth'),
+                              max_urls_per_pattern=options.get('max_urls_per_pattern'))
+    pageBuffer = None
+    if options.get('page_buffer_mb'):
+        pageBuffer = PageBuffer(max_pages=0,
+                                max_bytes=int(options['page_buffer_mb'] * 1024 * 1024),
+                                spill=options.get('spill_dir') is not None,
+                                spill_dir=options.get('spill_dir'))
+    # a url is always owned by the same shard, so each shard keeps its
+    # own cache (same shards and partition on the next crawls)
+    cache = HttpCache(os.path.join(options['cache_dir'], f'shard-{shard}')) \
+        if options.get('cache_dir') else None
+    netUrl = HttpUrl(baseUrl)
+    debug = options.get('debug', False)
+    metrics = MetricsRegistry()
+    router = ShardRouter(conn, shard, shards, partition,
+                         options.get('batch_size', 256), options.get('flush_interval', 0.05))
+    taskMgr = TaskManager(netUrl, debug=debug, router=router,
+                          httpmgr=HttpManager(netUrl, debug=debug, cache=cache, metrics=metrics,
+                                              connect_timeout=options.get('connect_timeout', 10),
+                                              read_timeout=options.get('read_timeout', 30),
+                                              retries=options.get('retries', 2)),
+                          metrics=metrics, metrics_interval=options.get('metrics_interval', 0),
+                          autoscaler=Autoscaler() if options.get('autoscale') else None,
+                          max_producers=options.get('max_producers', 1),
+                          max_consumers=options.get('max_consumers', 1),
+                          max_pages_in_mem=options.get('max_pages_in_mem', 1),
+                          dedup=ContentDeduplicator() if options.get('dedup') else None,
+                          url_filter=urlFilter,
+                          parser=Parser(get_extractor(options.get('extractor', 'anchors'))),
+                          page_buffer=pageBuffer)
+    try:
+        await taskMgr.crawl()
+    finally:
+        if cache:
+            cache.close()
+    graph = taskMgr.get_graph()
+    pages = {url: graph.links(url) for url in graph.pages()}
+    await router.close(('result', shard, pages, taskMgr.get_metrics().to_dict()))
+
+
+def worker_main(address, authkey: bytes | None = None) -> None:
+    """Entry point of a worker: connects to the Coordinator at address
+    and crawls the shard assigned"""
+    conn = Client(address, authkey=authkey)
+    try:
+        _, shard, shards, partition, baseUrl, options = conn.recv()
+        run(_run_shard(conn, shard, shards, partition, baseUrl, options),
+            options.get('loop', 'asyncio'))
+    finally:
+        conn.close()
+
+
+class Coordinator:
+    """Coordinator runs a sharded crawl: it waits for shards workers,
+    assigns a shard to each one, routes the urls between them and
+    merges their link graphs at the end.
+    With spawn_workers=True (default) the workers are started as local
+    processes, otherwise they have to be started on other nodes with
+    worker_main (see the module usage).
+
+    The crawl is completed when all the workers are idle and each one
+    has received all the batches routed to it: the workers report
+    the amount of batches received when they become idle, a worker can
+    become busy again only by receiving a new batch, which makes its
+    report stale.
+
+    With partition='host' each host is crawled by a single worker, so
+    the per-host politeness rules hold; with partition='url' (default)
+    a single website is spread across all workers and the per-host
+    limits of the Frontier apply to each worker.
+
+    Attributes:
+        base_url: url where the crawl starts
+        shards: amount of workers
+        partition: 'url' or 'host'
+        address: address of the listener (default: a free local port)
+        authkey: key authenticating the workers
+        options: options of the workers' TaskManager (debug, max_producers,
+                 max_consumers, max_pages_in_mem, metrics_interval,
+                 autoscale, dedup, url_filter, max_depth,
+                 max_urls_per_pattern, extractor, page_buffer_mb,
+                 spill_dir), HttpManager (cache_dir, connect_timeout,
+                 read_timeout, retries) and ShardRouter (batch_size,
+                 flush_interval)
+        stats: metrics of each worker after the crawl
+    """
+    def __init__(self, base_url: str, shards: int, partition: str = 'url',
+                 address: tuple[str, int] = ('127.0.0.1', 0),
+                 authkey: bytes | None = None,
+                 spawn_workers: bool = True,
+                 start_method: str | None = None,
+                 **options):
+        if shards < 1:
+            raise ValueError('At least one shard is required', shards)
+        if partition not in PARTITIONS:
+            raise ValueError('Invalid partition', partition)
+        self.base_url = str(base_url)
+        self.shards = shards
+        self.partition = partition
+        self.address = address
+        self.authkey = authkey if authkey is not None else os.urandom(16)
+        self.spawn_workers = spawn_workers
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        self.start_method = start_method
+        self.options = options
+        self.stats: list[dict] = []
+
+    def run(self) -> LinkGraph:
+        """Runs the crawl (blocking)
+
+        Returns:
+            The link graph merged from all the workers
+
+        Raises:
+            RuntimeError if a worker exits before the end of the crawl
+        """
+        processes: list[multiprocessing.Process] = []
+        with Listener(self.address, authkey=self.authkey) as listener:
+            self.address = listener.address
+            if self.spawn_workers:
+                context = multiprocessing.get_context(self.start_method)
+                for i in range(self.shards):
+                    process = context.Process(target=worker_main,
+                                              args=(listener.address, self.authkey),
+                                              name=f'Shard_{i}', daemon=True)
+                    process.start()
+                    processes.append(process)
+            else:
+                logger.info(f'[Coordinator] Waiting for {self.shards} workers on {listener.address}')
+            conns = [listener.accept() for _ in range(self.shards)]
+        try:
+            return self._coordinate(conns)
+        finally:
+            for conn in conns:
+                conn.close()
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+
+    def _coordinate(self, conns: list[Connection]) -> LinkGraph:
+        # a worker busy sending its batches doesn't read: the messages
+        # to the workers never block the receive loop
+        writers = [ConnectionWriter(conn, f'Coordinator_writer_{shard}')
+                   for shard, conn in enumerate(conns)]
+        try:
+            return self._route(conns, writers)
+        finally:
+            for writer in writers:
+                writer.close(timeout=5)
+
+    def _route(self, conns: list[Connection], writers: list[ConnectionWriter]) -> LinkGraph:
+        for shard, writer in enumerate(writers):
+            writer.send(('config', shard, self.shards, self.partition, self.base_url,
+                         self.options))
+        routed = [0] * self.shards
+        idle: dict[int, int] = {}
+        seed = canonicalize(self.base_url) or self.base_url
+        owner = shard_of(seed, self.shards, self.partition)
+        writers[owner].send(('urls', [seed]))
+        routed[owner] += 1
+        shardOf = {conn: shard for shard, conn in enumerate(conns)}
+        t1 = time.perf_counter()
+        while len(idle) < self.shards or \
+            any(idle[shard] != routed[shard] for shard in range(self.shards)):
+            for conn in wait(conns):
+                shard = shardOf[conn]
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    raise RuntimeError(f'Shard {shard} exited before the end of the crawl')
+                if message[0] == 'urls':
+                    _, target, urls = message
+                    idle.pop(shard, None)
+                    writers[target].send(('urls', urls))
+                    routed[target] += 1
+                elif message[0] == 'status':
+                    idle[shard] = message[1]
+        logger.info(f'[Coordinator] Crawl completed in {time.perf_counter() - t1:.2f} s, '
+                    f'{sum(routed)} batches routed')
+        for writer in writers:
+            writer.send(('stop',))
+        graph = LinkGraph()
+        self.stats = [{}] * self.shards
+        for conn in conns:
+            while True:
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    raise RuntimeError(f'Shard {shardOf[conn]} exited without its results')
+                if message[0] == 'result':
+                    break
+            _, shard, pages, stats = message
+            self.stats[shard] = stats
+            for pageUrl, links in pages.items():
+                if links:
+                    graph.add_edges(pageUrl, links)
+                else:
+                    graph.add_page(pageUrl)
+        return graph
+
+
+def crawl_sharded(base_url: str, shards: int, partition: str = 'url', **options) -> LinkGraph:
+    """Crawls base_url with shards local worker processes (blocking)"""
+    return Coordinator(base_url, shards, partition, **options).run()
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Worker of a sharded crawl')
+    argparser.add_argument('--connect', type=str, required=True, help='<host>:<port> of the coordinator')
+    argparser.add_argument('--authkey', type=str, required=True)
+    args = argparser.parse_args()
+    host, _, port = args.connect.rpartition(':')
+    sys.exit(worker_main((host, int(port)), args.authkey.encode()))
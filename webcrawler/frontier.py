@@ -0,0 +1,481 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+from metrics import MetricsRegistry
+
+logger = logging.getLogger('taskmanager')
+
+
+class TokenBucket:
+    """TokenBucket limits the rate of the requests towards a host:
+    a request consumes one token, the tokens are refilled at rate
+    tokens per second up to burst tokens.
+    A rate of None means no limit.
+    """
+    def __init__(self, rate: float | None, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens: float = burst
+        self._last: float = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def next_available(self, now: float) -> float:
+        """Retrieves the time when a token will be available"""
+        if self.rate is None:
+            return now
+        self._refill(now)
+        if self._tokens >= 1:
+            return now
+        return now + (1 - self._tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        if self.rate is None:
+            return
+        self._refill(now)
+        self._tokens -= 1
+
+
+class CircuitBreaker:
+    """CircuitBreaker stops the requests towards a failing host:
+    - closed: the requests are sent, failure_threshold consecutive
+      failures open the circuit
+    - open: no request is sent for recovery_time seconds, then the
+      circuit is half-open
+    - half-open: a single request probes the host, a success closes
+      the circuit, a failure opens it again for twice the time (up to
+      max_recovery_time)
+    After max_trips consecutive openings without a success the host
+    is considered dead (given_up).
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 10.0,
+                 max_recovery_time: float = 300.0, max_trips: int | None = 3):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.max_recovery_time = max_recovery_time
+        self.max_trips = max_trips
+        self.state: str = self.CLOSED
+        self.failures: int = 0
+        self.trips: int = 0
+        self.open_until: float = 0.0
+        self._probing: bool = False
+
+    def ready_at(self, now: float) -> float | None:
+        """Retrieves the time when a request can be sent, None while
+        the probe of the half-open circuit is running"""
+        if self.state == self.OPEN:
+            if now < self.open_until:
+                return self.open_until
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN and self._probing:
+            return None
+        return now
+
+    def acquire(self) -> None:
+        """Notifies that a request is sent"""
+        if self.state == self.HALF_OPEN:
+            self._probing = True
+
+    def record(self, failed: bool, now: float) -> None:
+        """Notifies the result of a request"""
+        if not failed:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trips = 0
+            self._probing = False
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or \
+            (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self.trips += 1
+            self.state = self.OPEN
+            self._probing = False
+            self.open_until = now + min(self.max_recovery_time,
+                                        self.recovery_time * 2 ** (self.trips - 1))
+
+    @property
+    def given_up(self) -> bool:
+        return self.max_trips is not None and self.trips >= self.max_trips
+
+
+class HostState:
+    """Queue and politeness state of a single host"""
+    def __init__(self, host: str, bucket: TokenBucket, breaker: CircuitBreaker | None = None):
+        self.host = host
+        # urls with the time they have been enqueued
+        self.queue: deque[tuple[str, float]] = deque()
+        self.bucket = bucket
+        self.breaker = breaker
+        # no request before this time (Retry-After)
+        self.pausedUntil: float = 0.0
+        self.active: int = 0
+        self.robots: RobotFileParser | None = None
+        self.robotsLoaded: asyncio.Event = asyncio.Event()
+        self.robotsLoading: bool = False
+
+
+class Frontier:
+    """Frontier keeps the urls to visit in one queue per host and it
+    decides which url can be downloaded next according to the
+    politeness rules of each host:
+    - rate_per_host: maximum requests per second (token bucket with
+      burst tokens), None for no limit
+    - max_per_host: maximum amount of concurrent requests
+    - robots.txt: disallowed urls are discarded and the Crawl-delay
+      lowers the rate of the host. The rules are downloaded with
+      robots_fetcher at the first url of each host and cached.
+    - circuit breaker: with failure_threshold, the requests towards a
+      host are suspended after failure_threshold consecutive failures
+      (see CircuitBreaker) and the urls of a host which keeps failing
+      are discarded, each one is given to on_discard
+    - Retry-After: a host is paused for the time requested by a
+      response given to release()
+    - retries: a url given back by retry() is retrieved again only
+      after its delay, meanwhile the other urls are served
+    The hosts ready to be visited are kept in a heap ordered by the
+    time of their next allowed request, so get() is O(log hosts).
+    Each url retrieved by get() must be given back to release() when
+    its download is completed, with the outcome of the request.
+
+    Attributes:
+        rate_per_host: requests per second allowed for each host
+        burst: maximum amount of requests sent in a burst
+        max_per_host: maximum amount of concurrent requests per host
+        robots_fetcher: coroutine retrieving the content of a robots.txt
+                        url, or None if it's not available
+        user_agent: user agent matched against the robots.txt rules
+        failure_threshold: consecutive failures opening the circuit of
+                           a host, None to disable the circuit breaker
+        recovery_time: seconds before probing a host again
+        max_recovery_time: maximum seconds before probing a host again
+        max_trips: openings of the circuit before discarding the urls
+                   of the host, None to never discard them
+        on_discard: function called with each url discarded
+        metrics: registry filled with the time spent by the urls in
+                 the frontier and the circuits opened
+    """
+    def __init__(self, rate_per_host: float | None = None,
+                 burst: int = 1,
+                 max_per_host: int = 4,
+                 robots_fetcher: Callable[[str], Awaitable[str | None]] | None = None,
+                 user_agent: str = '*',
+                 failure_threshold: int | None = 5,
+                 recovery_time: float = 10.0,
+                 max_recovery_time: float = 300.0,
+                 max_trips: int | None = 3,
+                 on_discard: Callable[[str], None] | None = None,
+                 metrics: MetricsRegistry | None = None):
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.max_per_host = max_per_host
+        self.user_agent = user_agent
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.max_recovery_time = max_recovery_time
+        self.max_trips = max_trips
+        self.on_discard = on_discard
+        self._robotsFetcher = robots_fetcher
+        self._hosts: dict[str, HostState] = {}
+        self._ready: list[tuple[float, int, str]] = []
+        # urls to retry with the time they can be retrieved again
+        self._delayed: list[tuple[float, int, str]] = []
+        self._inHeap: set[str] = set()
+        self._seq: int = 0
+        self._size: int = 0
+        # urls retrieved by get() and not released yet
+        self._active: int = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self.disallowed: int = 0
+        self.dropped: int = 0
+        self.metrics: MetricsRegistry | None = None
+        if metrics is not None:
+            self.use_metrics(metrics)
+
+    def use_metrics(self, registry: MetricsRegistry) -> None:
+        """Fills registry with the time spent by the urls in the frontier"""
+        self.metrics = registry
+        self._waitTime = registry.histogram('frontier_wait_seconds',
+                                            'Time spent by a url in the frontier')
+        self._trips = registry.counter('circuit_trips', 'Circuits opened towards failing hosts')
+        self._dropped = registry.counter('dropped_urls', 'Urls discarded with their failing host')
+
+    async def put(self, url: str) -> bool:
+        """Adds the url to the queue of its host
+
+        Returns:
+            False if the url has been discarded by robots.txt rules or
+            because its host keeps failing
+        """
+        return bool(await self.put_many([url]))
+
+    async def put_many(self, urls: list[str]) -> list[str]:
+        """Adds a batch of urls to the queues of their hosts, the rules
+        of each host are checked and its queue is scheduled only once
+
+        Returns:
+            The urls added, without the ones discarded by robots.txt
+            rules or because their host keeps failing
+        """
+        byHost: dict[str, list[str]] = {}
+        for url in urls:
+            byHost.setdefault(urlsplit(url).netloc, []).append(url)
+        added: list[str] = []
+        for host, hostUrls in byHost.items():
+            state = self._host_state(host)
+            if state.breaker and state.breaker.given_up:
+                self._count_dropped(len(hostUrls))
+                continue
+            if self._robotsFetcher:
+                await self._load_robots(state, hostUrls[0])
+                if state.robots:
+                    allowed = [url for url in hostUrls
+                               if state.robots.can_fetch(self.user_agent, url)]
+                    if len(allowed) < len(hostUrls):
+                        logger.debug('[Frontier] - %d urls of %s disallowed by robots.txt',
+                                     len(hostUrls) - len(allowed), host)
+                        self.disallowed += len(hostUrls) - len(allowed)
+                    hostUrls = allowed
+            now = time.monotonic()
+            state.queue.extend((url, now) for url in hostUrls)
+            self._size += len(hostUrls)
+            self._schedule(state)
+            added.extend(hostUrls)
+        return added
+
+    def _host_state(self, host: str) -> HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.recovery_time,
+                                     self.max_recovery_time, self.max_trips) \
+                if self.failure_threshold is not None else None
+            state = HostState(host, TokenBucket(self.rate_per_host, self.burst), breaker)
+            self._hosts[host] = state
+        return state
+
+    async def get(self) -> str:
+        """Waits until a url can be downloaded according to the
+        politeness rules of its host and retrieves it"""
+        loop = asyncio.get_running_loop()
+        while True:
+            now = time.monotonic()
+            if self._delayed and self._delayed[0][0] <= now:
+                self._requeue(now)
+            while self._ready and self._ready[0][0] <= now:
+                _, _, host = heapq.heappop(self._ready)
+                self._inHeap.discard(host)
+                state = self._hosts[host]
+                if not state.queue or state.active >= self.max_per_host:
+                    continue
+                readyAt = self._ready_at(state, now)
+                if readyAt is None:
+                    # the probe of a half-open circuit is running
+                    continue
+                if readyAt > now:
+                    self._push(state, readyAt)
+                    continue
+                state.bucket.consume(now)
+                if state.breaker:
+                    state.breaker.acquire()
+                state.active += 1
+                self._active += 1
+                self._size -= 1
+                url, enqueuedAt = state.queue.popleft()
+                if self.metrics is not None:
+                    self._waitTime.observe(now - enqueuedAt)
+                self._schedule(state)
+                return url
+            nextAt = min(self._ready[0][0] if self._ready else math.inf,
+                         self._delayed[0][0] if self._delayed else math.inf)
+            timeout = nextAt - now if nextAt < math.inf else None
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait([waiter], timeout=timeout)
+            except BaseException:
+                # woken then cancelled, the wakeup is passed on to
+                # another getter like asyncio.Queue does
+                if waiter.done() and not waiter.cancelled():
+                    self._wakeup()
+                raise
+            finally:
+                if not waiter.done():
+                    waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def release(self, url: str, failed: bool = False, retry_after: float | None = None) -> None:
+        """Notifies that the download of the url is completed
+
+        Args:
+            url: url retrieved by get()
+            failed: True if the request failed because of the host
+                    (timeouts, connection errors, 5xx, 429)
+            retry_after: seconds requested by the host before the next
+                         request (Retry-After)
+        """
+        state = self._hosts.get(urlsplit(url).netloc)
+        if state is None:
+            return
+        state.active -= 1
+        self._active -= 1
+        now = time.monotonic()
+        if retry_after:
+            state.pausedUntil = max(state.pausedUntil, now + retry_after)
+        if state.breaker:
+            trips = state.breaker.trips
+            state.breaker.record(failed, now)
+            if state.breaker.trips > trips:
+                logger.warning('[Frontier] - Circuit open for %s until %.1f s',
+                               state.host, state.breaker.open_until - now)
+                if self.metrics is not None:
+                    self._trips.inc()
+            if state.breaker.given_up and state.queue:
+                self._drop(state)
+        self._schedule(state)
+
+    def retry(self, url: str, delay: float) -> None:
+        """Gives back a url whose download failed with a transient
+        error, it's retrieved again by get() after delay seconds. The
+        url must have been released first, the producer doesn't wait
+        for the delay.
+        """
+        self._seq += 1
+        heapq.heappush(self._delayed, (time.monotonic() + delay, self._seq, url))
+        self._size += 1
+        self._wakeup()
+
+    def _requeue(self, now: float) -> None:
+        """Moves the urls to retry whose delay is elapsed back to the
+        head of the queues of their hosts"""
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, url = heapq.heappop(self._delayed)
+            state = self._host_state(urlsplit(url).netloc)
+            if state.breaker and state.breaker.given_up:
+                self._size -= 1
+                self._count_dropped(1)
+                if self.on_discard:
+                    self.on_discard(url)
+                continue
+            state.queue.appendleft((url, now))
+            self._schedule(state)
+
+    def _drop(self, state: HostState) -> None:
+        """Discards the urls of a host which keeps failing"""
+        logger.warning(f'[Frontier] - {state.host} keeps failing, '
+                       f'{len(state.queue)} urls discarded')
+        urls = [url for url, _ in state.queue]
+        state.queue.clear()
+        self._size -= len(urls)
+        self._count_dropped(len(urls))
+        if self.on_discard:
+            for url in urls:
+                self.on_discard(url)
+
+    def _count_dropped(self, amount: int) -> None:
+        self.dropped += amount
+        if self.metrics is not None:
+            self._dropped.inc(amount)
+
+    def sitemaps(self, url: str) -> list[str]:
+        """Retrieves the sitemaps declared in the robots.txt of the
+        host of url, empty if it has not been loaded"""
+        state = self._hosts.get(urlsplit(url).netloc)
+        if state is None or state.robots is None:
+            return []
+        return state.robots.site_maps() or []
+
+    def qsize(self) -> int:
+        """Retrieves the amount of urls waiting to be downloaded"""
+        return self._size
+
+    def capacity(self) -> int:
+        """Retrieves an upper bound of the downloads the frontier can
+        serve at the same time: the downloads running and up to
+        max_per_host for each host with urls ready to be visited"""
+        return self._active + len(self._inHeap) * self.max_per_host
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def num_hosts(self) -> int:
+        return len(self._hosts)
+
+    def stats(self) -> dict[str, int]:
+        return {'queued': self._size,
+                'hosts': len(self._hosts),
+                'active': self._active,
+                'disallowed': self.disallowed,
+                'open_circuits': sum(1 for state in self._hosts.values() if state.breaker
+                                     and state.breaker.state != CircuitBreaker.CLOSED),
+                'dropped': self.dropped}
+
+    def _ready_at(self, state: HostState, now: float) -> float | None:
+        """Retrieves the time of the next request allowed towards the
+        host, None while the probe of a half-open circuit is running"""
+        readyAt = max(state.bucket.next_available(now), state.pausedUntil)
+        if state.breaker:
+            breakerAt = state.breaker.ready_at(now)
+            if breakerAt is None:
+                return None
+            readyAt = max(readyAt, breakerAt)
+        return readyAt
+
+    def _schedule(self, state: HostState) -> None:
+        if state.queue and state.active < self.max_per_host and \
+            state.host not in self._inHeap:
+            readyAt = self._ready_at(state, time.monotonic())
+            if readyAt is not None:
+                self._push(state, readyAt)
+
+    def _push(self, state: HostState, readyAt: float) -> None:
+        self._seq += 1
+        heapq.heappush(self._ready, (readyAt, self._seq, state.host))
+        self._inHeap.add(state.host)
+        self._wakeup()
+
+    def _wakeup(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    async def _load_robots(self, state: HostState, url: str) -> None:
+        if state.robotsLoaded.is_set():
+            return
+        if state.robotsLoading:
+            await state.robotsLoaded.wait()
+            return
+        state.robotsLoading = True
+        parts = urlsplit(url)
+        robotsUrl = f'{parts.scheme}://{parts.netloc}/robots.txt'
+        try:
+            content = await self._robotsFetcher(robotsUrl)
+            if content:
+                robots = RobotFileParser(robotsUrl)
+                robots.parse(content.splitlines())
+                state.robots = robots
+                delay = robots.crawl_delay(self.user_agent)
+                if delay:
+                    rate = 1 / float(delay)
+                    if state.bucket.rate is None or rate < state.bucket.rate:
+                        state.bucket = TokenBucket(rate, 1)
+                    logger.info(f'[Frontier] - {state.host} Crawl-delay {delay} s')
+        except Exception as e:
+            logger.error(f'[Frontier] - Error loading {robotsUrl}: {e}')
+        finally:
+            state.robotsLoaded.set()
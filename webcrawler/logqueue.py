@@ -0,0 +1,202 @@
+"""Non-blocking logging: the handlers configured in conf/logging.conf
+are moved behind a queue, the tasks only put the records in the queue
+and a QueueListener thread formats and writes them, so a slow disk or
+a slow console doesn't stall the event loop. The messages are built
+by the listener too, the tasks only copy the records.
+
+The records can be sampled and rate limited for each message type, a
+message type being the line of code emitting it: the verbose messages
+logged for each page or link can stay enabled on long crawls without
+flooding the log.
+"""
+import copy
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+
+# arguments a message can be built from later, in another thread
+_IMMUTABLE_ARGS = (str, int, float, bytes, type(None))
+
+
+def _message_type(record: logging.LogRecord) -> tuple[str, int]:
+    return record.pathname, record.lineno
+
+
+class DeferredQueueHandler(QueueHandler):
+    """DeferredQueueHandler enqueues a copy of each record without
+    formatting it (QueueHandler formats it in the emitting thread), so
+    the message is built by the handlers of the listener thread.
+    The message is built at once when its arguments could change before
+    the listener reads them (lists, dicts, any other object), and the
+    exception is turned into text, its traceback keeps the frames of
+    the emitting thread alive.
+    """
+    _formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if not isinstance(record.msg, str) or (record.args and not (
+                isinstance(record.args, tuple) and
+                all(isinstance(arg, _IMMUTABLE_ARGS) for arg in record.args))):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """SamplingFilter keeps one record out of every for each message
+    type, the first one included. The records above level are kept.
+
+    Attributes:
+        every: one record kept out of every
+        level: highest level sampled
+        dropped: amount of records dropped
+    """
+    def __init__(self, every: int, level: int = logging.INFO):
+        super().__init__()
+        if every < 1:
+            raise ValueError(f'Invalid sampling {every}, expected at least 1')
+        self.every = every
+        self.level = level
+        self.dropped: int = 0
+        self._counts: dict[tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level:
+            return True
+        key = _message_type(record)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+            if count % self.every == 0:
+                return True
+            self.dropped += 1
+            return False
+
+
+class RateLimitFilter(logging.Filter):
+    """RateLimitFilter limits the records of each message type to rate
+    per second, with bursts of burst records (token bucket). The records
+    above level are kept. The first record kept after some have been
+    dropped reports how many.
+
+    Attributes:
+        rate: records per second of each message type
+        burst: records accepted at once
+        level: highest level limited
+        dropped: amount of records dropped
+    """
+    def __init__(self, rate: float, burst: int | None = None, level: int = logging.WARNING):
+        super().__init__()
+        if rate <= 0:
+            raise ValueError(f'Invalid rate {rate}, expected a positive number')
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self.level = level
+        self.dropped: int = 0
+        # message type -> (tokens, time of the last update, records dropped)
+        self._buckets: dict[tuple[str, int], tuple[float, float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level:
+            return True
+        key = _message_type(record)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, dropped = self._buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, dropped + 1)
+                self.dropped += 1
+                return False
+            self._buckets[key] = (tokens - 1, now, 0)
+        if dropped:
+            record.msg = f'{record.getMessage()} [{dropped} similar messages dropped]'
+            record.args = None
+        return True
+
+
+class LogQueue:
+    """LogQueue moves the handlers of the loggers configured (the root
+    and the loggers with their own handlers) behind a
+    DeferredQueueHandler, the records are formatted and written by a
+    QueueListener thread. The loggers sharing the same handlers share
+    the same listener.
+    The level of each QueueHandler is the lowest level of the handlers
+    it replaces and the level of its logger is raised to it, so the
+    records no handler would write are discarded by the level check of
+    the logger, before being created.
+
+    Attributes:
+        sampling: filter sampling the records, None to keep them all
+        rate_limit: filter limiting the rate of the records, None for no limit
+    """
+    def __init__(self, sample_every: int | None = None, sample_level: int = logging.INFO,
+                 rate_limit: float | None = None, rate_burst: int | None = None,
+                 rate_level: int = logging.WARNING):
+        self.sampling = SamplingFilter(sample_every, sample_level) \
+            if sample_every and sample_every > 1 else None
+        self.rate_limit = RateLimitFilter(rate_limit, rate_burst, rate_level) \
+            if rate_limit else None
+        self._listeners: list[QueueListener] = []
+        # logger -> (handlers and level replaced)
+        self._replaced: dict[logging.Logger, tuple[list[logging.Handler], int]] = {}
+
+    def start(self) -> None:
+        """Moves the handlers behind the queues and starts the listeners"""
+        manager = logging.Logger.manager
+        loggers = [logging.getLogger()] + [logger for logger in list(manager.loggerDict.values())
+                                           if isinstance(logger, logging.Logger)]
+        # the same handlers in any order share the listener, otherwise
+        # two threads would write to them
+        queueHandlers: dict[frozenset[logging.Handler], QueueHandler] = {}
+        for logger in loggers:
+            handlers = tuple(h for h in logger.handlers if not isinstance(h, QueueHandler))
+            if not handlers or logger in self._replaced:
+                continue
+            key = frozenset(handlers)
+            if key not in queueHandlers:
+                records = queue.SimpleQueue()
+                queueHandler = DeferredQueueHandler(records)
+                queueHandler.setLevel(min(h.level for h in handlers))
+                for f in (self.sampling, self.rate_limit):
+                    if f is not None:
+                        queueHandler.addFilter(f)
+                listener = QueueListener(records, *handlers, respect_handler_level=True)
+                listener.start()
+                self._listeners.append(listener)
+                queueHandlers[key] = queueHandler
+            queueHandler = queueHandlers[key]
+            self._replaced[logger] = (list(logger.handlers), logger.level)
+            for h in handlers:
+                logger.removeHandler(h)
+            logger.addHandler(queueHandler)
+            if logger.level != logging.NOTSET:
+                logger.setLevel(max(logger.level, queueHandler.level))
+
+    def stop(self) -> None:
+        """Writes the records queued, stops the listeners and restores
+        the handlers"""
+        for listener in self._listeners:
+            listener.stop()
+        self._listeners.clear()
+        for logger, (handlers, level) in self._replaced.items():
+            for h in list(logger.handlers):
+                logger.removeHandler(h)
+            for h in handlers:
+                logger.addHandler(h)
+            logger.setLevel(level)
+        self._replaced.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {'sampled': self.sampling.dropped if self.sampling else 0,
+                'rate_limited': self.rate_limit.dropped if self.rate_limit else 0}
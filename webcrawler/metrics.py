@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+from bisect import bisect_left
+from typing import Callable
+
+logger = logging.getLogger('taskmanager')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Counter:
+    """Counter is a monotonic value, optionally split by one label
+    (e.g. the status code of the responses)."""
+    def __init__(self, name: str, help: str, label: str | None = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values: dict[str, float] = {}
+
+    def inc(self, value: float = 1, label: str = '') -> None:
+        self.values[label] = self.values.get(label, 0) + value
+
+    def get(self, label: str = '') -> float:
+        return self.values.get(label, 0)
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+
+class Gauge:
+    """Gauge is a value read from a function when the metrics are
+    exported, so it costs nothing on the hot path (e.g. queue depths)."""
+    def __init__(self, name: str, help: str, func: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.func = func
+
+    def get(self) -> float:
+        try:
+            return self.func()
+        except Exception:
+            return 0
+
+
+class Histogram:
+    """Histogram counts the observations in fixed buckets: an
+    observation costs one binary search and two additions."""
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts: list[int] = [0] * (len(self.buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Retrieves an upper bound of the quantile q (0 <= q <= 1)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[idx] if idx < len(self.buckets) else float('inf')
+        return float('inf')
+
+
+class MetricsRegistry:
+    """MetricsRegistry keeps the metrics of a crawl and exports them as
+    Prometheus text format, as JSON or as a compact log line.
+    The metrics are created once by name, asking again for the same
+    name retrieves the existing metric.
+    """
+    def __init__(self, prefix: str = 'webcrawler'):
+        self.prefix = prefix
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+
+    def counter(self, name: str, help: str = '', label: str | None = None) -> Counter:
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, help, label)
+        return self._metrics[name]
+
+    def gauge(self, name: str, help: str, func: Callable[[], float]) -> Gauge:
+        self._metrics[name] = Gauge(name, help, func)
+        return self._metrics[name]
+
+    def histogram(self, name: str, help: str = '', buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help, buckets)
+        return self._metrics[name]
+
+    def get(self, name: str) -> Counter | Gauge | Histogram | None:
+        return self._metrics.get(name)
+
+    def to_prometheus(self) -> str:
+        """Exports the metrics in Prometheus text format"""
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            name = f'{self.prefix}_{metric.name}'
+            lines.append(f'# HELP {name} {metric.help}')
+            if isinstance(metric, Counter):
+                lines.append(f'# TYPE {name} counter')
+                for label, value in metric.values.items():
+                    labels = f'{{{metric.label}="{label}"}}' if metric.label else ''
+                    lines.append(f'{name}{labels} {value}')
+            elif isinstance(metric, Gauge):
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {metric.get()}')
+            else:
+                lines.append(f'# TYPE {name} histogram')
+                cumulative = 0
+                for bound, count in zip(metric.buckets, metric.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {metric.count}')
+                lines.append(f'{name}_sum {metric.sum}')
+                lines.append(f'{name}_count {metric.count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> dict:
+        """Exports the metrics as a dictionary"""
+        result: dict = {}
+        for metric in self._metrics.values():
+            if isinstance(metric, Counter):
+                result[metric.name] = dict(metric.values) if metric.label else metric.get()
+            elif isinstance(metric, Gauge):
+                result[metric.name] = metric.get()
+            else:
+                result[metric.name] = {'count': metric.count,
+                                       'sum': metric.sum,
+                                       'p50': metric.quantile(0.5),
+                                       'p99': metric.quantile(0.99)}
+        return result
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def summary(self) -> str:
+        """Retrieves a compact line with the main metrics"""
+        parts: list[str] = []
+        for metric in self._metrics.values():
+            if isinstance(metric, Counter):
+                parts.append(f'{metric.name}={metric.total():g}')
+            elif isinstance(metric, Gauge):
+                parts.append(f'{metric.name}={metric.get():g}')
+            elif metric.count:
+                parts.append(f'{metric.name}[p50={metric.quantile(0.5):g} '
+                             f'p99={metric.quantile(0.99):g} n={metric.count}]')
+        return ' '.join(parts)
+
+    async def run_logger(self, interval: float) -> None:
+        """Coroutine logging the summary every interval seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f'[Metrics] {self.summary()}')
+
+
+class MetricsServer:
+    """MetricsServer exposes a MetricsRegistry over HTTP:
+    /metrics in Prometheus text format and /metrics.json as JSON.
+    """
+    def __init__(self, registry: MetricsRegistry, host: str = '127.0.0.1', port: int = 9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self) -> None:
+        from aiohttp import web
+
+        async def prometheus(request):
+            return web.Response(text=self.registry.to_prometheus(),
+                                content_type='text/plain', charset='utf-8')
+
+        async def as_json(request):
+            return web.Response(text=self.registry.to_json(), content_type='application/json')
+
+        app = web.Application()
+        app.router.add_get('/metrics', prometheus)
+        app.router.add_get('/metrics.json', as_json)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+        logger.info(f'[Metrics] Serving metrics on http://{self.host}:{self.port}/metrics')
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
@@ -1,2 +1,4 @@
 from .link import *
-from .page import *
\ No newline at end of file
+from .page import *
+from .graph import *
+from .graphfile import *
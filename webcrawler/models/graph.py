@@ -0,0 +1,144 @@
+from array import array
+from collections import OrderedDict
+from typing import Iterator
+
+
+class UrlTable:
+    """ UrlTable interns the urls found during the crawling: each
+    url is stored only once and it's identified by an integer id,
+    assigned in insertion order starting from 0.
+    """
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        self._urls: list[str] = []
+
+    def intern(self, url: str) -> int:
+        """Retrieves the id of the url adding it to the table if needed"""
+        urlId = self._ids.get(url)
+        if urlId is None:
+            urlId = len(self._urls)
+            self._ids[url] = urlId
+            self._urls.append(url)
+        return urlId
+
+    def get_id(self, url: str) -> int | None:
+        """Retrieves the id of the url or None if it's unknown"""
+        return self._ids.get(url)
+
+    def get_url(self, urlId: int) -> str:
+        """Retrieves the url identified by the id"""
+        return self._urls[urlId]
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._ids
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._urls)
+
+
+class LinkGraph:
+    """ LinkGraph is the compact representation of the pages crawled
+    and of their links. The urls are interned in a UrlTable and the
+    links of each page are kept in an append-only array of int32 ids,
+    so each edge costs 4 bytes and no object is created for it.
+    A page doesn't contain the same link twice: the links of the last
+    pages extended (RECENT_PAGES) are also kept in a set, so the pages
+    still being built are checked in constant time per link.
+
+    Attributes:
+        urls (UrlTable): table of all urls, both pages and links
+    """
+    RECENT_PAGES = 64
+
+    def __init__(self):
+        self.urls: UrlTable = UrlTable()
+        self._edges: dict[int, array] = {}
+        # page id -> set of its link ids, for the pages extended last
+        self._recent: OrderedDict[int, set[int]] = OrderedDict()
+        self._numEdges: int = 0
+        self.version: int = 0
+
+    def add_page(self, url: str) -> int:
+        """Adds a page without links if it doesn't exist yet
+
+        Returns:
+            The id of the page
+        """
+        pageId = self.urls.intern(url)
+        if pageId not in self._edges:
+            self._edges[pageId] = array('i')
+            self.version += 1
+        return pageId
+
+    def _link_set(self, pageId: int) -> set[int]:
+        """Retrieves the set of the links of a page, built from its
+        array if the page has not been extended recently"""
+        linkIds = self._recent.get(pageId)
+        if linkIds is None:
+            linkIds = set(self._edges[pageId])
+            self._recent[pageId] = linkIds
+            if len(self._recent) > self.RECENT_PAGES:
+                self._recent.popitem(last=False)
+        else:
+            self._recent.move_to_end(pageId)
+        return linkIds
+
+    def add_edge(self, pageUrl: str, link: str) -> None:
+        """Adds the link to the page, creating the page if needed"""
+        pageId = self.add_page(pageUrl)
+        linkIds = self._link_set(pageId)
+        linkId = self.urls.intern(link)
+        if linkId not in linkIds:
+            linkIds.add(linkId)
+            self._edges[pageId].append(linkId)
+            self._numEdges += 1
+            self.version += 1
+
+    def add_edges(self, pageUrl: str, links: list[str]) -> None:
+        """Adds a group of links to the page, creating the page if needed"""
+        pageId = self.add_page(pageUrl)
+        targets = self._edges[pageId]
+        # a page is usually added once with all its links, without set
+        linkIds = self._recent.get(pageId)
+        if linkIds is None and targets:
+            linkIds = set(targets)
+        for link in dict.fromkeys(links):
+            linkId = self.urls.intern(link)
+            if linkIds is not None:
+                if linkId in linkIds:
+                    continue
+                linkIds.add(linkId)
+            targets.append(linkId)
+            self._numEdges += 1
+        self.version += 1
+
+    def has_page(self, url: str) -> bool:
+        urlId = self.urls.get_id(url)
+        return urlId is not None and urlId in self._edges
+
+    def pages(self) -> Iterator[str]:
+        """Retrieves the urls of the pages in insertion order"""
+        return (self.urls.get_url(pageId) for pageId in self._edges)
+
+    def links(self, pageUrl: str) -> list[str]:
+        """Retrieves the links of the page (empty for unknown pages)"""
+        pageId = self.urls.get_id(pageUrl)
+        if pageId is None or pageId not in self._edges:
+            return []
+        return [self.urls.get_url(linkId) for linkId in self._edges[pageId]]
+
+    def link_ids(self, pageId: int) -> array:
+        """Retrieves the ids of the links of the page"""
+        return self._edges[pageId]
+
+    def page_ids(self) -> Iterator[int]:
+        return iter(self._edges)
+
+    def num_pages(self) -> int:
+        return len(self._edges)
+
+    def num_edges(self) -> int:
+        return self._numEdges
@@ -0,0 +1,233 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Callable, Iterator
+
+from .graph import LinkGraph
+
+MAGIC = b'WCGRAPH1'
+# magic, format version, nodes, edges, offsets of the sections:
+# string index, strings, indptr, indices, visited bits, external bits
+HEADER = struct.Struct('<8sIIQQQQQQQQ')
+VERSION = 1
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _pad(f) -> None:
+    f.write(b'\0' * (_align(f.tell()) - f.tell()))
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(view: memoryview, typecode: str) -> memoryview:
+    """Retrieves the little-endian array of view, in place on a
+    little-endian host and as a byte-swapped copy otherwise"""
+    if sys.byteorder == 'little':
+        return view.cast(typecode)
+    values = array(typecode)
+    values.frombytes(view)
+    values.byteswap()
+    return memoryview(values)
+
+
+def write_graph(graph: LinkGraph, path: str,
+                is_external: Callable[[str], bool] | None = None) -> None:
+    """Writes the graph in the binary format read by GraphFile.
+    Each url of the graph (pages and links) is a node identified by its
+    id in the UrlTable. The file contains, aligned to 8 bytes:
+    - header: magic, version, amount of nodes and edges, offsets
+    - string index: int64 offset of each url inside the strings (n+1)
+    - strings: the utf-8 urls one after the other
+    - indptr: int64 offset of the links of each node inside indices (n+1)
+    - indices: int32 ids of the links (CSR adjacency)
+    - visited: bit array, the nodes which have been crawled
+    - external: bit array, the nodes outside the crawled domain
+    The file is written in a temporary file and renamed when completed.
+
+    Args:
+        graph: link graph of the crawl
+        path: file to write
+        is_external: function telling if a url is outside the domain,
+                     without it no url is flagged as external
+    """
+    numNodes = len(graph.urls)
+    pages = set(graph.page_ids())
+    stringIndex = array('q', [0])
+    indptr = array('q', [0])
+    visited = bytearray((numNodes + 7) // 8)
+    external = bytearray((numNodes + 7) // 8)
+    tmpPath = f'{path}.tmp'
+    with open(tmpPath, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        # the strings are written first, the index is known only at the end
+        _pad(f)
+        stringsOffset = f.tell()
+        position = 0
+        for urlId, url in enumerate(graph.urls):
+            data = url.encode('utf-8', errors='surrogatepass')
+            f.write(data)
+            position += len(data)
+            stringIndex.append(position)
+            if is_external and is_external(url):
+                external[urlId >> 3] |= 1 << (urlId & 7)
+        _pad(f)
+        indexOffset = f.tell()
+        f.write(_little_endian(stringIndex))
+        numEdges = 0
+        for urlId in range(numNodes):
+            if urlId in pages:
+                numEdges += len(graph.link_ids(urlId))
+                visited[urlId >> 3] |= 1 << (urlId & 7)
+            indptr.append(numEdges)
+        _pad(f)
+        indptrOffset = f.tell()
+        f.write(_little_endian(indptr))
+        _pad(f)
+        indicesOffset = f.tell()
+        for urlId in range(numNodes):
+            if urlId in pages:
+                f.write(_little_endian(graph.link_ids(urlId)))
+        _pad(f)
+        visitedOffset = f.tell()
+        f.write(visited)
+        _pad(f)
+        externalOffset = f.tell()
+        f.write(external)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, numNodes, numEdges, indexOffset,
+                            stringsOffset, indptrOffset, indicesOffset,
+                            visitedOffset, externalOffset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmpPath, path)
+
+
+class GraphFile:
+    """GraphFile reads a graph written by write_graph without loading
+    it: the file is memory-mapped and the arrays are accessed in place
+    as memoryviews, so opening a graph of millions of pages takes
+    milliseconds and the pages are read only when they are used.
+    The arrays can be wrapped without copies by numpy.frombuffer. On a
+    big-endian host the int arrays are byte-swapped into memory when the
+    file is opened.
+    The urls are decoded on demand, the lookup by url builds a
+    dictionary of all urls at the first call.
+
+    Attributes:
+        path: file of the graph
+        num_nodes: amount of urls (pages and links)
+        num_edges: amount of links
+        indptr: int64 memoryview, links of node i are indices[indptr[i]:indptr[i+1]]
+        indices: int32 memoryview of the link ids
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can't be mapped
+            self._file.close()
+            raise ValueError('Invalid graph file', path)
+        if len(self._mmap) < HEADER.size:
+            self._mmap.close()
+            self._file.close()
+            raise ValueError('Invalid graph file', path)
+        (magic, version, _, self.num_nodes, self.num_edges, indexOffset, stringsOffset,
+         indptrOffset, indicesOffset, visitedOffset, externalOffset) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            self._file.close()
+            raise ValueError('Invalid graph file', path)
+        n = self.num_nodes
+        view = self._view = memoryview(self._mmap)
+        self._strings = view[stringsOffset:indexOffset]
+        self._stringIndex = _from_little_endian(view[indexOffset:indexOffset + 8 * (n + 1)], 'q')
+        self.indptr = _from_little_endian(view[indptrOffset:indptrOffset + 8 * (n + 1)], 'q')
+        self.indices = _from_little_endian(view[indicesOffset:indicesOffset + 4 * self.num_edges],
+                                           'i')
+        self._visited = view[visitedOffset:visitedOffset + (n + 7) // 8]
+        self._external = view[externalOffset:externalOffset + (n + 7) // 8]
+        self._ids: dict[str, int] | None = None
+
+    def url(self, urlId: int) -> str:
+        """Retrieves the url of the node"""
+        start, end = self._stringIndex[urlId], self._stringIndex[urlId + 1]
+        return str(self._strings[start:end], 'utf-8', errors='surrogatepass')
+
+    def get_id(self, url: str) -> int | None:
+        """Retrieves the id of the url or None if it's unknown"""
+        if self._ids is None:
+            self._ids = {self.url(urlId): urlId for urlId in range(self.num_nodes)}
+        return self._ids.get(url)
+
+    def link_ids(self, urlId: int) -> memoryview:
+        """Retrieves the ids of the links of the node"""
+        return self.indices[self.indptr[urlId]:self.indptr[urlId + 1]]
+
+    def links(self, pageUrl: str) -> list[str]:
+        """Retrieves the links of the page (empty for unknown pages)"""
+        urlId = self.get_id(pageUrl)
+        if urlId is None:
+            return []
+        return [self.url(linkId) for linkId in self.link_ids(urlId)]
+
+    def is_visited(self, urlId: int) -> bool:
+        return bool(self._visited[urlId >> 3] & (1 << (urlId & 7)))
+
+    def is_external(self, urlId: int) -> bool:
+        return bool(self._external[urlId >> 3] & (1 << (urlId & 7)))
+
+    def page_ids(self) -> Iterator[int]:
+        """Retrieves the ids of the crawled pages"""
+        return (urlId for urlId in range(self.num_nodes) if self.is_visited(urlId))
+
+    def pages(self) -> Iterator[str]:
+        """Retrieves the urls of the crawled pages"""
+        return (self.url(urlId) for urlId in self.page_ids())
+
+    def num_pages(self) -> int:
+        return sum(bin(byte).count('1') for byte in self._visited)
+
+    def to_link_graph(self) -> LinkGraph:
+        """Rebuilds a LinkGraph from the file (it loads the whole graph)"""
+        graph = LinkGraph()
+        for urlId in range(self.num_nodes):
+            graph.urls.intern(self.url(urlId))
+        for urlId in self.page_ids():
+            links = [self.url(linkId) for linkId in self.link_ids(urlId)]
+            if links:
+                graph.add_edges(self.url(urlId), links)
+            else:
+                graph.add_page(self.url(urlId))
+        return graph
+
+    def close(self) -> None:
+        for name in ('_strings', '_stringIndex', 'indptr', 'indices',
+                     '_visited', '_external', '_view'):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # link_ids() views still referenced, the map is closed
+            # when they are collected
+            pass
+        self._file.close()
+
+    def __enter__(self) -> 'GraphFile':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
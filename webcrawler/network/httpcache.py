@@ -0,0 +1,248 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from canonical import canonicalize
+
+logger = logging.getLogger('httpmanager')
+
+
+class CacheEntry:
+    """
+    CacheEntry describes a page stored inside HttpCache
+
+    Attributes:
+        url (str): canonical url of the page
+        etag (str | None): ETag validator sent by the server
+        last_modified (str | None): Last-Modified validator sent by the server
+        encoding (str): charset of the page
+        size (int): size in bytes of the compressed body on disk
+        stored_at (float): time of the last download or revalidation
+    """
+    def __init__(self, url: str, etag: str | None, last_modified: str | None,
+                 encoding: str, size: int, stored_at: float):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.encoding = encoding
+        self.size = size
+        self.stored_at = stored_at
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Retrieves the headers to revalidate the page"""
+        headers: dict[str, str] = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """HttpCache stores on disk the pages downloaded by HttpManager
+    with their validators (ETag / Last-Modified), so a recrawl can send
+    a conditional GET and, on a 304 Not Modified, reuse the stored body
+    instead of downloading it again.
+    The pages are keyed by canonical url and the bodies are stored
+    zlib-compressed, one file per page, with a SQLite index.
+    The entries older than max_age seconds are discarded and, when the
+    total size exceeds max_bytes, the least recently used entries are
+    evicted. The expired entries are looked up every sweep_every stores
+    and the changes of the index are committed every commit_every
+    writes or commit_interval seconds (and by close()), so a store
+    doesn't slow down as the cache grows. Until close() the index is
+    locked for writing by other processes.
+    All methods are blocking, HttpManager calls them from a thread.
+
+    Attributes:
+        directory: folder of the cache
+        max_bytes: maximum size of the compressed bodies on disk
+        max_age: maximum age in seconds of an entry
+        sweep_every: stores between two lookups of the expired entries
+        commit_every: writes of the index between two commits
+        commit_interval: maximum seconds between two commits
+        hits: pages served from the cache after a 304
+        misses: pages not found in the cache
+        revalidations: conditional requests sent
+    """
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024,
+                 max_age: float = 30 * 24 * 3600, sweep_every: int = 1000,
+                 commit_every: int = 100, commit_interval: float = 1.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sweep_every = sweep_every
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.hits: int = 0
+        self.misses: int = 0
+        self.revalidations: int = 0
+        self.stores: int = 0
+        self.evictions: int = 0
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, 'index.db'),
+                                   check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                         'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, '
+                         'encoding TEXT, size INTEGER, stored_at REAL, accessed_at REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_stored_at ON entries (stored_at)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)')
+        self._db.commit()
+        self._uncommitted: int = 0
+        self._committedAt: float = time.monotonic()
+        self._totalBytes: int = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    @staticmethod
+    def key(url: str) -> str:
+        return canonicalize(url) or url
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{hashlib.sha1(key.encode()).hexdigest()}.z')
+
+    def lookup(self, url: str) -> CacheEntry | None:
+        """Retrieves the entry of the url, None if it's not in the cache
+        or if it's expired. The request built from an entry must be
+        notified with hit() or with store()."""
+        key = self.key(url)
+        with self._lock:
+            row = self._db.execute('SELECT url, etag, last_modified, encoding, size, stored_at '
+                                   'FROM entries WHERE url = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            entry = CacheEntry(*row)
+            if time.time() - entry.stored_at > self.max_age:
+                self._delete(key, entry.size)
+                self.misses += 1
+                return None
+            return entry
+
+    def revalidating(self) -> None:
+        """Counts a conditional request sent for an entry"""
+        with self._lock:
+            self.revalidations += 1
+
+    def hit(self, entry: CacheEntry, revalidated: bool = True) -> bytes | None:
+        """Reads the body of a page still valid (304 Not Modified)
+
+        Args:
+            entry: entry retrieved by lookup()
+            revalidated: False if the page is read without any request,
+                         its age is not refreshed
+
+        Returns:
+            The raw body of the page or None if it can't be read
+        """
+        try:
+            with open(self._path(entry.url), 'rb') as f:
+                body = zlib.decompress(f.read())
+        except (OSError, zlib.error) as e:
+            logger.warning(f'[HttpCache] - Unable to read {entry.url}: {e}')
+            with self._lock:
+                self._delete(entry.url, entry.size)
+            return None
+        now = time.time()
+        with self._lock:
+            self.hits += 1
+            if revalidated:
+                self._db.execute('UPDATE entries SET stored_at = ?, accessed_at = ? '
+                                 'WHERE url = ?', (now, now, entry.url))
+            else:
+                self._db.execute('UPDATE entries SET accessed_at = ? WHERE url = ?',
+                                 (now, entry.url))
+            self._written()
+        return body
+
+    def store(self, url: str, body: bytes, etag: str | None,
+              last_modified: str | None, encoding: str) -> None:
+        """Stores a downloaded page, only pages with a validator are
+        stored: the previous entry of a page without validators is
+        removed, it's stale"""
+        key = self.key(url)
+        if not etag and not last_modified:
+            with self._lock:
+                previous = self._db.execute('SELECT size FROM entries WHERE url = ?',
+                                            (key,)).fetchone()
+                if previous:
+                    self._delete(key, previous[0], evicted=False)
+                    self._written()
+            return
+        data = zlib.compress(body)
+        with open(self._path(key), 'wb') as f:
+            f.write(data)
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute('SELECT size FROM entries WHERE url = ?', (key,)).fetchone()
+            if previous:
+                self._totalBytes -= previous[0]
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (key, etag, last_modified, encoding, len(data), now, now))
+            self._totalBytes += len(data)
+            self.stores += 1
+            if self.stores % self.sweep_every == 0:
+                self._sweep()
+            if self._totalBytes > self.max_bytes:
+                self._evict()
+            self._written()
+
+    def _written(self) -> None:
+        self._uncommitted += 1
+        now = time.monotonic()
+        if self._uncommitted >= self.commit_every or \
+            now - self._committedAt >= self.commit_interval:
+            self._db.commit()
+            self._uncommitted = 0
+            self._committedAt = now
+
+    def _sweep(self) -> None:
+        """Removes the expired entries"""
+        expired = self._db.execute('SELECT url, size FROM entries WHERE stored_at < ?',
+                                   (time.time() - self.max_age,)).fetchall()
+        for key, size in expired:
+            self._delete(key, size)
+
+    def _evict(self, batch: int = 64) -> None:
+        """Removes the least recently used entries until the cache is
+        within max_bytes"""
+        while self._totalBytes > self.max_bytes:
+            rows = self._db.execute('SELECT url, size FROM entries ORDER BY accessed_at '
+                                    'LIMIT ?', (batch,)).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._totalBytes <= self.max_bytes:
+                    break
+                self._delete(key, size)
+
+    def _delete(self, key: str, size: int, evicted: bool = True) -> None:
+        self._db.execute('DELETE FROM entries WHERE url = ?', (key,))
+        self._totalBytes -= size
+        if evicted:
+            self.evictions += 1
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def size(self) -> int:
+        """Retrieves the size of the compressed bodies stored"""
+        return self._totalBytes
+
+    def stats(self) -> dict[str, int]:
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'bytes': self._totalBytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.commit()
+            self._db.close()
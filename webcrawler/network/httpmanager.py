@@ -1,8 +1,20 @@
 import asyncio
+import codecs
 import logging
 import os
-from aiohttp import ClientSession, ClientTimeout
+import random
+import re
+import time
+import zlib
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator
+from aiohttp import (ClientConnectionError, ClientSession, ClientTimeout,
+                     ConnectionTimeoutError, ServerDisconnectedError, TCPConnector,
+                     TraceConfig)
 from pydantic import HttpUrl
+from network.httpcache import HttpCache
+from metrics import MetricsRegistry
 
 HTML_MEDIA_TYPE = 'text/html'
 XHTML_MEDIA_TYPE = 'application/xhtml+xml'
@@ -11,42 +23,239 @@ HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
                   'AppleWebKit/537.36 (KHTML, like Gecko) '
                   'Chrome/93.0.4577.82 Safari/537.36',}
+# transient errors, the request is retried
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+TIMEOUT = 'timeout'
+CONNECTION = 'connection'
+DISCONNECTED = 'disconnected'
+RETRY_ERRORS = frozenset({TIMEOUT, DISCONNECTED})
+
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="...; charset=...">
+META_CHARSET_REGEX = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9._:-]+)', re.I)
+# bytes of the page looked up for a <meta charset>, as the html prescan
+META_PRESCAN_SIZE = 1024
 
 logger = logging.getLogger('httpmanager')
 
+
+def detect_encoding(charset: str | None, body: bytes) -> str:
+    """Retrieves the encoding of an html page: the charset of the
+    Content-Type, then the <meta charset> of the page, utf-8 otherwise.
+    The encodings unknown to Python are skipped.
+
+    Args:
+        charset: charset parameter of the Content-Type, if any
+        body: raw body of the page
+    """
+    candidates = [charset]
+    match = META_CHARSET_REGEX.search(body, 0, META_PRESCAN_SIZE)
+    if match:
+        candidates.append(match.group(1).decode('ascii'))
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            return codecs.lookup(candidate).name
+        except LookupError:
+            continue
+    return 'utf-8'
+
+
 class HttpResult:
     """
     HttpResult is the result provided by HttpManager.
     Each result will have the web page's url and its
-    html file as text
+    html file as text, or as raw bytes when HttpManager
+    works in streaming mode
 
     Attributes:
-        htmlPage (str): Content of HTML file
+        htmlPage (str | bytes): Content of HTML file
         pageUrl (str): HTTP/HTTPS url of web page
+        status (int): status code of the response, 0 without a response
+        error (str): 'timeout', 'connection' or 'disconnected' when
+                     the request failed without a response
+        retry_after (float): seconds requested by the Retry-After
+                             header of the response
     """
-    def __init__(self, htmlPage: str, url:str):
+    def __init__(self, htmlPage: str | bytes, url:str, status: int = 0,
+                 error: str | None = None, retry_after: float | None = None):
         
         self.htmlPage = htmlPage
         self.pageUrl = url
+        self.status = status
+        self.error = error
+        self.retry_after = retry_after
+
+    def is_host_failure(self) -> bool:
+        """Checks if the request failed because of the host (server
+        errors, throttling, timeouts and connection errors)"""
+        return self.status in RETRY_STATUSES or self.error is not None
+
+    def is_transient(self) -> bool:
+        """Checks if the request failed with an error worth retrying
+        (server errors, throttling, timeouts, dropped connections)"""
+        return self.status in RETRY_STATUSES or self.error in RETRY_ERRORS
     
     def __eq__(self, value):
         return self.htmlPage == value.htmlPage and \
             self.pageUrl == value.pageUrl
 
+class ConnectionStats:
+    """
+    ConnectionStats collects the counters about the connections
+    opened by HttpManager. They are filled by the aiohttp tracing
+    signals, so they allow to check if the connections are reused
+    (keep-alive) or if each request pays a new handshake.
+
+    Attributes:
+        new_connections (int): connections opened from scratch
+        reused_connections (int): requests served by a pooled connection
+        handshake_time (float): seconds spent opening new connections
+                                (TCP connect + TLS handshake)
+        dns_cache_hits (int): hosts resolved from the DNS cache
+        dns_cache_misses (int): hosts resolved with a DNS lookup
+        sessions_created (int): amount of ClientSession created
+    """
+    def __init__(self):
+        self.new_connections: int = 0
+        self.reused_connections: int = 0
+        self.handshake_time: float = 0.0
+        self.dns_cache_hits: int = 0
+        self.dns_cache_misses: int = 0
+        self.sessions_created: int = 0
+
+    def avg_handshake_time(self) -> float:
+        """Retrieves the average time to open a new connection"""
+        if self.new_connections == 0:
+            return 0.0
+        return self.handshake_time / self.new_connections
+
+    def reuse_ratio(self) -> float:
+        """Retrieves the fraction of requests served by a reused connection"""
+        total = self.new_connections + self.reused_connections
+        return self.reused_connections / total if total else 0.0
+
+    def as_dict(self) -> dict[str, int | float]:
+        return {'new_connections': self.new_connections,
+                'reused_connections': self.reused_connections,
+                'handshake_time': self.handshake_time,
+                'avg_handshake_time': self.avg_handshake_time(),
+                'reuse_ratio': self.reuse_ratio(),
+                'dns_cache_hits': self.dns_cache_hits,
+                'dns_cache_misses': self.dns_cache_misses,
+                'sessions_created': self.sessions_created}
+
+
 class HttpManager:
-    """HttpManager makes the network requests to download an HTML page. 
+    """HttpManager makes the network requests to download an HTML page.
        HttpManager require an HTTP/HTTPS URL to be created and can
        read some additional configuration's parameters from a
-       dictionary, such as session timeout for the HTTP/HTTPS requests
+       dictionary, such as session timeout for the HTTP/HTTPS requests.
+
+       By default HttpManager works in pooled mode: only one session
+       is kept for the whole crawl, so the connections are reused
+       (keep-alive) and the DNS lookups are cached. The session is
+       recreated only when it has been closed or when too many
+       consecutive connection errors have been detected.
+       With pooled=False a new session is created for each request.
+
+       Transient errors (429, 5xx, timeouts, connections dropped by
+       the server) are retried up to retries times, waiting a jittered
+       exponential back-off (a random time up to backoff * 2^attempt
+       seconds, at most max_backoff) or the time requested by the
+       Retry-After header. A Retry-After longer than max_retry_after
+       is not waited: the result carries it, so the Frontier can pause
+       the host instead of blocking a producer.
+       With retry_in_place=False fetch() never waits: the caller gets
+       the transient error at once and retries the request later
+       according to retry_delay() (TaskManager gives the url back to
+       the Frontier, so the producer moves on to other urls).
+
+       Supported parameters:
+           timeout (int): total timeout of a request in seconds (default 60)
+           connect_timeout (float): timeout to open a connection in
+                                    seconds (default 10)
+           read_timeout (float): maximum seconds between two reads of
+                                 the response (default 30)
+           retries (int): retries of a transient error (default 2)
+           backoff (float): base of the exponential back-off in seconds
+                            (default 0.5)
+           max_backoff (float): maximum back-off in seconds (default 30)
+           max_retry_after (float): longest Retry-After waited in
+                                    seconds (default 30)
+           retry_in_place (bool): wait and retry the transient errors
+                                  inside fetch() (default True)
+           max_resource_size (int): maximum size in bytes of a document
+                                    read by stream_resource, after the
+                                    decompression (default 50 MiB)
+           debug (bool): store the downloaded pages on disk
+           pooled (bool): keep a long-lived session (default True)
+           limit (int): maximum amount of open connections (default 100)
+           limit_per_host (int): maximum amount of open connections
+                                 towards the same host (default 8)
+           dns_cache_ttl (int): seconds to keep a resolved host (default 300)
+           keepalive_timeout (float): seconds to keep an idle connection
+                                      open (default 30)
+           max_failures (int): consecutive connection errors before
+                               recreating the session (default 3)
+           stream (bool): keep the page as raw bytes instead of decoding
+                          it to str (default False)
+           max_body_size (int): maximum size in bytes of a page, bigger
+                                pages are discarded (default 10 MiB)
+           chunk_size (int): size of the chunks read from the
+                             response (default 64 KiB)
+           cache (HttpCache): on-disk cache of the pages, the cached pages
+                              are revalidated with a conditional GET
+           metrics (MetricsRegistry): registry filled with the latency of
+                                      the requests (DNS, connect, TTFB),
+                                      the bytes downloaded and the status codes
     """
 
     def __init__(self, base_url: HttpUrl, **kwargs):
         # session timeout
         self._timeout = 60 if 'timeout' not in kwargs else kwargs['timeout']
+        self._connectTimeout: float = kwargs.get('connect_timeout', 10)
+        self._readTimeout: float = kwargs.get('read_timeout', 30)
+        self._retries: int = kwargs.get('retries', 2)
+        self._backoff: float = kwargs.get('backoff', 0.5)
+        self._maxBackoff: float = kwargs.get('max_backoff', 30)
+        self._maxRetryAfter: float = kwargs.get('max_retry_after', 30)
+        self.retry_in_place: bool = kwargs.get('retry_in_place', True)
+        self._maxResourceSize: int = kwargs.get('max_resource_size', 50 * 1024 * 1024)
         self._base_url = base_url
         self._session = None
-        self._debug: bool = kwargs['debug'] if 'debug' in kwargs else False        
-    
+        # session -> requests running on it
+        self._inflight: dict[ClientSession, int] = {}
+        self._debug: bool = kwargs['debug'] if 'debug' in kwargs else False
+        self._pooled: bool = kwargs.get('pooled', True)
+        self._limit: int = kwargs.get('limit', 100)
+        self._limitPerHost: int = kwargs.get('limit_per_host', 8)
+        self._dnsCacheTtl: int = kwargs.get('dns_cache_ttl', 300)
+        self._keepaliveTimeout: float = kwargs.get('keepalive_timeout', 30)
+        self._maxFailures: int = kwargs.get('max_failures', 3)
+        self._failures: int = 0
+        self._sessionLock: asyncio.Lock = asyncio.Lock()
+        self._stream: bool = kwargs.get('stream', False)
+        self._maxBodySize: int = kwargs.get('max_body_size', 10 * 1024 * 1024)
+        self._chunkSize: int = kwargs.get('chunk_size', 64 * 1024)
+        self._cache: HttpCache | None = kwargs.get('cache')
+        self.stats = ConnectionStats()
+        self.metrics: MetricsRegistry | None = None
+        if kwargs.get('metrics') is not None:
+            self.use_metrics(kwargs['metrics'])
+
+    def use_metrics(self, registry: MetricsRegistry) -> None:
+        """Fills registry with the metrics of the requests"""
+        self.metrics = registry
+        self._fetchLatency = registry.histogram('fetch_seconds', 'Total time to fetch a page')
+        self._dnsLatency = registry.histogram('dns_seconds', 'Time to resolve a host')
+        self._connectLatency = registry.histogram('connect_seconds',
+                                                  'Time to open a connection (TCP + TLS)')
+        self._ttfb = registry.histogram('ttfb_seconds', 'Time to the response headers')
+        self._bytes = registry.counter('bytes_downloaded', 'Bytes of the bodies downloaded')
+        self._statusCodes = registry.counter('responses', 'Responses by status code', 'code')
+        self._retried = registry.counter('retries', 'Requests retried after a transient error')
+
     async def fetch(self, url: str) -> HttpResult:
         """ Fetch Coroutine to download html file of a web page
 
@@ -54,51 +263,389 @@ class HttpManager:
             url (str): HTTP/HTTPS url to query for downloading the page
 
         Returns: 
-            HttpResult with the html page stored as string and its own
-            url.
+            HttpResult with the html page stored as string (as bytes
+            in streaming mode) and its own url.
             In case of any error during the downloading process, an
             HttpResult object with an empty htmlPage will be retrieved,
             only the webpage's url will be configured. 
         """
+        if self.metrics is None:
+            return await self._fetch(url)
+        t1 = time.perf_counter()
+        try:
+            return await self._fetch(url)
+        finally:
+            self._fetchLatency.observe(time.perf_counter() - t1)
+
+    async def _fetch(self, url: str) -> HttpResult:
+        attempt = 0
+        while True:
+            result = await self._fetch_once(url)
+            if not self.retry_in_place or attempt >= self._retries or \
+                not result.is_transient():
+                return result
+            delay = self.backoff_delay(attempt, result.retry_after)
+            if delay is None:
+                return result
+            attempt += 1
+            logger.info('[HttpManager] - Retry %d of %s in %.2f s (%s)', attempt, url, delay,
+                        result.status or result.error)
+            if self.metrics is not None:
+                self._retried.inc()
+            await asyncio.sleep(delay)
+
+    def retry_delay(self, result: HttpResult, attempt: int) -> float | None:
+        """Retrieves the seconds to wait before retrying a request
+        made outside fetch() (retry_in_place=False), the Retry-After
+        is always honoured however long
+
+        Args:
+            result: result of the last attempt
+            attempt: attempts already retried
+
+        Returns:
+            The delay, None if the request must not be retried (not a
+            transient error or no retry left)
+        """
+        if attempt >= self._retries or not result.is_transient():
+            return None
+        if result.retry_after is not None:
+            return result.retry_after
+        return self.backoff_delay(attempt)
+
+    def backoff_delay(self, attempt: int, retryAfter: float | None = None) -> float | None:
+        """Retrieves the seconds to wait before the next attempt, None
+        if the Retry-After requested is too long to be waited"""
+        if retryAfter is not None:
+            return retryAfter if retryAfter <= self._maxRetryAfter else None
+        return random.uniform(0, min(self._maxBackoff, self._backoff * 2 ** attempt))
+
+    @staticmethod
+    def parse_retry_after(value: str | None) -> float | None:
+        """Retrieves the seconds of a Retry-After header (delay in
+        seconds or HTTP date)"""
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    async def _fetch_once(self, url: str, conditional: bool = True) -> HttpResult:
         task = asyncio.current_task().get_name()
-        logger.debug(f'[Task {task}] - GET {url}')
-        await self.refresh_session()
+        logger.debug('[Task %s] - GET %s', task, url)
+        entry = await asyncio.to_thread(self._cache.lookup, url) \
+            if self._cache and conditional else None
+        headers = entry.conditional_headers() if entry else None
+        if entry:
+            self._cache.revalidating()
         try:
-            async with await self._session.get(url) as response:
+            async with self._use_session() as session, \
+                    await session.get(url, headers=headers) as response:
+                self._failures = 0
+                if self.metrics is not None:
+                    self._statusCodes.inc(label=str(response.status))
+                if response.status == 304 and entry:
+                    logger.debug('[Task %s] - 304 Not Modified %s', task, url)
+                    body = await asyncio.to_thread(self._cache.hit, entry)
+                    if body is None:
+                        # the body stored can't be read, it's downloaded again
+                        response.release()
+                        return await self._fetch_once(url, conditional=False)
+                    return HttpResult(self._to_page(body, entry.encoding), url, response.status)
                 if response.status == 200:
                     if response.content_type == HTML_MEDIA_TYPE or \
                         response.content_type == XHTML_MEDIA_TYPE:
-                        logger.debug(f'[Task {task}] - 200 OK {url}')
-                        htmlPage = await response.text()
+                        logger.debug('[Task %s] - 200 OK %s', task, url)
+                        body = await self._read_body(response)
+                        if body is None:
+                            logger.warning('[Task %s] - Page bigger than %d bytes at %s',
+                                           task, self._maxBodySize, url)
+                            return HttpResult('', url, response.status)
+                        # get_encoding() can't guess from a body already read
+                        encoding = detect_encoding(response.charset, body)
+                        htmlPage = self._to_page(body, encoding)
+                        if self._cache and 'no-store' not in response.headers.get('Cache-Control', ''):
+                            await asyncio.to_thread(self._cache.store, url, body,
+                                                    response.headers.get('ETag'),
+                                                    response.headers.get('Last-Modified'),
+                                                    encoding)
                         if self._debug:
                             suffix = f'.{url.split('.')[-1]}'
                             logger.debug(f'Suffix {suffix}')
-                            with open(f'pages\\{url.split('//')[-1].removesuffix(suffix)}.html', 'w',
-                                      encoding='utf-8') as f:
-                                f.write(htmlPage)
-                        return HttpResult(htmlPage, url)
+                            with open(f'pages\\{url.split('//')[-1].removesuffix(suffix)}.html', 'wb') as f:
+                                f.write(body)
+                        return HttpResult(htmlPage, url, response.status)
                     else:
-                        logger.warning(f'[Task {task}] - Unexpected ContentType: {response.content_type}')
-                        return HttpResult('', url)
+                        logger.warning('[Task %s] - Unexpected ContentType: %s', task, response.content_type)
+                        return HttpResult('', url, response.status)
                 elif response.status == 404:
-                    logger.warning(f'[Task {task}] - Error: Page NOT FOUND at {url}')
+                    logger.warning('[Task %s] - Error: Page NOT FOUND at %s', task, url)
                 else:
-                    logger.warning(f'[Task {task}] - Error: {response.status} at {url}')
-                return HttpResult('', url)
+                    logger.warning('[Task %s] - Error: %s at %s', task, response.status, url)
+                return HttpResult('', url, response.status,
+                                  retry_after=self.parse_retry_after(response.headers.get('Retry-After')))
+        except ConnectionTimeoutError as e:
+            # the host is not reachable, it's up to the circuit breaker
+            logger.error('[Task %s] - Connection timeout on fetching url %s: %s', task, url, e)
+            self._failures += 1
+            return HttpResult('', url, error=CONNECTION)
+        except asyncio.TimeoutError:
+            logger.error('[Task %s] - Timeout on fetching url %s', task, url)
+            return HttpResult('', url, error=TIMEOUT)
+        except ServerDisconnectedError as e:
+            logger.error('[Task %s] - Connection dropped on fetching url %s: %s', task, url, e)
+            return HttpResult('', url, error=DISCONNECTED)
+        except ClientConnectionError as e:
+            logger.error('[Task %s] - Connection error on fetching url %s: %s', task, url, e)
+            self._failures += 1
+            return HttpResult('', url, error=CONNECTION)
         except Exception as e:
-            logger.debug(f'[Task {task}] - ERROR {e}')
-            logger.error(f'[Task {task}] - Error on fetching url {url}: {e}')
+            logger.debug('[Task %s] - ERROR %s', task, e)
+            logger.error('[Task %s] - Error on fetching url %s: %s', task, url, e)
             return HttpResult('', url)
-    
+
+    def _to_page(self, body: bytes, encoding: str) -> str | bytes:
+        """Retrieves the page as bytes in streaming mode, as text otherwise"""
+        return body if self._stream else body.decode(encoding, errors='replace')
+
+    async def _read_body(self, response) -> bytes | None:
+        """Reads the body of the response in chunks
+
+        Returns:
+            The raw body or None if it exceeds the maximum size
+        """
+        if response.content_length and response.content_length > self._maxBodySize:
+            return None
+        chunks: list[bytes] = []
+        size = 0
+        async for chunk in response.content.iter_chunked(self._chunkSize):
+            size += len(chunk)
+            if size > self._maxBodySize:
+                return None
+            chunks.append(chunk)
+        if self.metrics is not None:
+            self._bytes.inc(size)
+        return b''.join(chunks)
+
+    async def fetch_resource(self, url: str) -> tuple[int, bytes]:
+        """ Fetch Coroutine to download a resource which is not an
+        html page, such as robots.txt. The size of the resource is
+        limited by max_body_size.
+
+        Args:
+            url (str): HTTP/HTTPS url of the resource
+
+        Returns:
+            A tuple with the status code and the raw content of the
+            resource. In case of any error the status code is 0 and
+            the content is empty.
+        """
+        try:
+            async with self._use_session() as session, \
+                    await session.get(url, headers={'Accept': '*/*'}) as response:
+                self._failures = 0
+                if response.status != 200:
+                    return response.status, b''
+                body = await self._read_body(response)
+                return response.status, body if body is not None else b''
+        except ClientConnectionError as e:
+            logger.error(f'[HttpManager] - Connection error on fetching url {url}: {e}')
+            self._failures += 1
+            return 0, b''
+        except Exception as e:
+            logger.error(f'[HttpManager] - Error on fetching url {url}: {e}')
+            return 0, b''
+
+    async def stream_resource(self, url: str) -> AsyncIterator[bytes]:
+        """Async generator downloading a resource in chunks (such as
+        sitemaps and feeds), the gzip-compressed resources are
+        decompressed on the fly. The resource is truncated at
+        max_resource_size bytes, nothing more is retrieved on errors.
+        """
+        size = 0
+        try:
+            async with self._use_session() as session, \
+                    await session.get(url, headers={'Accept': '*/*'}) as response:
+                self._failures = 0
+                if response.status != 200:
+                    logger.warning(f'[HttpManager] - Error: {response.status} at {url}')
+                    return
+                decompressor = None
+                first = True
+                async for chunk in response.content.iter_chunked(self._chunkSize):
+                    if first and chunk[:2] == b'\x1f\x8b':
+                        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    first = False
+                    while chunk:
+                        if decompressor is None:
+                            data, chunk = chunk, b''
+                        else:
+                            # bounded output, a small chunk can expand a lot
+                            data = decompressor.decompress(chunk, self._chunkSize)
+                            chunk = decompressor.unconsumed_tail
+                        size += len(data)
+                        if size > self._maxResourceSize:
+                            logger.warning(f'[HttpManager] - {url} truncated at '
+                                           f'{self._maxResourceSize} bytes')
+                            return
+                        if data:
+                            yield data
+        except ClientConnectionError as e:
+            logger.error(f'[HttpManager] - Connection error on fetching url {url}: {e}')
+            self._failures += 1
+        except (asyncio.TimeoutError, zlib.error) as e:
+            logger.error(f'[HttpManager] - Error on fetching url {url}: {e!r}')
+
+    async def fetch_cached(self, url: str) -> HttpResult | None:
+        """Retrieves a page from the cache without any request
+
+        Returns:
+            The HttpResult of the page or None if it's not cached
+        """
+        if not self._cache:
+            return None
+        entry = await asyncio.to_thread(self._cache.lookup, url)
+        if entry is None:
+            return None
+        body = await asyncio.to_thread(self._cache.hit, entry, False)
+        if body is None:
+            return None
+        return HttpResult(self._to_page(body, entry.encoding), url, 200)
+
+    async def fetch_robots(self, url: str) -> str | None:
+        """Retrieves the content of a robots.txt file or None if
+        it's not available (all urls are allowed)"""
+        status, body = await self.fetch_resource(url)
+        if status != 200:
+            logger.debug('[HttpManager] - No robots.txt at %s (%s)', url, status)
+            return None
+        return body.decode('utf-8', errors='replace')
+
+    async def get_session(self) -> ClientSession:
+        """Retrieves the pooled session creating it only if it doesn't
+        exist yet, if it has been closed or if too many consecutive
+        connection errors have been detected.
+        """
+        async with self._sessionLock:
+            if self._session is None or self._session.closed or \
+                self._failures >= self._maxFailures:
+                if self._failures >= self._maxFailures:
+                    logger.warning(f'[HttpManager] - {self._failures} consecutive '
+                                   'connection errors, recreating session')
+                await self.refresh_session()
+        return self._session
+
+    @asynccontextmanager
+    async def _use_session(self) -> AsyncIterator[ClientSession]:
+        """Retrieves the session of a request, the pooled one or a new
+        one. A session replaced while some requests run on it is closed
+        when the last of them completes.
+        """
+        if self._pooled:
+            session = await self.get_session()
+        else:
+            await self.refresh_session()
+            session = self._session
+        self._inflight[session] = self._inflight.get(session, 0) + 1
+        try:
+            yield session
+        finally:
+            self._inflight[session] -= 1
+            if not self._inflight[session]:
+                del self._inflight[session]
+                if session is not self._session and not session.closed:
+                    await session.close()
+
     async def refresh_session(self) -> None:
         """Allow to recreate the session in case a timeout has fired or 
-        the session has been closed.
+        the session has been closed. The previous session is closed
+        once the requests running on it complete.
         """
-        await self.close()
-        self._session = ClientSession(timeout=ClientTimeout(total=self._timeout),
-                                      headers=HEADERS)
+        previous = self._session
+        self._failures = 0
+        self.stats.sessions_created += 1
+        if self._pooled:
+            connector = TCPConnector(limit=self._limit,
+                                     limit_per_host=self._limitPerHost,
+                                     ttl_dns_cache=self._dnsCacheTtl,
+                                     use_dns_cache=True,
+                                     keepalive_timeout=self._keepaliveTimeout)
+        else:
+            connector = None
+        timeout = ClientTimeout(total=self._timeout, sock_connect=self._connectTimeout,
+                                sock_read=self._readTimeout)
+        self._session = ClientSession(timeout=timeout,
+                                      headers=HEADERS,
+                                      connector=connector,
+                                      trace_configs=[self._trace_config()])
+        if previous is not None and previous not in self._inflight and not previous.closed:
+            await previous.close()
+
+    def _trace_config(self) -> TraceConfig:
+        """Builds the tracing hooks which fill the connection stats
+        and, if a registry is set, the latency metrics"""
+        stats = self.stats
+
+        async def on_request_start(session, context, params):
+            context.requestStart = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            if self.metrics is not None:
+                self._ttfb.observe(time.perf_counter() - context.requestStart)
+
+        async def on_dns_resolvehost_start(session, context, params):
+            context.dnsStart = time.perf_counter()
+
+        async def on_dns_resolvehost_end(session, context, params):
+            if self.metrics is not None:
+                self._dnsLatency.observe(time.perf_counter() - context.dnsStart)
+
+        async def on_connection_create_start(session, context, params):
+            context.connectStart = time.perf_counter()
+
+        async def on_connection_create_end(session, context, params):
+            elapsed = time.perf_counter() - context.connectStart
+            stats.new_connections += 1
+            stats.handshake_time += elapsed
+            if self.metrics is not None:
+                self._connectLatency.observe(elapsed)
+
+        async def on_connection_reuseconn(session, context, params):
+            stats.reused_connections += 1
+
+        async def on_dns_cache_hit(session, context, params):
+            stats.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(session, context, params):
+            stats.dns_cache_misses += 1
+
+        traceConfig = TraceConfig()
+        traceConfig.on_request_start.append(on_request_start)
+        traceConfig.on_request_end.append(on_request_end)
+        traceConfig.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+        traceConfig.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        traceConfig.on_connection_create_start.append(on_connection_create_start)
+        traceConfig.on_connection_create_end.append(on_connection_create_end)
+        traceConfig.on_connection_reuseconn.append(on_connection_reuseconn)
+        traceConfig.on_dns_cache_hit.append(on_dns_cache_hit)
+        traceConfig.on_dns_cache_miss.append(on_dns_cache_miss)
+        return traceConfig
+
+    def get_stats(self) -> dict[str, int | float]:
+        """Retrieves the connection reuse counters and, if the cache
+        is enabled, its counters prefixed by 'cache_'"""
+        stats = self.stats.as_dict()
+        if self._cache:
+            stats.update({f'cache_{k}': v for k, v in self._cache.stats().items()})
+        return stats
 
     async def close(self):
-        """Close the session if it's still opened"""
-        if self._session and not self._session.closed: 
-            await self._session.close()
\ No newline at end of file
+        """Close the session, and the sessions replaced with requests
+        still running, if they're still opened"""
+        for session in [self._session, *self._inflight]:
+            if session and not session.closed:
+                await session.close()
\ No newline at end of file
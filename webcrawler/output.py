@@ -0,0 +1,171 @@
+import asyncio
+import csv
+import io
+import inspect
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable
+
+logger = logging.getLogger('taskmanager')
+
+
+class ResultSink:
+    """ResultSink receives each page as soon as it has been parsed,
+    with the links found inside it, so the results of a crawl can be
+    consumed while the crawl is running.
+    TaskManager awaits write() for each page and close() at the end.
+    """
+    async def write(self, pageUrl: str, links: list[str]) -> None:
+        raise NotImplementedError
+
+    async def alias(self, pageUrl: str, canonical: str) -> None:
+        """Receives a duplicate page, which has not been parsed, with
+        the page holding the same content. By default it's written as a
+        page whose only link is its canonical page.
+        """
+        await self.write(pageUrl, [canonical])
+
+    async def close(self) -> None:
+        pass
+
+
+class BufferedFileSink(ResultSink):
+    """BufferedFileSink collects the formatted pages in memory and
+    appends them to the file from a thread every buffer_size pages, so
+    the event loop never waits for the disk. A page waits for the
+    previous writes only when the buffer is full again, which bounds
+    the memory used by the pages not written yet.
+
+    Attributes:
+        path: file written, it's truncated when the sink is created
+        buffer_size: pages buffered before a write
+    """
+    def __init__(self, path: str, buffer_size: int = 256):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.pages: int = 0
+        self._buffer: list[str] = []
+        self._writeLock: asyncio.Lock = asyncio.Lock()
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        header = self.header()
+        if header:
+            self._file.write(header)
+
+    def header(self) -> str:
+        return ''
+
+    def format(self, pageUrl: str, links: list[str]) -> str:
+        raise NotImplementedError
+
+    async def write(self, pageUrl: str, links: list[str]) -> None:
+        self._buffer.append(self.format(pageUrl, links))
+        self.pages += 1
+        if len(self._buffer) >= self.buffer_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Appends the buffered pages to the file"""
+        async with self._writeLock:
+            lines, self._buffer = self._buffer, []
+            if lines:
+                await asyncio.to_thread(self._write, lines)
+
+    def _write(self, lines: list[str]) -> None:
+        self._file.writelines(lines)
+        self._file.flush()
+
+    async def close(self) -> None:
+        if self._file.closed:
+            return
+        await self.flush()
+        self._file.close()
+
+
+class JsonlSink(BufferedFileSink):
+    """JsonlSink writes one JSON object for each page:
+    {"url": <page url>, "links": [<links>]}"""
+    def format(self, pageUrl: str, links: list[str]) -> str:
+        return json.dumps({'url': pageUrl, 'links': links}) + '\n'
+
+
+class CsvSink(BufferedFileSink):
+    """CsvSink writes one row <page url>,<link> for each edge of the
+    graph, a page without links has an empty link"""
+    def header(self) -> str:
+        return 'page,link\r\n'
+
+    def format(self, pageUrl: str, links: list[str]) -> str:
+        out = io.StringIO()
+        writer = csv.writer(out)
+        if links:
+            writer.writerows((pageUrl, link) for link in links)
+        else:
+            writer.writerow((pageUrl, ''))
+        return out.getvalue()
+
+
+class CallbackSink(ResultSink):
+    """CallbackSink calls func(pageUrl, links) for each page, func can
+    be a plain function or a coroutine function"""
+    def __init__(self, func: Callable[[str, list[str]], None | Awaitable[None]]):
+        self.func = func
+        self._isCoroutine = inspect.iscoroutinefunction(func)
+
+    async def write(self, pageUrl: str, links: list[str]) -> None:
+        if self._isCoroutine:
+            await self.func(pageUrl, links)
+        else:
+            self.func(pageUrl, links)
+
+
+class StreamSink(ResultSink):
+    """StreamSink is an async iterator of (pageUrl, links) tuples,
+    which ends when the crawl is completed:
+
+        sink = StreamSink()
+        crawl = asyncio.create_task(TaskManager(url, output=sink).crawl())
+        async for pageUrl, links in sink:
+            ...
+
+    At most max_pending pages are kept waiting for the reader, then
+    the crawl waits for it.
+    """
+    _END = object()
+
+    def __init__(self, max_pending: int = 1024):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # the end of the stream never waits for the reader
+        self._slots: asyncio.Semaphore = asyncio.Semaphore(max_pending)
+        self._closed: bool = False
+
+    async def write(self, pageUrl: str, links: list[str]) -> None:
+        await self._slots.acquire()
+        self._queue.put_nowait((pageUrl, links))
+
+    async def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._queue.put_nowait(self._END)
+
+    def __aiter__(self) -> AsyncIterator[tuple[str, list[str]]]:
+        return self
+
+    async def __anext__(self) -> tuple[str, list[str]]:
+        item = await self._queue.get()
+        if item is self._END:
+            # the next readers end too
+            self._queue.put_nowait(self._END)
+            raise StopAsyncIteration
+        self._slots.release()
+        return item
+
+
+def open_sink(path: str, format: str | None = None) -> ResultSink:
+    """Creates the file sink for path, the format ('jsonl' or 'csv')
+    is taken from the extension when it's not given"""
+    format = format or path.rsplit('.', 1)[-1].lower()
+    if format in ('jsonl', 'json'):
+        return JsonlSink(path)
+    if format == 'csv':
+        return CsvSink(path)
+    raise ValueError('Unsupported output format', format)
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+from collections.abc import Callable
+from network.httpmanager import HttpResult
+from metrics import MetricsRegistry
+
+logger = logging.getLogger('taskmanager')
+
+
+class SpillSegment:
+    """SpillSegment is a temporary file where the bodies of the pages
+    are appended, it's removed when all of them have been read back
+
+    Attributes:
+        end: bytes written or reserved in the file
+        live: bytes not read back yet
+    """
+    def __init__(self, directory: str | None):
+        self._file = tempfile.TemporaryFile(prefix='pages-', dir=directory)
+        self.end: int = 0
+        self.live: int = 0
+
+    def reserve(self, length: int) -> int:
+        """Reserves length bytes at the end of the file
+
+        Returns:
+            The offset of the space reserved
+        """
+        offset = self.end
+        self.end += length
+        self.live += length
+        return offset
+
+    def write(self, body: bytes, offset: int) -> None:
+        os.pwrite(self._file.fileno(), body, offset)
+
+    def read(self, offset: int, length: int) -> bytes:
+        return os.pread(self._file.fileno(), length, offset)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class PageBuffer:
+    """PageBuffer holds the pages downloaded by the producers until a
+    consumer parses them. The back-pressure on the producers is given
+    by two limits:
+    - max_pages: maximum amount of pages queued, 0 for no limit
+    - max_bytes: maximum size of the bodies kept in memory, None for no
+      limit. A page bigger than max_bytes is accepted when no other
+      body is in memory, otherwise it could never be accepted.
+    With spill=True a page exceeding max_bytes doesn't block the
+    producer: its body is appended to a temporary file (in spill_dir)
+    and read back when a consumer retrieves it, up to max_spill_bytes
+    on disk. So the memory stays bounded while the downloads keep
+    running ahead of the parsing. The bodies are written in segments
+    of segment_bytes, each one is removed as soon as all its pages
+    have been read back, so the disk holds only the pages waiting.
+    The pages are retrieved in FIFO order, except the spilled ones
+    which are queued once written. The size of a page is the length of
+    its body (characters for a decoded page) and it's released as soon
+    as a consumer retrieves the page.
+
+    Attributes:
+        max_pages: maximum amount of pages queued, 0 for no limit
+        max_bytes: maximum bytes of the bodies kept in memory
+        spill: write the bodies exceeding max_bytes on disk
+        spill_dir: directory of the spill files, None for the default
+        max_spill_bytes: maximum bytes on disk, None for no limit
+        segment_bytes: size of a spill file before starting a new one
+        spilled: pages written on disk
+        metrics: registry filled with the bytes buffered and spilled
+    """
+    def __init__(self, max_pages: int = 1, max_bytes: int | None = None,
+                 spill: bool = False, spill_dir: str | None = None,
+                 max_spill_bytes: int | None = None,
+                 segment_bytes: int = 64 * 1024 * 1024,
+                 metrics: MetricsRegistry | None = None):
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.spill = spill
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.segment_bytes = segment_bytes
+        self.spilled: int = 0
+        # (queued at, page, size, (segment, offset, length, text) or None)
+        self._entries: deque[tuple[float, HttpResult, int, tuple | None]] = deque()
+        self._changed: asyncio.Condition = asyncio.Condition()
+        self._bytes: int = 0
+        self._spillBytes: int = 0
+        self._segment: SpillSegment | None = None
+        self._segments: set[SpillSegment] = set()
+        self._unfinished: int = 0
+        self.metrics: MetricsRegistry | None = None
+        if metrics is not None:
+            self.use_metrics(metrics)
+
+    def use_metrics(self, registry: MetricsRegistry) -> None:
+        """Fills registry with the bytes buffered and spilled"""
+        self.metrics = registry
+        registry.gauge('pages_buffered_bytes', 'Bytes of the pages waiting in memory',
+                       lambda: self._bytes)
+        registry.gauge('pages_spilled_bytes', 'Bytes of the pages waiting on disk',
+                       lambda: self._spillBytes)
+        self._spilledPages = registry.counter('spilled_pages', 'Pages written on disk')
+
+    @property
+    def maxsize(self) -> int:
+        return self.max_pages
+
+    @staticmethod
+    def size(page: HttpResult) -> int:
+        return len(page.htmlPage) if page.htmlPage else 0
+
+    def qsize(self) -> int:
+        """Retrieves the amount of pages queued"""
+        return len(self._entries)
+
+    def empty(self) -> bool:
+        return not self._entries
+
+    def nbytes(self) -> int:
+        """Retrieves the bytes of the bodies kept in memory"""
+        return self._bytes
+
+    def full(self) -> bool:
+        """Checks if a new page would block a producer"""
+        if 0 < self.max_pages <= len(self._entries):
+            return True
+        return self.max_bytes is not None and self._bytes >= self.max_bytes and \
+            not self._can_spill(1)
+
+    def _fits(self, size: int) -> bool:
+        return self.max_bytes is None or self._bytes == 0 or \
+            self._bytes + size <= self.max_bytes
+
+    def _can_spill(self, length: int) -> bool:
+        return self.spill and (self.max_spill_bytes is None or self._spillBytes == 0 or
+                               self._spillBytes + length <= self.max_spill_bytes)
+
+    async def put(self, page: HttpResult) -> None:
+        """Queues a page, waiting while the buffer is full"""
+        queuedAt = time.perf_counter()
+        size = self.size(page)
+        text = isinstance(page.htmlPage, str)
+        body: bytes | None = None
+        async with self._changed:
+            while True:
+                if 0 < self.max_pages <= len(self._entries):
+                    await self._changed.wait()
+                    continue
+                if self._fits(size):
+                    self._bytes += size
+                    self._append(queuedAt, page, size, None)
+                    return
+                if self.spill and body is None:
+                    body = page.htmlPage.encode('utf-8', errors='surrogatepass') \
+                        if text else page.htmlPage
+                if self.spill and self._can_spill(len(body)):
+                    break
+                await self._changed.wait()
+            # the space on disk is reserved, the page is queued once written
+            segment, offset = self._reserve(len(body))
+        try:
+            await asyncio.to_thread(segment.write, body, offset)
+        except BaseException:
+            async with self._changed:
+                self._release(segment, len(body))
+            raise
+        self.spilled += 1
+        if self.metrics:
+            self._spilledPages.inc()
+        logger.debug('[PageBuffer] - %s spilled (%d bytes)', page.pageUrl, len(body))
+        page.htmlPage = None
+        async with self._changed:
+            self._append(queuedAt, page, size, (segment, offset, len(body), text))
+
+    def _append(self, queuedAt: float, page: HttpResult, size: int,
+                spilled: tuple | None) -> None:
+        self._entries.append((queuedAt, page, size, spilled))
+        self._unfinished += 1
+        self._changed.notify_all()
+
+    def _reserve(self, length: int) -> tuple[SpillSegment, int]:
+        if self._segment is None or \
+            (self._segment.end > 0 and self._segment.end + length > self.segment_bytes):
+            self._segment = SpillSegment(self.spill_dir)
+            self._segments.add(self._segment)
+        self._spillBytes += length
+        return self._segment, self._segment.reserve(length)
+
+    def _release(self, segment: SpillSegment, length: int) -> None:
+        self._spillBytes -= length
+        segment.live -= length
+        if segment.live == 0:
+            if segment is self._segment:
+                # nothing is waiting in the current segment, it's rewound
+                segment.end = 0
+            else:
+                self._segments.discard(segment)
+                segment.close()
+        self._changed.notify_all()
+
+    async def get(self, claimed: Callable[[], None] | None = None) -> tuple[float, HttpResult]:
+        """Retrieves the next page with the time it has been queued,
+        waiting while the buffer is empty. If the task is cancelled
+        while a spilled page is read back, the page stays queued.
+
+        Args:
+            claimed: called as soon as a page is assigned to the caller,
+                     before its body is read back
+        """
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._entries)
+            entry = self._entries.popleft()
+            if claimed:
+                claimed()
+            queuedAt, page, size, spilled = entry
+            if spilled is None:
+                self._bytes -= size
+                self._changed.notify_all()
+                return queuedAt, page
+        segment, offset, length, text = spilled
+        try:
+            body = await asyncio.to_thread(segment.read, offset, length)
+        except asyncio.CancelledError:
+            # the page is given back, first in line for another consumer
+            self._entries.appendleft(entry)
+            async with self._changed:
+                self._changed.notify_all()
+            raise
+        except BaseException:
+            async with self._changed:
+                self._release(segment, length)
+            raise
+        # released only after the read, the space can be reused
+        async with self._changed:
+            self._release(segment, length)
+        page.htmlPage = body.decode('utf-8', errors='surrogatepass') if text else body
+        return queuedAt, page
+
+    def task_done(self) -> None:
+        """Marks a page retrieved by get() as processed"""
+        if self._unfinished <= 0:
+            raise ValueError('task_done() called too many times')
+        self._unfinished -= 1
+
+    def stats(self) -> dict[str, int]:
+        return {'queued': len(self._entries), 'bytes': self._bytes,
+                'spilled': self.spilled, 'spilled_bytes': self._spillBytes,
+                'segments': len(self._segments)}
+
+    def close(self) -> None:
+        """Removes the spill files"""
+        for segment in self._segments:
+            segment.close()
+        self._segments.clear()
+        self._segment = None
@@ -0,0 +1,3 @@
+from .parser import *
+from .pool import *
+from .extractors import *
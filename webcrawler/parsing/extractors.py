@@ -0,0 +1,185 @@
+import re
+from html import unescape
+from urllib.parse import urljoin
+from selectolax.lexbor import LexborHTMLParser
+
+# <link> relations pointing to other pages (the others are assets)
+LINK_RELS = frozenset({'alternate', 'canonical', 'next', 'prev', 'previous',
+                       'amphtml', 'author', 'help', 'index', 'search'})
+# elements (and attribute) holding a link for the extended engines
+LINK_ATTRIBUTES = {'a': 'href', 'area': 'href', 'link': 'href', 'iframe': 'src',
+                   'img': 'srcset', 'source': 'srcset'}
+# a candidate of srcset: the url, then the trailing commas or the descriptors
+SRCSET_REGEX = re.compile(r'[\s,]*(\S*[^\s,])(?:,+|\s[^,]*,?|$)')
+
+
+def parse_srcset(value: str) -> list[str]:
+    """Retrieves the urls of a srcset attribute ('a.jpg 1x, b.jpg 2x')"""
+    return [url for url in SRCSET_REGEX.findall(value) if url]
+
+
+def _link_values(tag: str, attributes: dict) -> list[str]:
+    """Retrieves the links held by an element of LINK_ATTRIBUTES"""
+    if tag == 'link':
+        rels = (attributes.get('rel') or '').lower().split()
+        if not LINK_RELS.intersection(rels):
+            return []
+    value = attributes.get(LINK_ATTRIBUTES[tag])
+    if value is None:
+        return []
+    if tag in ('img', 'source'):
+        return parse_srcset(value)
+    return [value.strip()]
+
+
+def _apply_base(links: list[str], base: str | None) -> list[str]:
+    """Resolves the links against <base href>, the first one found"""
+    if not base:
+        return links
+    return [urljoin(base, link) for link in links]
+
+
+class LinkExtractor:
+    """LinkExtractor is an engine retrieving the links of an html page.
+    The engines are stateless and picklable, so the same instance is
+    used by the consumers and sent to the workers of PoolParser.
+
+    Attributes:
+        name: name of the engine (see EXTRACTORS)
+    """
+    name: str = ''
+
+    def extract(self, html: str | bytes) -> list[str]:
+        """Retrieves the links of the page in document order
+
+        Args:
+            html: html page as text or as raw bytes
+
+        Returns:
+            The list of links found in the page
+        """
+        raise NotImplementedError
+
+    def extract_batch(self, pages: list[bytes]) -> list[list[str]]:
+        return [self.extract(page) for page in pages]
+
+
+class AnchorExtractor(LinkExtractor):
+    """AnchorExtractor retrieves only the href of the anchors <a> from
+    the Lexbor DOM, it's the default engine"""
+    name = 'anchors'
+
+    def extract(self, html: str | bytes) -> list[str]:
+        links: list[str] = []
+        for anchor in LexborHTMLParser(html).select('a').matches:
+            if 'href' in anchor.attributes:
+                links.append(anchor.attributes['href'])
+        return links
+
+
+class DomExtractor(LinkExtractor):
+    """DomExtractor builds the Lexbor DOM and retrieves the links of the
+    anchors, image maps (<area>), iframes, <link> to other pages
+    (LINK_RELS) and the urls of srcset, resolved against <base href>.
+    The srcset urls are images: the UrlFilter drops them by extension.
+    """
+    name = 'dom'
+    SELECTOR = 'a[href], area[href], link[href], iframe[src], img[srcset], ' \
+               'source[srcset], base[href]'
+
+    def extract(self, html: str | bytes) -> list[str]:
+        links: list[str] = []
+        base: str | None = None
+        for node in LexborHTMLParser(html).select(self.SELECTOR).matches:
+            if node.tag == 'base':
+                if base is None:
+                    base = node.attributes.get('href')
+                continue
+            links.extend(_link_values(node.tag, node.attributes))
+        return _apply_base(links, base)
+
+
+def _ignore_case(words: tuple[bytes, ...]) -> bytes:
+    """Builds a case-insensitive alternation of words ([aA]|[lL][iI]...),
+    faster than re.I on pages dense of tags"""
+    return b'|'.join(b''.join(b'[%c%c]' % (c, c - 32) if 97 <= c <= 122 else bytes([c])
+                              for c in word) for word in words)
+
+
+class ScanExtractor(LinkExtractor):
+    """ScanExtractor retrieves the same links of DomExtractor scanning
+    the raw markup with regular expressions, without decoding the page
+    and without building a tree: the comments and the raw text elements
+    (scripts, styles, textarea, title) are skipped, only the start tags
+    of LINK_ATTRIBUTES and <base> are tokenized and only the attributes
+    holding a link are decoded. It doesn't repair broken markup the way
+    a browser does (such as an unclosed quote) and the values are
+    decoded as utf-8.
+    """
+    name = 'scan'
+    TOKEN_REGEX = re.compile(
+        # fast path: an anchor whose first attribute is a quoted href
+        # without entities, the group keeps the quote to tell href=""
+        rb'<(?:(?:' + _ignore_case((b'a', b'area')) + rb')\s+' + _ignore_case((b'href',)) +
+        rb'\s*=\s*("[^"&]*)"(?:[^>"\']+|"[^"]*"|\'[^\']*\')*>'
+        rb'|(' + _ignore_case((b'a', b'area', b'link', b'iframe', b'img', b'source', b'base')) +
+        rb')(\s(?:[^>"\']+|"[^"]*"|\'[^\']*\')*)?>|!--.*?(?:-->|$)|(' +
+        _ignore_case((b'script', b'style', b'textarea', b'title')) +
+        # a raw text element ends at its end tag, without backtracking
+        rb')\b[^<]*(?:<(?!/(?i:\4))[^<]*)*)', re.S)
+    ATTRIBUTE_REGEX = re.compile(rb'''([^\s=/>"']+)(\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]*)))?''')
+    ATTRIBUTES = frozenset({b'href', b'src', b'srcset', b'rel'})
+
+    def extract(self, html: str | bytes) -> list[str]:
+        if isinstance(html, str):
+            html = html.encode('utf-8', errors='surrogatepass')
+        links: list[str] = []
+        base: str | None = None
+        for href, tag, raw, _ in self.TOKEN_REGEX.findall(html):
+            if href:
+                links.append(href[1:].decode('utf-8', errors='replace').strip())
+                continue
+            if not raw:
+                continue
+            tag = tag.decode('ascii').lower()
+            attributes = self._attributes(raw)
+            if tag == 'base':
+                if base is None:
+                    base = attributes.get('href')
+                continue
+            links.extend(_link_values(tag, attributes))
+        return _apply_base(links, base)
+
+    def _attributes(self, raw: bytes) -> dict[str, str | None]:
+        """Decodes the attributes holding a link, the first occurrence
+        wins as in the DOM"""
+        attributes: dict[str, str | None] = {}
+        for name, assigned, double, single, bare in self.ATTRIBUTE_REGEX.findall(raw):
+            name = name.lower()
+            if name not in self.ATTRIBUTES:
+                continue
+            name = name.decode('ascii')
+            if name in attributes:
+                continue
+            if not assigned:
+                # an attribute without value, such as <a href>
+                attributes[name] = None
+                continue
+            value = (double or single or bare).decode('utf-8', errors='replace')
+            attributes[name] = unescape(value) if '&' in value else value
+        return attributes
+
+
+EXTRACTORS: dict[str, type[LinkExtractor]] = {engine.name: engine for engine in
+                                              (AnchorExtractor, DomExtractor, ScanExtractor)}
+
+
+def get_extractor(name: str) -> LinkExtractor:
+    """Creates the engine registered with the name
+
+    Raises:
+        ValueError if there's no engine with the name
+    """
+    if name not in EXTRACTORS:
+        raise ValueError(f'Unknown link extractor {name}, expected one of {list(EXTRACTORS)}')
+    return EXTRACTORS[name]()
@@ -0,0 +1,58 @@
+from network.httpmanager import HttpResult
+from parsing.extractors import AnchorExtractor, LinkExtractor
+
+
+def extract_links(html: str | bytes) -> list[str]:
+    """Parses an html page retrieving the links available in the
+    attribute href of the anchors.
+
+    Args:
+        html: html page as text or as raw bytes. Bytes are given
+              directly to Lexbor without decoding them.
+
+    Returns:
+        The list of href found in the page
+    """
+    return AnchorExtractor().extract(html)
+
+
+def extract_links_batch(pages: list[bytes],
+                        extractor: LinkExtractor | None = None) -> list[list[str]]:
+    """Parses a batch of html pages. It's the unit of work sent to the
+    worker processes, so only bytes, the engine and lists of str cross
+    the process boundary.
+    """
+    return (extractor if extractor else AnchorExtractor()).extract_batch(pages)
+
+
+class Parser:
+    """Parser extracts the links from the pages downloaded by
+    HttpManager. This implementation parses the page directly
+    inside the event loop, it's the default one used by TaskManager.
+
+    Attributes:
+        extractor: engine retrieving the links (default AnchorExtractor)
+    """
+    def __init__(self, extractor: LinkExtractor | None = None):
+        self.extractor: LinkExtractor = extractor if extractor else AnchorExtractor()
+
+    def get_links(self, htmlPage: HttpResult) -> list[str]:
+        """Parses the page synchronously
+
+        Args:
+            htmlPage: HttpResult provided by HttpManager
+
+        Returns:
+            The list of links found in the web page
+        """
+        return self.extractor.extract(htmlPage.htmlPage)
+
+    async def parse(self, htmlPage: HttpResult) -> list[str]:
+        """Coroutine to parse the page, the subclasses can move
+        the parsing outside the event loop.
+        """
+        return self.get_links(htmlPage)
+
+    async def close(self) -> None:
+        """Release the resources used by the parser"""
+        pass
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from network.httpmanager import HttpResult
+from parsing.parser import Parser, extract_links_batch
+from parsing.extractors import LinkExtractor
+
+logger = logging.getLogger('taskmanager')
+
+
+class PoolParser(Parser):
+    """PoolParser runs the html parsing on a pool of worker processes,
+    so big pages don't block the event loop and the parsing scales
+    with the amount of cores.
+    The pages are collected in batches in order to amortize the cost
+    of the inter-process communication: a batch is sent to the pool
+    when it's full or when batch_delay seconds are elapsed since its
+    first page. Pages are sent as bytes and the workers retrieve only
+    the list of href.
+    To keep all the workers busy TaskManager should run at least
+    workers * batch_size consumers.
+
+    The workers are started with the 'forkserver' method where
+    available, since forking the event loop process (which runs
+    other threads) may deadlock.
+
+    Attributes:
+        workers: amount of worker processes (default: cpu count)
+        batch_size: maximum amount of pages sent in one batch
+        batch_delay: maximum time in seconds a page waits for its batch
+        start_method: multiprocessing start method of the workers
+        extractor: engine retrieving the links, sent with each batch
+    """
+    def __init__(self, workers: int | None = None,
+                 batch_size: int = 4,
+                 batch_delay: float = 0.002,
+                 start_method: str | None = None,
+                 extractor: LinkExtractor | None = None):
+        super().__init__(extractor)
+        self.workers = workers if workers else os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        self.start_method = start_method
+        self._pool: ProcessPoolExecutor | None = None
+        self._batch: list[tuple[bytes, asyncio.Future]] = []
+        self._flushHandle: asyncio.TimerHandle | None = None
+        self._running: set[asyncio.Task] = set()
+
+    async def parse(self, htmlPage: HttpResult) -> list[str]:
+        """Coroutine to parse the page on the process pool
+
+        Args:
+            htmlPage: HttpResult provided by HttpManager
+
+        Returns:
+            The list of links found in the web page
+        """
+        payload = htmlPage.htmlPage
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch.append((payload, future))
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+        elif self._flushHandle is None:
+            self._flushHandle = loop.call_later(self.batch_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flushHandle:
+            self._flushHandle.cancel()
+            self._flushHandle = None
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        task = asyncio.create_task(self._run_batch(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch: list[tuple[bytes, asyncio.Future]]) -> None:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method))
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._pool, extract_links_batch,
+                                                 [payload for payload, _ in batch],
+                                                 self.extractor)
+        except Exception as e:
+            logger.error(f'[PoolParser] - Error parsing a batch of {len(batch)} pages: {e}')
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), links in zip(batch, results):
+            if not future.done():
+                future.set_result(links)
+
+    async def close(self) -> None:
+        """Shutdown the worker processes"""
+        if self._flushHandle:
+            self._flushHandle.cancel()
+            self._flushHandle = None
+        for _, future in self._batch:
+            future.cancel()
+        self._batch = []
+        for task in self._running:
+            task.cancel()
+        if self._pool:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
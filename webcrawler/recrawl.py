@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import sqlite3
+import time
+from sitemaps import CHANGEFREQ_SECONDS
+
+logger = logging.getLogger('taskmanager')
+
+
+class PageHistory:
+    """
+    PageHistory describes what is known about a page from the
+    previous crawls
+
+    Attributes:
+        fetched_at (float | None): time of the last download
+        digest (bytes | None): hash of the content downloaded
+        interval (float): estimated seconds between two changes
+        lastmod (float | None): last change declared by a sitemap or a feed
+        changefreq (str | None): change frequency declared by a sitemap
+    """
+    def __init__(self, fetched_at: float | None = None, digest: bytes | None = None,
+                 interval: float = 86400, lastmod: float | None = None,
+                 changefreq: str | None = None):
+        self.fetched_at = fetched_at
+        self.digest = digest
+        self.interval = interval
+        self.lastmod = lastmod
+        self.changefreq = changefreq
+
+
+class CrawlHistory:
+    """CrawlHistory remembers when each page has been downloaded and
+    if it had changed, so a recrawl downloads again only the pages
+    likely to have changed since the previous crawl. A page is due:
+    - if it has never been downloaded
+    - if its lastmod (sitemap, feed) is newer than the last download,
+      a lastmod older than the last download means it's not changed
+    - otherwise, if the time elapsed since the last download exceeds
+      the changefreq declared by the sitemap or, without it, the
+      interval estimated from the history: the interval doubles each
+      time the page is found unchanged and halves each time it has
+      changed, between min_interval and max_interval.
+    A page is always due after max_interval, whatever its lastmod or
+    its changefreq, and forget_undeclared() drops the lastmod of the
+    pages the sitemaps no longer declare.
+    The history is kept in memory and saved in a SQLite file by save().
+
+    Attributes:
+        path: SQLite file of the history
+        min_interval: minimum seconds between two downloads of a page
+        max_interval: maximum seconds between two downloads of a page
+        due: pages found due
+        not_due: pages found not due
+    """
+    def __init__(self, path: str, min_interval: float = 3600,
+                 max_interval: float = 30 * 86400):
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.due: int = 0
+        self.not_due: int = 0
+        self._pages: dict[str, PageHistory] = {}
+        self._dirty: set[str] = set()
+        # pages with a lastmod declared during this crawl
+        self._declared: set[str] = set()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS pages ('
+                         'url TEXT PRIMARY KEY, fetched_at REAL, digest BLOB, '
+                         'interval REAL, lastmod REAL, changefreq TEXT)')
+        for url, *row in self._db.execute('SELECT url, fetched_at, digest, interval, '
+                                          'lastmod, changefreq FROM pages'):
+            self._pages[url] = PageHistory(*row)
+
+    def get(self, url: str) -> PageHistory | None:
+        return self._pages.get(url)
+
+    def observe(self, url: str, lastmod: float | None = None,
+                changefreq: str | None = None) -> None:
+        """Records the lastmod and the changefreq of a page found in a
+        sitemap or in a feed"""
+        if lastmod is None and changefreq is None:
+            return
+        page = self._pages.setdefault(url, PageHistory())
+        if lastmod is not None:
+            page.lastmod = lastmod
+            self._declared.add(url)
+        if changefreq is not None:
+            page.changefreq = changefreq
+        self._dirty.add(url)
+
+    def is_due(self, url: str, now: float | None = None) -> bool:
+        """Checks if the page is likely to have changed since its last download"""
+        due = self._is_due(self._pages.get(url), now if now is not None else time.time())
+        if due:
+            self.due += 1
+        else:
+            self.not_due += 1
+        return due
+
+    def _is_due(self, page: PageHistory | None, now: float) -> bool:
+        if page is None or page.fetched_at is None:
+            return True
+        if page.lastmod is not None and page.lastmod > page.fetched_at:
+            return True
+        if page.lastmod is not None:
+            interval = self.max_interval
+        elif page.changefreq is not None:
+            interval = min(self.max_interval, CHANGEFREQ_SECONDS[page.changefreq])
+        else:
+            interval = page.interval
+        return now - page.fetched_at >= interval
+
+    def forget_undeclared(self) -> None:
+        """Drops the lastmod of the pages whose lastmod has not been
+        declared again during this crawl, to be called once all the
+        sitemaps have been read: a page removed from the sitemaps, or
+        listed without a lastmod, falls back to its interval"""
+        for url, page in self._pages.items():
+            if page.lastmod is not None and url not in self._declared:
+                page.lastmod = None
+                self._dirty.add(url)
+
+    def record(self, url: str, content: str | bytes, now: float | None = None) -> bool:
+        """Records the download of a page
+
+        Returns:
+            True if the content has changed since the previous download
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8', errors='surrogatepass')
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        page = self._pages.setdefault(url, PageHistory())
+        changed = page.digest != digest
+        if page.digest is not None:
+            page.interval = max(self.min_interval, page.interval / 2) if changed else \
+                min(self.max_interval, page.interval * 2)
+        page.digest = digest
+        page.fetched_at = now if now is not None else time.time()
+        self._dirty.add(url)
+        return changed
+
+    def save(self) -> None:
+        """Writes the pages changed since the last save (blocking)"""
+        if not self._dirty:
+            return
+        rows = []
+        for url in self._dirty:
+            page = self._pages[url]
+            rows.append((url, page.fetched_at, page.digest, page.interval,
+                         page.lastmod, page.changefreq))
+        self._dirty.clear()
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)', rows)
+        logger.info(f'[CrawlHistory] {len(rows)} pages saved in {self.path}')
+
+    def stats(self) -> dict[str, int]:
+        return {'pages': len(self._pages), 'due': self.due, 'not_due': self.not_due}
+
+    def close(self) -> None:
+        self._db.close()
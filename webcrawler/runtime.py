@@ -0,0 +1,49 @@
+"""Event loops the crawler can run on. The stock asyncio loop is the
+default, uvloop is optional: when it's requested but not installed the
+crawl runs on the stock loop. asyncio itself is imported only to run
+a loop, so the command line starts without it.
+"""
+import logging
+from collections.abc import Callable, Coroutine
+
+logger = logging.getLogger('webcrawler')
+
+LOOPS = ('asyncio', 'uvloop')
+
+
+def loop_factory(loop: str = 'asyncio') -> Callable[[], 'asyncio.AbstractEventLoop'] | None:
+    """Retrieves the factory of the event loop named loop
+
+    Returns:
+        The factory of the loop, None for the stock asyncio loop
+
+    Raises:
+        ValueError if loop is not one of LOOPS
+    """
+    if loop not in LOOPS:
+        raise ValueError(f'Unknown event loop {loop}, expected one of {list(LOOPS)}')
+    if loop == 'uvloop':
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning('uvloop is not installed, running on the asyncio loop')
+            return None
+        return uvloop.new_event_loop
+    return None
+
+
+def run(main: Coroutine, loop: str = 'asyncio'):
+    """Runs the coroutine main until it completes on a new event loop
+    (see asyncio.run)
+
+    Returns:
+        The result of main
+    """
+    import asyncio
+
+    try:
+        factory = loop_factory(loop)
+    except ValueError:
+        main.close()
+        raise
+    return asyncio.run(main, loop_factory=factory)
@@ -0,0 +1,220 @@
+import math
+import os
+import sqlite3
+import threading
+from hashlib import blake2b
+
+# bound of the host parameters of a SQLite statement
+MAX_PARAMS = 500
+
+
+class SeenSet:
+    """SeenSet keeps track of the urls already discovered by the crawler,
+    both the ones waiting to be downloaded and the visited ones, so
+    each url is enqueued only once.
+    The subclasses provide different trade-offs between memory and
+    exactness.
+
+    Attributes:
+        blocking: the set does I/O, TaskManager updates it in a thread
+    """
+    blocking: bool = False
+
+    def add(self, url: str) -> bool:
+        """Adds the url to the set
+
+        Returns:
+            True if the url has never been seen before
+        """
+        raise NotImplementedError
+
+    def add_many(self, urls: list[str]) -> list[str]:
+        """Adds a batch of urls to the set
+
+        Returns:
+            The urls never seen before, in order
+        """
+        return [url for url in urls if self.add(url)]
+
+    def __contains__(self, url: str) -> bool:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> dict[str, int | float]:
+        """Retrieves the statistics about the set"""
+        return {'urls': len(self)}
+
+    def close(self) -> None:
+        """Release the resources used by the set"""
+        pass
+
+
+class MemorySeenSet(SeenSet):
+    """Exact SeenSet keeping the urls in memory, its size grows
+    with the amount and the length of the urls.
+    """
+    def __init__(self):
+        self._urls: set[str] = set()
+
+    def add(self, url: str) -> bool:
+        if url in self._urls:
+            return False
+        self._urls.add(url)
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._urls
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+
+class BloomSeenSet(SeenSet):
+    """SeenSet based on a Bloom filter with a fixed size computed from
+    the expected amount of urls and from the accepted false positive
+    rate: a false positive is a new url considered already seen, so
+    it won't be downloaded. The urls are never stored.
+    For instance 10M urls with a false positive rate of 1% require
+    about 12 MB.
+
+    Attributes:
+        capacity: expected amount of urls
+        error_rate: false positive rate accepted at full capacity
+    """
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.01):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError('Invalid bloom filter parameters', capacity, error_rate)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._numBits: int = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self._numHashes: int = max(1, round(self._numBits / capacity * math.log(2)))
+        self._bits: bytearray = bytearray((self._numBits + 7) // 8)
+        self._bitsSet: int = 0
+        self._count: int = 0
+
+    def _positions(self, url: str) -> list[int]:
+        digest = blake2b(url.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self._numBits for i in range(self._numHashes)]
+
+    def add(self, url: str) -> bool:
+        isNew = False
+        bits = self._bits
+        for pos in self._positions(url):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                self._bitsSet += 1
+                isNew = True
+        if isNew:
+            self._count += 1
+        return isNew
+
+    def __contains__(self, url: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(url))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def fill_ratio(self) -> float:
+        return self._bitsSet / self._numBits
+
+    def false_positive_rate(self) -> float:
+        """Retrieves the current probability that a new url is
+        considered already seen"""
+        return self.fill_ratio() ** self._numHashes
+
+    def stats(self) -> dict[str, int | float]:
+        return {'urls': self._count,
+                'bits': self._numBits,
+                'hashes': self._numHashes,
+                'memory_bytes': len(self._bits),
+                'fill_ratio': self.fill_ratio(),
+                'false_positive_rate': self.false_positive_rate()}
+
+
+class DiskSeenSet(SeenSet):
+    """SeenSet storing a 64-bit hash of each url in a SQLite file, so
+    the memory doesn't grow with the amount of urls. Two different urls
+    with the same hash are very unlikely (~N^2 / 2^65 collisions).
+    The inserts are committed every commit_every new urls. The set is
+    blocking: add_many() checks and inserts a batch with two
+    statements and it can be called from any thread.
+
+    Attributes:
+        path: SQLite file where the hashes are stored
+        commit_every: amount of new urls between two commits
+    """
+    blocking = True
+
+    def __init__(self, path: str, commit_every: int = 1000):
+        self.path = path
+        self.commit_every = commit_every
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=OFF')
+        self._db.execute('CREATE TABLE IF NOT EXISTS seen (hash INTEGER PRIMARY KEY) WITHOUT ROWID')
+        self._count: int = self._db.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+        self._uncommitted: int = 0
+
+    @staticmethod
+    def _hash(url: str) -> int:
+        return int.from_bytes(blake2b(url.encode('utf-8'), digest_size=8).digest(),
+                              'little', signed=True)
+
+    def add(self, url: str) -> bool:
+        with self._lock:
+            cursor = self._db.execute('INSERT OR IGNORE INTO seen VALUES (?)',
+                                      (self._hash(url),))
+            if cursor.rowcount == 0:
+                return False
+            self._inserted(1)
+        return True
+
+    def add_many(self, urls: list[str]) -> list[str]:
+        # first url of each hash, the next ones are already seen
+        hashes: dict[int, str] = {}
+        for url in urls:
+            hashes.setdefault(self._hash(url), url)
+        with self._lock:
+            keys = list(hashes)
+            for start in range(0, len(keys), MAX_PARAMS):
+                chunk = keys[start:start + MAX_PARAMS]
+                rows = self._db.execute('SELECT hash FROM seen WHERE hash IN '
+                                        f'({",".join("?" * len(chunk))})', chunk)
+                for (seen,) in rows:
+                    del hashes[seen]
+            if hashes:
+                self._db.executemany('INSERT OR IGNORE INTO seen VALUES (?)',
+                                     [(key,) for key in hashes])
+                self._inserted(len(hashes))
+        return list(hashes.values())
+
+    def _inserted(self, count: int) -> None:
+        self._count += count
+        self._uncommitted += count
+        if self._uncommitted >= self.commit_every:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM seen WHERE hash = ?',
+                                    (self._hash(url),)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def stats(self) -> dict[str, int | float]:
+        return {'urls': self._count,
+                'disk_bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.commit()
+            self._db.close()
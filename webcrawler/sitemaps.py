@@ -0,0 +1,233 @@
+import logging
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable
+from urllib.parse import urlsplit
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+logger = logging.getLogger('taskmanager')
+
+# elements describing a page (sitemap, RSS, Atom) or a child sitemap
+CONTAINERS = frozenset({'url', 'item', 'entry', 'sitemap'})
+DATE_TAGS = frozenset({'lastmod', 'updated', 'pubDate', 'published', 'modified', 'date'})
+# seconds between two changes of a page for each changefreq
+CHANGEFREQ_SECONDS = {'always': 0, 'hourly': 3600, 'daily': 86400, 'weekly': 7 * 86400,
+                      'monthly': 30 * 86400, 'yearly': 365 * 86400, 'never': float('inf')}
+
+
+def parse_date(value: str | None) -> float | None:
+    """Retrieves the timestamp of a W3C datetime (sitemaps, Atom) or
+    of an RFC 822 date (RSS), None if it's not valid"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        date = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+class SitemapEntry:
+    """
+    SitemapEntry is a page (or a child sitemap of a sitemap index)
+    found in a sitemap or in a feed
+
+    Attributes:
+        url (str): url of the page or of the child sitemap
+        lastmod (float | None): timestamp of the last change of the page
+        changefreq (str | None): how often the page changes ('daily', ...)
+        priority (float | None): priority of the page inside the website
+        sitemap (bool): True for a child sitemap
+    """
+    def __init__(self, url: str, lastmod: float | None = None, changefreq: str | None = None,
+                 priority: float | None = None, sitemap: bool = False):
+        self.url = url
+        self.lastmod = lastmod
+        self.changefreq = changefreq
+        self.priority = priority
+        self.sitemap = sitemap
+
+    def __eq__(self, value):
+        return isinstance(value, SitemapEntry) and \
+            (self.url, self.lastmod, self.changefreq, self.priority, self.sitemap) == \
+            (value.url, value.lastmod, value.changefreq, value.priority, value.sitemap)
+
+    def __repr__(self):
+        return f'SitemapEntry({self.url!r}, lastmod={self.lastmod}, changefreq={self.changefreq})'
+
+
+class SitemapParser:
+    """SitemapParser parses a sitemap, a sitemap index, an RSS or an
+    Atom feed incrementally: the document is fed in chunks and each
+    entry is retrieved as soon as it's completed, then its elements
+    are discarded, so the memory doesn't depend on the size of the
+    document.
+
+    Attributes:
+        kind: name of the root element ('urlset', 'sitemapindex',
+              'rss', 'feed'), None before the first chunk
+    """
+    def __init__(self):
+        self.kind: str | None = None
+        self._parser = XMLPullParser(events=('start', 'end'))
+        self._stack: list = []
+        self._current: dict | None = None
+
+    def feed(self, data: bytes) -> list[SitemapEntry]:
+        """Parses a chunk of the document
+
+        Returns:
+            The entries completed by the chunk
+
+        Raises:
+            xml.etree.ElementTree.ParseError if the document is not valid
+        """
+        self._parser.feed(data)
+        return self._read_events()
+
+    def close(self) -> list[SitemapEntry]:
+        self._parser.close()
+        return self._read_events()
+
+    def _read_events(self) -> list[SitemapEntry]:
+        entries: list[SitemapEntry] = []
+        for event, elem in self._parser.read_events():
+            tag = elem.tag.rpartition('}')[2]
+            if event == 'start':
+                if self.kind is None:
+                    self.kind = tag
+                if tag in CONTAINERS:
+                    self._current = {}
+                self._stack.append(elem)
+                continue
+            self._stack.pop()
+            parent = self._stack[-1].tag.rpartition('}')[2] if self._stack else None
+            current = self._current
+            if tag in CONTAINERS and current is not None:
+                if current.get('loc'):
+                    entries.append(SitemapEntry(current['loc'], current.get('lastmod'),
+                                                current.get('changefreq'),
+                                                current.get('priority'), tag == 'sitemap'))
+                self._current = None
+                elem.clear()
+                if self._stack:
+                    self._stack[-1].remove(elem)
+            elif current is not None and parent in CONTAINERS:
+                self._read_field(tag, elem, current)
+        return entries
+
+    @staticmethod
+    def _read_field(tag: str, elem, current: dict) -> None:
+        text = (elem.text or '').strip()
+        if tag == 'loc' and text:
+            current['loc'] = text
+        elif tag == 'link':
+            # RSS: <link>url</link>, Atom: <link rel="alternate" href="url"/>
+            href = elem.get('href')
+            if href and elem.get('rel', 'alternate') == 'alternate':
+                current['loc'] = href.strip()
+            elif text:
+                current.setdefault('loc', text)
+        elif tag in DATE_TAGS:
+            date = parse_date(text)
+            if date is not None and date > current.get('lastmod', 0):
+                current['lastmod'] = date
+        elif tag == 'changefreq' and text.lower() in CHANGEFREQ_SECONDS:
+            current['changefreq'] = text.lower()
+        elif tag == 'priority':
+            try:
+                current['priority'] = float(text)
+            except ValueError:
+                pass
+
+
+class SitemapSeeder:
+    """SitemapSeeder retrieves the pages listed in the sitemaps and in
+    the feeds of a website, so the frontier is filled in bulk instead
+    of discovering the pages one link at a time.
+    The sitemaps are the ones declared in robots.txt (Sitemap lines)
+    or, without them, /sitemap.xml, plus the sitemaps and feeds given
+    explicitly. The sitemap indexes are followed up to max_sitemaps
+    documents. Each document is downloaded and parsed in chunks, the
+    gzip-compressed sitemaps included (see HttpManager.stream_resource).
+
+    Attributes:
+        sitemaps: urls of sitemaps, sitemap indexes, RSS or Atom feeds
+        discover: look for the sitemaps in robots.txt and at /sitemap.xml
+        max_sitemaps: maximum amount of documents downloaded
+        max_urls: maximum amount of pages retrieved
+        fetched: documents downloaded
+        found: pages retrieved
+    """
+    def __init__(self, sitemaps: list[str] | tuple = (), discover: bool = True,
+                 max_sitemaps: int = 100, max_urls: int = 1_000_000):
+        self.sitemaps = list(sitemaps)
+        self.discover = discover
+        self.max_sitemaps = max_sitemaps
+        self.max_urls = max_urls
+        self.fetched: int = 0
+        self.found: int = 0
+
+    def start_urls(self, baseUrl: str, robotsSitemaps: list[str]) -> list[str]:
+        """Retrieves the documents to download first"""
+        urls = list(self.sitemaps)
+        if self.discover:
+            if robotsSitemaps:
+                urls.extend(robotsSitemaps)
+            else:
+                parts = urlsplit(baseUrl)
+                urls.append(f'{parts.scheme}://{parts.netloc}/sitemap.xml')
+        return list(dict.fromkeys(urls))
+
+    async def entries(self, fetcher: Callable[[str], AsyncIterator[bytes]], baseUrl: str,
+                      robotsSitemaps: list[str] | None = None) -> AsyncIterator[SitemapEntry]:
+        """Downloads the sitemaps and the feeds, following the indexes
+
+        Args:
+            fetcher: function retrieving the chunks of a document
+            baseUrl: url of the website
+            robotsSitemaps: sitemaps declared in robots.txt
+
+        Returns:
+            An async iterator of the pages found
+        """
+        pending = self.start_urls(baseUrl, robotsSitemaps or [])
+        visited = set(pending)
+        while pending and self.fetched < self.max_sitemaps and self.found < self.max_urls:
+            url = pending.pop(0)
+            self.fetched += 1
+            t1 = time.perf_counter()
+            parser = SitemapParser()
+            found = self.found
+            try:
+                async for chunk in fetcher(url):
+                    for entry in self._select(parser.feed(chunk), pending, visited):
+                        yield entry
+                if parser.kind is not None:
+                    for entry in self._select(parser.close(), pending, visited):
+                        yield entry
+            except ParseError as e:
+                logger.warning(f'[Sitemaps] - Invalid document {url}: {e}')
+            logger.info(f'[Sitemaps] - {url} ({parser.kind}): {self.found - found} pages '
+                        f'in {time.perf_counter() - t1:.2f} s')
+
+    def _select(self, entries: list[SitemapEntry], pending: list[str],
+                visited: set[str]) -> list[SitemapEntry]:
+        """Queues the child sitemaps, retrieves the pages within max_urls"""
+        pages: list[SitemapEntry] = []
+        for entry in entries:
+            if entry.sitemap:
+                if entry.url not in visited:
+                    visited.add(entry.url)
+                    pending.append(entry.url)
+            elif self.found < self.max_urls:
+                self.found += 1
+                pages.append(entry)
+        return pages
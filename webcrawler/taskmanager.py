@@ -1,10 +1,24 @@
-import utils
 import asyncio
 import logging
+import time
 from pydantic import HttpUrl, ValidationError
-from models import Link, Page
+from autoscaler import Autoscaler
+from canonical import UrlCanonicalizer
+from checkpoint import Checkpoint, CheckpointState
+from dedup import ContentDeduplicator
+from distributed import ShardRouter
+from frontier import Frontier
+from pagebuffer import PageBuffer
+from metrics import COUNT_BUCKETS, MetricsRegistry
+from models import Link, LinkGraph, Page, write_graph
 from network.httpmanager import HttpManager, HttpResult
-from selectolax.lexbor import LexborHTMLParser
+from output import ResultSink
+from parsing import Parser
+from recrawl import CrawlHistory
+from seenset import MemorySeenSet, SeenSet
+from sitemaps import SitemapSeeder
+from tracker import WorkTracker
+from urlfilter import UrlFilter
 
 logger = logging.getLogger('taskmanager')
 
@@ -18,31 +32,174 @@ class TaskManager():
     downloading the html pages and 1 task for parsing the
     html pages.
     max_pages_in_mem is used to limit the amount of pages
-    in memory (default = 1 page at time).
+    in memory (default = 1 page at time); a PageBuffer provided
+    limits the bytes of the pages waiting to be parsed instead and
+    can spill them on disk, so the downloads run ahead of the parsing
+    with a bounded memory.
+    The pages are downloaded by the HttpManager provided (an
+    HttpManager with stream=True keeps the pages as bytes, which
+    are parsed without decoding them) and they are parsed by the
+    Parser provided, by default inside the event loop; a PoolParser
+    moves the parsing on a pool of worker processes.
+    The urls already queued or visited are tracked by the SeenSet
+    provided, by default an exact set kept in memory; a BloomSeenSet
+    or a DiskSeenSet keep the memory bounded for big crawls.
+    The urls to visit are scheduled by the Frontier provided, which
+    applies per-host rate limits, concurrency limits and robots.txt
+    rules; by default only robots.txt and 4 concurrent requests per
+    host are enforced.
+    With a Checkpoint the state of the crawl is saved periodically
+    and, with resume=True, the crawl restarts from the last checkpoint
+    without downloading again the pages already completed.
+    Each stage of the crawl (time in the frontier and in the pages
+    queue, fetch latency, parse time, links per page, queue depths) is
+    measured in the MetricsRegistry provided; with metrics_interval > 0
+    a summary of the metrics is logged every metrics_interval seconds.
+    With an Autoscaler the amount of producers and consumers is adapted
+    during the crawl, starting from max_producers and max_consumers;
+    the tasks removed are retired only while they are idle, so no url
+    or page is lost.
+    With a ShardRouter the TaskManager crawls a single shard of a
+    sharded crawl (see distributed.Coordinator): the links owned by
+    other shards are routed to them and the crawl is completed only
+    when all the shards are idle.
+    With an output ResultSink each page is written with its links as
+    soon as it has been parsed; with keep_graph=False the link graph
+    is not kept in memory at all, so the memory stays flat and the
+    results are available only through the sink.
+    With graph_out the link graph is written at the end of the crawl
+    in the compact binary format read by models.GraphFile.
+    With a ContentDeduplicator each page is checked before parsing:
+    a page with the same content (or nearly the same) as a page
+    already parsed is not parsed, its links are not enqueued again and
+    it's recorded as alias of the canonical page (see get_aliases),
+    in the checkpoint and in the output too.
+    With a UrlFilter the links of the website are rewritten (tracking
+    parameters) and checked before being enqueued: the links rejected
+    (not html resources, crawler traps) are kept in the link graph but
+    never downloaded.
+    With a SitemapSeeder the pages listed in the sitemaps and in the
+    feeds of the website are enqueued while the crawl is running (not
+    in a shard of a sharded crawl). With a CrawlHistory a recrawl
+    downloads only the pages likely to have changed since the previous
+    crawl, the others are read from the cache of the HttpManager
+    without any request; the history is saved at the end of the crawl.
     Attributes:
         max_producers: maximum amount of tasks for downloading html pages
         max_consumers: maximum amount of tasks for parsing html pages
     """
     def __init__(self, base_url: HttpUrl, 
-                 #httpmgr: HttpManager,
-                 #parser: Parser,
+                 httpmgr: HttpManager | None = None,
+                 parser: Parser | None = None,
+                 seen_set: SeenSet | None = None,
+                 frontier: Frontier | None = None,
+                 page_buffer: PageBuffer | None = None,
+                 checkpoint: Checkpoint | None = None,
+                 resume: bool = False,
+                 metrics: MetricsRegistry | None = None,
+                 metrics_interval: float = 0,
+                 autoscaler: Autoscaler | None = None,
+                 router: ShardRouter | None = None,
+                 output: ResultSink | None = None,
+                 keep_graph: bool = True,
+                 graph_out: str | None = None,
+                 dedup: ContentDeduplicator | None = None,
+                 url_filter: UrlFilter | None = None,
+                 sitemaps: SitemapSeeder | None = None,
+                 history: CrawlHistory | None = None,
                  debug: bool = False,
                  max_producers: int = 1,
                  max_consumers: int = 1,
                  max_pages_in_mem: int = 1):
         self._baseurl: HttpUrl = base_url
+        self._canonicalizer: UrlCanonicalizer = UrlCanonicalizer(str(base_url))
         self._debug : bool = debug
-        self._pagesVisited: dict[str, Page] = {}
-        self._producers: set[asyncio.Task] = set()
-        self._consumers: set[asyncio.Task] = set()
-        self._pages: asyncio.Queue[HttpResult] = asyncio.Queue(max_pages_in_mem)
-        self._visitedLinks: set[str] = set()
-        self._linksToVisit: asyncio.Queue[HttpUrl]  = asyncio.Queue()
-        self._visitedLock: asyncio.Lock = asyncio.Lock()
+        self._graph: LinkGraph = LinkGraph()
+        self._keepGraph: bool = keep_graph
+        self._output: ResultSink | None = output
+        self._graphOut: str | None = graph_out
+        self._numParsed: int = 0
+        self._dedup: ContentDeduplicator | None = dedup
+        self._urlFilter: UrlFilter | None = url_filter
+        self._sitemaps: SitemapSeeder | None = sitemaps
+        self._sitemapsTask: asyncio.Task | None = None
+        self._history: CrawlHistory | None = history
+        # links found in each page, to measure the links saved by the duplicates
+        self._linkCounts: dict[str, int] = {}
+        self._pagesCache: dict[str, Page] = {}
+        self._pagesCacheVersion: int = -1
+        self._producers: list[asyncio.Task] = []
+        self._consumers: list[asyncio.Task] = []
+        # tasks waiting for a url or a page, they can be cancelled safely
+        self._idle: set[asyncio.Task] = set()
+        self._retireProducers: int = 0
+        self._retireConsumers: int = 0
+        self._numSpawned: int = 0
+        self._failure: asyncio.Event = asyncio.Event()
+        self._failedTask: asyncio.Task | None = None
+        # pages with the time they have been queued
+        self._pages: PageBuffer = page_buffer if page_buffer else PageBuffer(max_pages_in_mem)
+        self._seen: SeenSet = seen_set if seen_set is not None else MemorySeenSet()
+        self._numFetched: int = 0
         self.max_producers = max_producers
         self.max_consumers = max_consumers
-        self._httpmanager = HttpManager(self._baseurl, debug=self._debug)
-        self._stop: asyncio.Event = asyncio.Event()
+        self._httpmanager = httpmgr if httpmgr else \
+            HttpManager(self._baseurl, debug=self._debug)
+        self._metrics: MetricsRegistry = metrics if metrics is not None else MetricsRegistry()
+        self._metricsInterval: float = metrics_interval
+        self._metricsTask: asyncio.Task | None = None
+        if self._httpmanager.metrics is None:
+            self._httpmanager.use_metrics(self._metrics)
+        # the transient errors are retried through the frontier, a
+        # producer never sleeps on a back-off
+        self._httpmanager.retry_in_place = False
+        # retries of the urls failed with a transient error
+        self._attempts: dict[str, int] = {}
+        self._frontier: Frontier = frontier if frontier else \
+            Frontier(robots_fetcher=self._httpmanager.fetch_robots, metrics=self._metrics)
+        if self._frontier.metrics is None:
+            self._frontier.use_metrics(self._metrics)
+        if self._frontier.on_discard is None:
+            # the urls of the hosts which keep failing are completed
+            self._frontier.on_discard = self._discard
+        if self._pages.metrics is None:
+            self._pages.use_metrics(self._metrics)
+        if self._urlFilter and self._urlFilter.metrics is None:
+            self._urlFilter.use_metrics(self._metrics)
+        self._tracker: WorkTracker = WorkTracker()
+        self._parser: Parser = parser if parser else Parser()
+        self._checkpoint: Checkpoint | None = checkpoint
+        self._checkpointTask: asyncio.Task | None = None
+        self._resume: bool = resume
+        self._autoscaler: Autoscaler | None = autoscaler
+        self._autoscalerTask: asyncio.Task | None = None
+        self._router: ShardRouter | None = router
+        self._routerTask: asyncio.Task | None = None
+        self._pagesWait = self._metrics.histogram('pages_wait_seconds',
+                                                  'Time spent by a page waiting to be parsed')
+        self._parseTime = self._metrics.histogram('parse_seconds', 'Time to parse a page')
+        self._linksPerPage = self._metrics.histogram('links_per_page', 'Links found in a page',
+                                                     COUNT_BUCKETS)
+        self._duplicates = self._metrics.counter('duplicate_pages',
+                                                 'Pages not parsed being duplicates', 'kind')
+        self._parseSaved = self._metrics.counter('parse_seconds_saved',
+                                                 'Estimated parse time saved by the duplicates')
+        self._seeded = self._metrics.counter('seeded_urls', 'Urls enqueued from sitemaps and feeds')
+        self._retried = self._metrics.counter('retries', 'Requests retried after a transient error')
+        self._notDue = self._metrics.counter('not_due_pages',
+                                             'Pages read from the cache, not changed since '
+                                             'the previous crawl')
+        self._linksSaved = self._metrics.counter('links_saved',
+                                                 'Links not processed again thanks to the duplicates')
+        self._metrics.gauge('frontier_queued', 'Urls waiting in the frontier',
+                            self._frontier.qsize)
+        self._metrics.gauge('pages_queued', 'Pages waiting to be parsed', self._pages.qsize)
+        self._metrics.gauge('pending_work', 'Urls and pages not completed yet',
+                            self._tracker.pending)
+        self._metrics.gauge('producers', 'Producer tasks',
+                            lambda: len(self._producers) - self._retireProducers)
+        self._metrics.gauge('consumers', 'Consumer tasks',
+                            lambda: len(self._consumers) - self._retireConsumers)
 
     def get_links(self, htmlPage: HttpResult, links: list[str]) -> None: 
         """ Makes the parsing of html page retrieving only the links
@@ -55,118 +212,503 @@ class TaskManager():
         Returns:
             The list of links will be inside the links provided as argument
         """
-        html_doc = LexborHTMLParser(htmlPage.htmlPage)
-        for anchor in html_doc.select('a').matches:
-            if 'href' in anchor.attributes:
-                links.append(anchor.attributes['href'])
+        links.extend(self._parser.get_links(htmlPage))
 
     async def crawl(self) -> None:
         """
         Crawl is the coroutine responsible of running and closing all tasks
         to getting all links available in the webpages of a specific domain
         At the end of its processing, the pages with relative links will be 
-        retrieved with get_all_pages
+        retrieved with get_all_pages.
+        The crawl is completed when no link is waiting to be downloaded
+        and no page is being downloaded or parsed.
         """
-        await self._linksToVisit.put(str(self._baseurl))
-        self._consumers = [asyncio.create_task(self.process_page(), name=f'Parser_{i}')
-                           for i in range(self.max_consumers)]
-        self._producers = [asyncio.create_task(self.produce_html(), 
-                                               name=f'HtmlProducer_{i}')
-                           for i in range(self.max_producers)]
+        state = None
+        if self._checkpoint:
+            if self._resume:
+                state = await asyncio.to_thread(self._checkpoint.load)
+            else:
+                await asyncio.to_thread(self._checkpoint.reset)
+            self._checkpointTask = asyncio.create_task(self._checkpoint.run(),
+                                                       name='Checkpoint')
+        if self._metricsInterval > 0:
+            self._metricsTask = asyncio.create_task(
+                self._metrics.run_logger(self._metricsInterval), name='Metrics')
+        if self._router:
+            # the seed is sent by the coordinator to the shard owning it
+            self._routerTask = asyncio.create_task(self._router.run(self), name='Router')
+        elif state and not state.is_empty():
+            # the restore is a work item, a crawl resumed with no link
+            # left to visit is completed as soon as it's restored
+            self._tracker.add()
+            await self._restore(state)
+            self._tracker.done()
+        else:
+            await self._mark_seen([self._canonicalizer.base_url])
+            if not await self._enqueue(self._canonicalizer.base_url):
+                logger.warning(f'[Crawler] {self._canonicalizer.base_url} disallowed by robots.txt')
+        if self._sitemaps and not self._router:
+            # the seeding is a work item, the crawl can't complete before it
+            self._tracker.add()
+            self._sitemapsTask = asyncio.create_task(self._seed_sitemaps(), name='Sitemaps')
+        self.set_consumers(self.max_consumers)
+        self.set_producers(self.max_producers)
+        if self._autoscaler:
+            self._autoscalerTask = asyncio.create_task(self._autoscaler.run(self),
+                                                       name='Autoscaler')
 
         #await self.monitor_crawler()
         
         logger.debug(f'[Crawler] Waiting for stop...')
-        await self._stop.wait()
-        logger.info(f'[Crawler] Received Stop Event! Shutdown...')
+        completed = asyncio.create_task(self._wait_completion(), name='Completion')
+        failed = asyncio.create_task(self._failure.wait(), name='Failure')
+        try:
+            done, _ = await asyncio.wait([completed, failed],
+                                         return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            completed.cancel()
+            failed.cancel()
+        if completed in done:
+            logger.info(f'[Crawler] No work left! Shutdown...')
+        else:
+            logger.error(f'[Crawler] A task exited unexpectedly! Shutdown...')
         await self.shutdown()
+        if self._failedTask is not None:
+            raise self._failedTask.exception()
+        if self._graphOut and self._keepGraph:
+            await asyncio.to_thread(self.write_graph, self._graphOut)
+
+    def write_graph(self, path: str) -> None:
+        """Writes the link graph in the binary format read by
+        models.GraphFile, flagging the links outside the domain"""
+        write_graph(self._graph, path,
+                    lambda url: not self._canonicalizer.is_internal(url))
+        logger.info(f'[Crawler] Graph written in {path}: {self._graph.num_pages()} pages, '
+                    f'{self._graph.num_edges()} links')
+
+    async def _wait_completion(self) -> None:
+        """Waits until no work is left, in all shards for a sharded crawl"""
+        await self._tracker.wait()
+        if self._router is None:
+            return
+        while not await self._router.idle(self._tracker):
+            await self._tracker.wait()
+
+    def add_urls(self, urls: list[str]) -> asyncio.Task:
+        """Enqueues the urls not seen yet (e.g. received from another
+        shard). The urls are registered as work before returning, so
+        the crawl is not completed until they have been enqueued.
+
+        Returns:
+            The task enqueuing the urls
+        """
+        self._tracker.add()
+        return asyncio.create_task(self._add_urls(urls))
+
+    async def _add_urls(self, urls: list[str]) -> int:
+        """Enqueues the urls not seen yet, completing the work item
+        registered by add_urls
+
+        Returns:
+            The amount of urls enqueued
+        """
+        try:
+            newUrls = [url for url in await self._mark_seen(urls)
+                       if self._urlFilter is None or self._allow(url)]
+            return await self._enqueue_many(newUrls) if newUrls else 0
+        finally:
+            self._tracker.done()
+
+    def set_producers(self, count: int) -> None:
+        """Changes the amount of producer tasks (at least 1)"""
+        self._retireProducers = self._scale(self._producers, self._retireProducers,
+                                            max(1, count), self.produce_html, 'HtmlProducer')
+
+    def set_consumers(self, count: int) -> None:
+        """Changes the amount of consumer tasks (at least 1)"""
+        self._retireConsumers = self._scale(self._consumers, self._retireConsumers,
+                                            max(1, count), self.process_page, 'Parser')
+
+    def _scale(self, workers: list[asyncio.Task], retiring: int, count: int,
+               coro, name: str) -> int:
+        """Starts or retires tasks of workers until count tasks are alive.
+        The idle tasks are cancelled immediately, the busy ones retire
+        when their current item is completed.
+
+        Returns:
+            The amount of busy tasks which have to retire
+        """
+        alive = len(workers) - retiring
+        if count > alive:
+            revived = min(retiring, count - alive)
+            retiring -= revived
+            for _ in range(count - alive - revived):
+                task = asyncio.create_task(coro(), name=f'{name}_{self._numSpawned}')
+                task.add_done_callback(self._worker_done)
+                self._numSpawned += 1
+                workers.append(task)
+            return retiring
+        for task in list(workers):
+            if alive <= count:
+                break
+            if task in self._idle:
+                self._idle.discard(task)
+                workers.remove(task)
+                task.cancel()
+                alive -= 1
+        return retiring + alive - count
+
+    def _worker_done(self, task: asyncio.Task) -> None:
+        for workers in (self._producers, self._consumers):
+            if task in workers:
+                workers.remove(task)
+        self._idle.discard(task)
+        if not task.cancelled() and task.exception() and self._failedTask is None:
+            self._failedTask = task
+            self._failure.set()
+
+    def get_load(self) -> dict[str, int]:
+        """Retrieves the amount of tasks and the depth of the queues"""
+        return {'producers': len(self._producers) - self._retireProducers,
+                'consumers': len(self._consumers) - self._retireConsumers,
+                'frontier_queued': self._frontier.qsize(),
+                'frontier_capacity': self._frontier.capacity(),
+                'pages_queued': self._pages.qsize(),
+                'pages_capacity': self._pages.maxsize,
+                'pages_full': self._pages.full(),
+                'pages_bytes': self._pages.nbytes()}
 
     async def produce_html(self):
         """Producer Coroutine downloads the web page"""
-        task = asyncio.current_task().get_name()
+        current = asyncio.current_task()
+        task = current.get_name()
         while True:
-            logger.debug(f'[{task}] - Produce New Page')
-            # MAYBE LOCK IN ORDER TO AVOID THAT MULTIPLE PRODUCER 
-            # READ THE SAME LINK
-            link = await self._linksToVisit.get()
-            if str(link) not in self._visitedLinks:
-                logger.debug(f'[{task}] - Links to visit {self._linksToVisit.qsize()}')
-                logger.debug(f'[{task}] - GET {str(link)}')
-                httpResult = await self._httpmanager.fetch(str(link))
-                logger.debug(f'[{task}] - GOT RESPONSE FROM {str(link)}')
+            if self._retireProducers:
+                self._retireProducers -= 1
+                logger.debug('[%s] - Retired', task)
+                return
+            logger.debug('[%s] - Produce New Page', task)
+            # each link is enqueued only once (see process_links),
+            # so it can be downloaded without further checks
+            self._idle.add(current)
+            try:
+                link = await self._frontier.get()
+            finally:
+                self._idle.discard(current)
+            httpResult: HttpResult | None = None
+            retryDelay: float | None = None
+            firstAttempt = link not in self._attempts
+            try:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug('[%s] - Links to visit %d', task, self._frontier.qsize())
+                if self._history and not self._history.is_due(link):
+                    # not changed since the previous crawl, no request
+                    httpResult = await self._httpmanager.fetch_cached(link)
+                    if httpResult is not None:
+                        self._notDue.inc()
+                if httpResult is None:
+                    logger.debug('[%s] - GET %s', task, link)
+                    httpResult = await self._httpmanager.fetch(link)
+                    retryDelay = self._retry_delay(link, httpResult, task)
+                    if retryDelay is not None:
+                        continue
+                    if self._history and httpResult.htmlPage:
+                        self._history.record(link, httpResult.htmlPage)
+                self._numFetched += 1
+                logger.debug('[%s] - GOT RESPONSE FROM %s', task, link)
                 if httpResult.htmlPage:
-                    logger.debug(f'[{task}] - ADD TO PAGES')
-                    logger.debug(f'[{task}] - Queue {self._pages} {id(self._pages)}')
+                    logger.debug('[%s] - ADD TO PAGES', task)
+                    # the page is a new work item for the consumers
+                    self._tracker.add()
                     await self._pages.put(httpResult)
-                    logger.debug(f'[{task}] - ADDED TO PAGE')
+                    logger.debug('[%s] - ADDED TO PAGE', task)
                 else:
-                    logger.debug(f'[{task}] - EMPTY PAGE')
-                async with self._visitedLock:
-                    self._visitedLinks.add(str(link))
-            else:
-                logger.debug(f'[{task}] - {str(link)} already visited')
-            self._linksToVisit.task_done()
-            checkAgain=1
-            while(self._linksToVisit.empty()):
-                checkAgain+=1
-                await asyncio.sleep(checkAgain)
+                    logger.debug('[%s] - EMPTY PAGE', task)
+                    if self._checkpoint:
+                        self._checkpoint.done(link)
+            finally:
+                if httpResult is None:
+                    self._frontier.release(link)
+                else:
+                    # the failures of the host feed its circuit breaker,
+                    # once per url: the retries run late, when the other
+                    # urls are done, their failures would look consecutive
+                    self._frontier.release(link, firstAttempt and
+                                           httpResult.is_host_failure(),
+                                           httpResult.retry_after)
+                if retryDelay is not None:
+                    # still a work item, back in the frontier until its delay
+                    self._frontier.retry(link, retryDelay)
+                else:
+                    self._tracker.done()
+
+    def _retry_delay(self, url: str, result: HttpResult, task: str) -> float | None:
+        """Retrieves the seconds before retrying a url failed with a
+        transient error, None if it's not retried"""
+        attempt = self._attempts.get(url, 0)
+        delay = self._httpmanager.retry_delay(result, attempt)
+        if delay is None:
+            self._attempts.pop(url, None)
+            return None
+        self._attempts[url] = attempt + 1
+        self._retried.inc()
+        logger.info('[%s] - Retry %d of %s in %.2f s (%s)', task, attempt + 1, url, delay,
+                    result.status or result.error)
+        return delay
 
     async def process_page(self):
         """Consumer Coroutine parse the web page to get all 
         available links.
         """
-        task = asyncio.current_task().get_name()
+        current = asyncio.current_task()
+        task = current.get_name()
         while True:
-            logger.debug(f'[{task}] - Consume New Page from {id(self._pages)}')
-            page: HttpResult = await self._pages.get()
-            logger.debug(f'[{task}] - Parse page {page.pageUrl}')
-            foundLinks: list[str] = []
-            logger.debug(f'[{task}] - Look for links inside {page.pageUrl}')
-            self.get_links(page, foundLinks)
-            logger.info(f'[{task}] - Found {len(foundLinks)} in {page.pageUrl}')
-            for link in foundLinks:
-                await self.process_link(link, page.pageUrl)
-            else:
-                # IF NO LINK ARE FOUND, THE PAGE MUST BE CREATED
-                logger.info(f'[{task}] - NO LINKS FOUND in {page.pageUrl}')
-                self._add_link_to_page(page.pageUrl, None)
-            self._pages.task_done()
-            if self._pages.empty() and self._linksToVisit.empty():
-                logger.info(f'[{task}] - Completed No other thinks to do')
-                self._stop.set()
-            else:
-                logger.debug(f'[{task}] - Get new page')
+            if self._retireConsumers:
+                self._retireConsumers -= 1
+                logger.debug('[%s] - Retired', task)
+                return
+            logger.debug('[%s] - Consume New Page from %d', task, id(self._pages))
+            self._idle.add(current)
+            try:
+                # busy as soon as a page is assigned, a spilled page is
+                # still being read back and the task must not be cancelled
+                queuedAt, page = await self._pages.get(lambda: self._idle.discard(current))
+            finally:
+                self._idle.discard(current)
+            self._pagesWait.observe(time.perf_counter() - queuedAt)
+            try:
+                if self._dedup and await self._skip_duplicate(page, task):
+                    continue
+                logger.debug('[%s] - Parse page %s', task, page.pageUrl)
+                logger.debug('[%s] - Look for links inside %s', task, page.pageUrl)
+                t1 = time.perf_counter()
+                foundLinks: list[str] = await self._parser.parse(page)
+                self._parseTime.observe(time.perf_counter() - t1)
+                self._linksPerPage.observe(len(foundLinks))
+                logger.info('[%s] - Found %d in %s', task, len(foundLinks), page.pageUrl)
+                pageLinks = await self.process_links(foundLinks, page.pageUrl)
+                self._numParsed += 1
+                if self._dedup:
+                    self._linkCounts[page.pageUrl] = len(pageLinks)
+                if self._checkpoint:
+                    self._checkpoint.page(page.pageUrl, pageLinks)
+                if self._output:
+                    await self._output.write(page.pageUrl, pageLinks)
+            finally:
+                self._pages.task_done()
+                self._tracker.done()
+            logger.debug('[%s] - Get new page', task)
+
+    async def _skip_duplicate(self, page: HttpResult, task: str) -> bool:
+        """Checks if the content of the page has already been parsed
+        at another url, the duplicates are only counted. The page is
+        hashed in a thread, only the lookup runs on the event loop.
 
-    async def process_link(self, link: str, pageUrl: str):
+        Returns:
+            True if the page is a duplicate and must not be parsed
+        """
+        fingerprints = await asyncio.to_thread(self._dedup.fingerprint, page.htmlPage)
+        duplicate = self._dedup.match(page.pageUrl, fingerprints)
+        if duplicate is None:
+            return False
+        canonical, kind = duplicate
+        logger.info('[%s] - %s is a %s duplicate of %s', task, page.pageUrl, kind, canonical)
+        self._duplicates.inc(label=kind)
+        self._parseSaved.inc(self._parseTime.mean())
+        self._linksSaved.inc(self._linkCounts.get(canonical, 0))
+        if self._checkpoint:
+            self._checkpoint.alias(page.pageUrl, canonical)
+        if self._output:
+            await self._output.alias(page.pageUrl, canonical)
+        return True
+
+    async def process_link(self, link: str, pageUrl: str) -> str | None:
         """
         Coroutine to process a link in order to validate it
         and adding it at visited pages. Only HTTP/HTTPS URL
-        are considered valid. 
+        are considered valid. Relative links are resolved
+        against the page where they have been found.
+
+        Returns:
+            The canonical url of the link, None if it's not valid
         """
-        newLink = utils.is_valid_url(link)
-        if newLink:
-            # VALID LINK CHECK IF it's already visited or not 
-            # and if it's external or inside the same domain
-            async with self._visitedLock:
-                if not utils.is_external(newLink, self._baseurl) and \
-                    str(link) not in self._visitedLinks:
-                    logger.debug(f'[process_link] - Adding New Link {str(link)}')
-                    logger.debug(f'[process_link] - VisitedLinks {str(self._visitedLinks)}')
-                    await self._linksToVisit.put(newLink)
-            self._add_link_to_page(pageUrl, newLink)
-        else:
-            # Check if it's relative url
-            isChildPage, newLink = utils.is_relative_to_base(link, self._baseurl)
-            if isChildPage:
-                async with self._visitedLock:
-                    if str(newLink) not in self._visitedLinks:
-                        logger.debug(f'[process_link] - Adding Child Page {str(link)}')
-                        logger.debug(f'[process_link] - VisitedLinks {str(self._visitedLinks)}')
-                        await self._linksToVisit.put(newLink)
-                    self._add_link_to_page(pageUrl, newLink)
+        resolved = self._canonicalizer.resolve(link, pageUrl) if link else None
+        if resolved is None:
+            logger.debug('Invalid url %s', link)
+            return None
+        newLink, isInternal = resolved
+        if isInternal and self._urlFilter:
+            newLink = self._urlFilter.rewrite(newLink)
+        if isInternal and self._router and not self._router.is_local(newLink):
+            # owned by another shard, which checks if it's already seen
+            self._router.send(newLink)
+        elif isInternal:
+            # VALID LINK INSIDE THE SAME DOMAIN CHECK IF
+            # it's already queued, visited or not
+            if await self._mark_seen([newLink]) and \
+                (self._urlFilter is None or self._allow(newLink)):
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug('[process_link] - Adding New Link %s', newLink)
+                    logger.debug('[process_link] - Seen links %d', len(self._seen))
+                await self._enqueue(newLink)
+        self._add_link_to_page(pageUrl, newLink)
+        return newLink
+
+    async def process_links(self, links: list[str], pageUrl: str) -> list[str]:
+        """
+        Coroutine processing all the links of a page at once, the
+        batch version of process_link: the links are resolved and
+        deduplicated within the page, then they are checked against
+        the seen set in one batch (in a thread for a set on disk), the
+        new ones are enqueued together and the page is added to the
+        graph with one call. The cost of the frontier depends on the
+        new links, not on the anchors of the page.
+
+        Returns:
+            The canonical urls of the valid links, in page order
+        """
+        resolve = self._canonicalizer.resolve
+        pageLinks: dict[str, None] = {}
+        internal: list[str] = []
+        for link in dict.fromkeys(links):
+            resolved = resolve(link, pageUrl) if link else None
+            if resolved is None:
+                continue
+            newLink, isInternal = resolved
+            if isInternal and self._urlFilter:
+                newLink = self._urlFilter.rewrite(newLink)
+            if newLink in pageLinks:
+                continue
+            pageLinks[newLink] = None
+            if not isInternal:
+                continue
+            if self._router and not self._router.is_local(newLink):
+                # owned by another shard, which checks if it's already seen
+                self._router.send(newLink)
             else:
-                logger.debug(f'Invalid url {link}')
-    
+                internal.append(newLink)
+        if internal:
+            newLinks = [url for url in await self._mark_seen(internal)
+                        if self._urlFilter is None or self._allow(url)]
+            if newLinks:
+                logger.debug('[process_links] - Adding %d new links of %s', len(newLinks), pageUrl)
+                await self._enqueue_many(newLinks)
+        if self._keepGraph:
+            # a page without links is added anyway
+            self._graph.add_edges(pageUrl, list(pageLinks))
+        return list(pageLinks)
+
+    async def _seed_sitemaps(self) -> None:
+        """Enqueues the pages of the website found in the sitemaps and
+        in the feeds, in batches"""
+        baseUrl = self._canonicalizer.base_url
+        batch: list[str] = []
+        try:
+            entries = self._sitemaps.entries(self._httpmanager.stream_resource, baseUrl,
+                                             self._frontier.sitemaps(baseUrl))
+            async for entry in entries:
+                resolved = self._canonicalizer.resolve(entry.url, baseUrl)
+                if resolved is None or not resolved[1]:
+                    continue
+                url = self._urlFilter.rewrite(resolved[0]) if self._urlFilter else resolved[0]
+                if self._history:
+                    self._history.observe(url, entry.lastmod, entry.changefreq)
+                batch.append(url)
+                if len(batch) >= 256:
+                    await self._seed(batch)
+                    batch = []
+            await self._seed(batch)
+            if self._history:
+                # the lastmods no longer declared are stale
+                self._history.forget_undeclared()
+        except Exception as e:
+            logger.error(f'[Sitemaps] - Seeding interrupted: {e!r}')
+        finally:
+            self._tracker.done()
+        logger.info(f'[Sitemaps] - {self._sitemaps.found} pages found in '
+                    f'{self._sitemaps.fetched} documents')
+
+    async def _seed(self, urls: list[str]) -> None:
+        self._tracker.add()
+        self._seeded.inc(await self._add_urls(urls))
+
+    def _discard(self, url: str) -> None:
+        """Completes a url discarded by the frontier"""
+        logger.debug('[Frontier] - Discarded %s', url)
+        self._attempts.pop(url, None)
+        self._tracker.done()
+
+    async def _mark_seen(self, urls: list[str]) -> list[str]:
+        """Adds the urls to the seen set in one batch, a blocking set
+        (on disk) is updated in a thread
+
+        Returns:
+            The urls never seen before, in order
+        """
+        if self._seen.blocking:
+            return await asyncio.to_thread(self._seen.add_many, urls)
+        return self._seen.add_many(urls)
+
+    def _allow(self, url: str) -> bool:
+        """Checks a new link with the UrlFilter"""
+        rule = self._urlFilter.check(url)
+        if rule is not None:
+            logger.debug('[process_link] - Filtered %s by rule %s', url, rule)
+            return False
+        return True
+
+    async def _enqueue(self, url: str, record: bool = True) -> bool:
+        """Adds a new url to the frontier as a new work item
+
+        Returns:
+            False if the url has been discarded by the frontier
+        """
+        self._tracker.add()
+        if not await self._frontier.put(url):
+            self._tracker.done()
+            return False
+        if self._checkpoint and record:
+            self._checkpoint.enqueued(url)
+        return True
+
+    async def _enqueue_many(self, urls: list[str]) -> int:
+        """Adds a batch of new urls to the frontier as new work items
+
+        Returns:
+            The amount of urls not discarded by the frontier
+        """
+        self._tracker.add(len(urls))
+        added = await self._frontier.put_many(urls)
+        if len(added) < len(urls):
+            self._tracker.done(len(urls) - len(added))
+        if self._checkpoint:
+            for url in added:
+                self._checkpoint.enqueued(url)
+        return len(added)
+
+    async def _restore(self, state: CheckpointState) -> None:
+        """Restores the crawl state loaded from the checkpoint, the
+        pages already parsed are written again to the output, which is
+        truncated when the sink is opened"""
+        for pageUrl, links in state.pages.items():
+            if self._keepGraph:
+                if links:
+                    self._graph.add_edges(pageUrl, links)
+                else:
+                    self._graph.add_page(pageUrl)
+            if self._output:
+                await self._output.write(pageUrl, links)
+        if self._dedup:
+            self._dedup.aliases.update(state.aliases)
+        if self._output:
+            for pageUrl, canonical in state.aliases.items():
+                await self._output.alias(pageUrl, canonical)
+        await self._mark_seen(list(state.seen))
+        for url in state.pending:
+            await self._enqueue(url, record=False)
+        logger.info(f'[Crawler] Resumed {len(state.pages)} pages, '
+                    f'{len(state.pending)} links to visit')
+
     async def monitor_crawler(self) -> None:
         """ 
         Manages the queues in order to understand
@@ -175,25 +717,38 @@ class TaskManager():
         """
         logger.debug('[Monitor] Start')
         await asyncio.sleep(10)
-        while not self._linksToVisit.empty() and \
+        while not self._frontier.empty() and \
             not self._pages.empty():
             logger.debug('[Monitor] Retry Check in 10 s')
             await asyncio.sleep(1)
-            logger.debug(f'[Monitor] LinkToVisit Empty {self._linksToVisit.empty()}')
+            logger.debug(f'[Monitor] LinkToVisit Empty {self._frontier.empty()}')
             logger.debug(f'[Monitor] Pages Empty {self._pages.empty()}')
-        await self._linksToVisit.join()
-        await self._pages.join()
+        await self._tracker.wait()
         logger.debug('Monitor End')
 
-    def _add_link_to_page(self, pageUrl: str, link: HttpUrl | None):
+    def _add_link_to_page(self, pageUrl: str, link: HttpUrl | str | None):
+        if not self._keepGraph:
+            return
+        if link:
+            self._graph.add_edge(pageUrl, str(link))
+        else:
+            self._graph.add_page(pageUrl)
+
+    def _build_page(self, pageUrl: str) -> Page | None:
+        """Creates the Page object of a crawled page from the link graph"""
         try:
-            if pageUrl not in self._pagesVisited:
-                self._pagesVisited[pageUrl] = Page(url=Link(url=pageUrl, visited=True))
-            if link:
-                self._pagesVisited[pageUrl].add_link(Link(url=link))
+            page = Page(url=Link(url=pageUrl, visited=True), links=set())
         except ValidationError as e:
-            logger.error(f'[add_link_to_page] - Error some urls are invalid')
-            logger.error(f'[add_link_to_page] - {e.errors()}')
+            logger.error(f'[build_page] - Error invalid page url {pageUrl}')
+            logger.error(f'[build_page] - {e.errors()}')
+            return None
+        for link in self._graph.links(pageUrl):
+            try:
+                page.add_link(Link(url=link))
+            except ValidationError as e:
+                logger.error(f'[build_page] - Error invalid link {link} in {pageUrl}')
+                logger.error(f'[build_page] - {e.errors()}')
+        return page
 
 
     def print_stats(self, time: float) -> None:
@@ -201,10 +756,20 @@ class TaskManager():
         Require an execution of crawl before calling it, otherwise
         all zero values are retrieved
         """
-        logger.info("to_visit: %s", str(self._linksToVisit.qsize()))
-        logger.info("visited: %s", str(len(self._visitedLinks)))
-        if len(self._visitedLinks) > 0:
-            logger.info("Avg time per page: %s", str(time/len(self._visitedLinks)))
+        logger.info("to_visit: %s", str(self._frontier.qsize()))
+        logger.info("frontier: %s", str(self._frontier.stats()))
+        logger.info("visited: %s", str(self._numFetched))
+        if self._numFetched > 0:
+            logger.info("Avg time per page: %s", str(time/self._numFetched))
+        logger.info("seen: %s", str(self._seen.stats()))
+        logger.info("connections: %s", str(self._httpmanager.get_stats()))
+        if self._dedup:
+            logger.info("dedup: %s", str(self._dedup.stats()))
+        if self._urlFilter:
+            logger.info("filtered: %s", str(self._urlFilter.stats()))
+        if self._history:
+            logger.info("history: %s", str(self._history.stats()))
+        logger.info("metrics: %s", self._metrics.summary())
 
     def get_visited_pages(self, visited: list[str]) -> None:
         """Retrieves the links of visited pages
@@ -212,8 +777,7 @@ class TaskManager():
         Args:
             visited (list[str]): list to fill with the visited web page's url 
         """
-        for url in  self._pagesVisited.keys():
-            visited.append(url)
+        visited.extend(self._graph.pages())
     
     def get_all_pages(self) -> dict[str, Page]:
         """Retrieves the access to the whole tree of 
@@ -222,33 +786,65 @@ class TaskManager():
         Returns:
             A dictionary of <url (str), page (Page)> with all downloaded 
             and visited pages. Page will contain only its own url and the
-            referred links  
+            referred links.
+            The Page objects are created from the link graph at the first
+            call and recreated only if the graph has changed.
         """
-        return self._pagesVisited
+        if self._pagesCacheVersion != self._graph.version:
+            self._pagesCache = {}
+            for pageUrl in self._graph.pages():
+                page = self._build_page(pageUrl)
+                if page:
+                    self._pagesCache[pageUrl] = page
+            self._pagesCacheVersion = self._graph.version
+        return self._pagesCache
     
+    def get_metrics(self) -> MetricsRegistry:
+        """Retrieves the registry with the metrics of the crawl"""
+        return self._metrics
+
+    def get_aliases(self) -> dict[str, str]:
+        """Retrieves the duplicate pages which have not been parsed
+
+        Returns:
+            A dictionary of <url of the duplicate, url of the page
+            with the same content>, empty without a ContentDeduplicator
+        """
+        return dict(self._dedup.aliases) if self._dedup else {}
+
+    def get_graph(self) -> LinkGraph:
+        """Retrieves the compact link graph built during the crawling,
+        it doesn't require to create any Page object.
+        """
+        return self._graph
+
     def get_no_visit_pages(self, noVisited: dict[str, set[HttpUrl]]) -> None :
-        """Retrieves the access to the whole tree of 
-        downloaded pages
+        """Retrieves the links which have not been visited for each
+        downloaded page
         
-        Returns:
-            A dictionary of <url (str), page (Page)> with all downloaded 
-            and visited pages. Page will contain only its own url and the
-            referred links  
+        Args:
+            noVisited (dict[str, set[HttpUrl]]): dictionary to fill with
+            <url (str), links not visited (set[HttpUrl])>
         """
-        for k, v in self._pagesVisited.items(): 
-            if k not in noVisited:
-                for l in v.links:
-                    if l not in noVisited:
-                        noVisited[k].add(l.url)
+        for pageUrl in self._graph.pages():
+            for link in self._graph.links(pageUrl):
+                if not self._graph.has_page(link):
+                    try:
+                        noVisited.setdefault(pageUrl, set()).add(HttpUrl(link))
+                    except ValidationError:
+                        logger.error(f'[get_no_visit_pages] - Error invalid link {link}')
 
     def get_num_html_pages(self) -> int:
         """ Retrieves the amount of visited pages
         into a domain.
 
         Returns:
-            The amount of visited pages
+            The amount of visited pages, without the link graph
+            (keep_graph=False) the pages parsed by this crawl
         """
-        return len(self._pagesVisited)
+        if not self._keepGraph:
+            return self._numParsed
+        return self._graph.num_pages()
     
     async def shutdown(self):
         """Close everything that is still opened"""
@@ -257,5 +853,34 @@ class TaskManager():
 
         await asyncio.gather(*self._consumers, *self._producers, 
                          return_exceptions=True)
+        if self._sitemapsTask:
+            self._sitemapsTask.cancel()
+            await asyncio.gather(self._sitemapsTask, return_exceptions=True)
+            self._sitemapsTask = None
+        if self._routerTask:
+            self._routerTask.cancel()
+            await asyncio.gather(self._routerTask, return_exceptions=True)
+            self._routerTask = None
+        if self._autoscalerTask:
+            self._autoscalerTask.cancel()
+            await asyncio.gather(self._autoscalerTask, return_exceptions=True)
+            self._autoscalerTask = None
+        if self._metricsTask:
+            self._metricsTask.cancel()
+            await asyncio.gather(self._metricsTask, return_exceptions=True)
+            self._metricsTask = None
+        if self._checkpointTask:
+            self._checkpointTask.cancel()
+            await asyncio.gather(self._checkpointTask, return_exceptions=True)
+            self._checkpointTask = None
+        if self._checkpoint:
+            await self._checkpoint.flush()
+        if self._history:
+            await asyncio.to_thread(self._history.save)
         if self._httpmanager:
-            await self._httpmanager.close()
\ No newline at end of file
+            await self._httpmanager.close()
+        await self._parser.close()
+        if self._output:
+            await self._output.close()
+        self._seen.close()
+        self._pages.close()
\ No newline at end of file
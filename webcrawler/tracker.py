@@ -0,0 +1,42 @@
+import asyncio
+
+
+class WorkTracker:
+    """WorkTracker counts the work items still in flight inside the
+    crawler pipeline, so the crawl can be considered completed as soon
+    as nothing is queued, downloaded or parsed anymore.
+
+    Each link enqueued and each page handed to the consumers is one
+    work item: add() must be called before the item is published and
+    done() only after it has been fully processed, including the
+    registration of the items generated from it. In this way the
+    counter never reaches zero while a fetch or a parse is running.
+    """
+    def __init__(self):
+        self._pending: int = 0
+        self._idle: asyncio.Event = asyncio.Event()
+
+    def add(self, count: int = 1) -> None:
+        """Registers new work items"""
+        self._pending += count
+        self._idle.clear()
+
+    def done(self, count: int = 1) -> None:
+        """Marks work items as completed
+
+        Raises:
+            ValueError if more items are completed than registered
+        """
+        if count > self._pending:
+            raise ValueError('done() called more times than add()')
+        self._pending -= count
+        if self._pending == 0:
+            self._idle.set()
+
+    def pending(self) -> int:
+        """Retrieves the amount of work items in flight"""
+        return self._pending
+
+    async def wait(self) -> None:
+        """Waits until all registered work items have been completed"""
+        await self._idle.wait()
@@ -0,0 +1,182 @@
+import mimetypes
+import re
+from fnmatch import fnmatchcase
+from urllib.parse import urlsplit
+from metrics import MetricsRegistry
+
+# resources which are never html pages
+BLOCKED_EXTENSIONS = frozenset({
+    'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'odt', 'ods', 'odp', 'rtf', 'epub',
+    'jpg', 'jpeg', 'png', 'gif', 'bmp', 'svg', 'webp', 'ico', 'tif', 'tiff', 'avif',
+    'mp3', 'wav', 'ogg', 'flac', 'm4a', 'mp4', 'avi', 'mov', 'mkv', 'webm', 'wmv', 'flv',
+    'zip', 'rar', '7z', 'tar', 'gz', 'tgz', 'bz2', 'xz', 'iso', 'dmg', 'exe', 'msi', 'apk', 'bin',
+    'css', 'js', 'json', 'woff', 'woff2', 'ttf', 'otf', 'eot',
+})
+# media types (or prefixes ending with '/') guessed from the extension
+BLOCKED_MIME_TYPES = ('image/', 'audio/', 'video/', 'font/', 'application/pdf',
+                      'application/zip', 'application/octet-stream')
+# tracking and session parameters, shell-style patterns
+STRIPPED_PARAMS = ('utm_*', 'gclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid',
+                   'sessionid', 'jsessionid', 'phpsessid', 'sid')
+NUMBER_REGEX = re.compile(r'\d+')
+
+EXTENSION = 'extension'
+MIME_TYPE = 'mime_type'
+DEPTH = 'depth'
+PATTERN = 'pattern'
+TRAP = 'trap'
+RULES = (EXTENSION, MIME_TYPE, DEPTH, PATTERN, TRAP)
+
+
+class UrlFilter:
+    """UrlFilter decides which links are worth downloading before
+    they are enqueued, so no request is spent on resources which are
+    not html pages or on the endless url spaces of a website (crawler
+    traps such as calendars and faceted searches):
+    - extension: the last path segment ends with a blocked extension
+    - mime_type: the media type guessed from the extension is blocked
+    - depth: the path has more than max_depth segments
+    - trap: a path segment is repeated more than max_repeated_segments
+      times (e.g. /a/b/a/b/a/b from relative links)
+    - pattern: more than max_urls_per_pattern urls share the same
+      pattern, that is the path with the numbers replaced and the
+      names of the query parameters without their values
+    Each link is first rewritten by rewrite(): the query parameters
+    matching strip_params are removed and, with allowed_params, only
+    the parameters in the list are kept, so the same page is not
+    downloaded once for each tracking parameter.
+    The urls rejected are counted for each rule in hits and in the
+    filtered_urls metric.
+
+    Attributes:
+        blocked_extensions: extensions never downloaded (lowercase, without dot)
+        blocked_mime_types: media types never downloaded, an entry ending
+                            with '/' blocks the whole type
+        strip_params: query parameters removed, shell-style patterns
+        allowed_params: the only query parameters kept, None to keep all
+        max_depth: maximum amount of path segments, None for no limit
+        max_urls_per_pattern: maximum amount of urls for each pattern,
+                              None for no limit
+        max_repeated_segments: maximum occurrences of the same path
+                               segment, None for no limit
+        hits: urls rejected by each rule
+    """
+    def __init__(self, blocked_extensions=BLOCKED_EXTENSIONS,
+                 blocked_mime_types=BLOCKED_MIME_TYPES,
+                 strip_params=STRIPPED_PARAMS,
+                 allowed_params=None,
+                 max_depth: int | None = None,
+                 max_urls_per_pattern: int | None = None,
+                 max_repeated_segments: int | None = 3,
+                 metrics: MetricsRegistry | None = None):
+        self.blocked_extensions = frozenset(ext.lower().lstrip('.') for ext in blocked_extensions)
+        self.blocked_mime_types = tuple(blocked_mime_types)
+        self.strip_params = tuple(param.lower() for param in strip_params)
+        self.allowed_params = frozenset(allowed_params) if allowed_params is not None else None
+        self.max_depth = max_depth
+        self.max_urls_per_pattern = max_urls_per_pattern
+        self.max_repeated_segments = max_repeated_segments
+        self.hits: dict[str, int] = dict.fromkeys(RULES, 0)
+        self.stripped: int = 0
+        self._patterns: dict[str, int] = {}
+        self._mimeTypes: dict[str, bool] = {}
+        self.metrics: MetricsRegistry | None = None
+        if metrics is not None:
+            self.use_metrics(metrics)
+
+    def use_metrics(self, registry: MetricsRegistry) -> None:
+        """Counts the urls rejected by each rule in registry"""
+        self.metrics = registry
+        self._filtered = registry.counter('filtered_urls', 'Urls not enqueued by rule', 'rule')
+        self._stripped = registry.counter('stripped_urls', 'Urls rewritten without some '
+                                          'query parameters')
+
+    def rewrite(self, url: str) -> str:
+        """Retrieves the url without the query parameters stripped"""
+        base, sep, query = url.partition('?')
+        if not sep:
+            return url
+        allParams = query.split('&')
+        params = [param for param in allParams if self._keep(param)]
+        if len(params) == len(allParams):
+            return url
+        self.stripped += 1
+        if self.metrics is not None:
+            self._stripped.inc()
+        return f'{base}?{"&".join(params)}' if params else base
+
+    def _keep(self, param: str) -> bool:
+        name = param.split('=', 1)[0]
+        if self.allowed_params is not None:
+            return name in self.allowed_params
+        lowered = name.lower()
+        return not any(fnmatchcase(lowered, pattern) for pattern in self.strip_params)
+
+    def check(self, url: str) -> str | None:
+        """Checks if a new url can be downloaded, it must be called
+        once for each url (the patterns count the urls accepted)
+
+        Returns:
+            None if the url is accepted, otherwise the rule rejecting it
+        """
+        parts = urlsplit(url)
+        segments = [segment for segment in parts.path.split('/') if segment]
+        rule = self._check_path(segments)
+        if rule is None and self.max_urls_per_pattern is not None:
+            pattern = self.pattern(parts.path, parts.query)
+            count = self._patterns.get(pattern, 0)
+            if count >= self.max_urls_per_pattern:
+                rule = PATTERN
+            else:
+                self._patterns[pattern] = count + 1
+        if rule is not None:
+            self.hits[rule] += 1
+            if self.metrics is not None:
+                self._filtered.inc(label=rule)
+        return rule
+
+    def allow(self, url: str) -> bool:
+        return self.check(url) is None
+
+    def _check_path(self, segments: list[str]) -> str | None:
+        if segments:
+            last = segments[-1]
+            dot = last.rfind('.')
+            if dot > 0:
+                extension = last[dot + 1:].lower()
+                if extension in self.blocked_extensions:
+                    return EXTENSION
+                if self.blocked_mime_types and self._blocked_mime_type(extension):
+                    return MIME_TYPE
+        if self.max_depth is not None and len(segments) > self.max_depth:
+            return DEPTH
+        if self.max_repeated_segments is not None and \
+            len(segments) > self.max_repeated_segments:
+            counts: dict[str, int] = {}
+            for segment in segments:
+                counts[segment] = counts.get(segment, 0) + 1
+                if counts[segment] > self.max_repeated_segments:
+                    return TRAP
+        return None
+
+    def _blocked_mime_type(self, extension: str) -> bool:
+        blocked = self._mimeTypes.get(extension)
+        if blocked is None:
+            mimeType = mimetypes.guess_type(f'file.{extension}', strict=False)[0] or ''
+            blocked = any(mimeType.startswith(entry) if entry.endswith('/') else mimeType == entry
+                          for entry in self.blocked_mime_types) if mimeType else False
+            self._mimeTypes[extension] = blocked
+        return blocked
+
+    @staticmethod
+    def pattern(path: str, query: str = '') -> str:
+        """Retrieves the pattern of a url: the numbers of the path are
+        replaced by '#' and the values of the query are removed"""
+        pattern = NUMBER_REGEX.sub('#', path)
+        if query:
+            names = sorted({param.split('=', 1)[0] for param in query.split('&') if param})
+            pattern = f'{pattern}?{"&".join(names)}'
+        return pattern
+
+    def stats(self) -> dict[str, int]:
+        return {**self.hits, 'stripped': self.stripped}
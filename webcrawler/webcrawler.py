@@ -1,24 +1,95 @@
 import argparse
-import asyncio
+import atexit
 import sys
 import logging
 import logging.config
 import time
-from pydantic import HttpUrl, ValidationError
-from models import Link, Page
-from utils import is_valid_url
-from taskmanager import TaskManager
-from network.httpmanager import HttpManager
+from typing import TYPE_CHECKING
+from logqueue import LogQueue
+from runtime import LOOPS, run
+
+if TYPE_CHECKING:
+    from models import Page
+
+# the modules of the crawl (asyncio, pydantic, aiohttp, selectolax) are
+# imported by runcrawler and main only when needed, so --help and the
+# validation of the arguments don't pay for them
+EXTRACTORS = ('anchors', 'dom', 'scan')
+PARTITIONS = ('url', 'host')
 
-logging.config.fileConfig('conf/logging.conf')
 logger = logging.getLogger('webcrawler')
 
-async def runcrawler(url: str, debug: bool = False) -> dict[str, Page]:
+async def runcrawler(url: str, debug: bool = False,
+                     cache_dir: str | None = None,
+                     checkpoint_dir: str | None = None,
+                     resume: bool = False,
+                     metrics_port: int | None = None,
+                     metrics_interval: float = 0,
+                     autoscale: bool = False,
+                     output: str | None = None,
+                     graph_out: str | None = None,
+                     dedup: bool = False,
+                     url_filter: bool = False,
+                     max_depth: int | None = None,
+                     max_urls_per_pattern: int | None = None,
+                     connect_timeout: float = 10,
+                     read_timeout: float = 30,
+                     retries: int = 2,
+                     sitemaps: bool = False,
+                     sitemap_urls: list[str] | None = None,
+                     history: str | None = None,
+                     extractor: str = 'anchors',
+                     page_buffer_mb: float | None = None,
+                     spill_dir: str | None = None) -> dict[str, 'Page']:
     """" Coroutine to run the crawler
     
     Args:
         url (str): HTTP url of the domain to start crawling
         web pages.
+        cache_dir (str): folder of the on-disk http cache, the pages
+        already cached are revalidated with a conditional GET.
+        checkpoint_dir (str): folder where the state of the crawl is
+        saved periodically.
+        resume (bool): restart from the checkpoint stored in
+        checkpoint_dir instead of starting a new crawl.
+        metrics_port (int): port of the endpoint exposing the metrics
+        of the crawl (/metrics and /metrics.json).
+        metrics_interval (float): seconds between two log lines with
+        the metrics, 0 to disable them.
+        autoscale (bool): adapt the amount of download and parse tasks
+        to the latency, the errors and the queues of the crawl.
+        output (str): .jsonl or .csv file where each page is written
+        as soon as it has been parsed. The pages are not kept in
+        memory, so an empty dictionary is retrieved.
+        graph_out (str): file where the link graph is written at the
+        end of the crawl in binary format (see models.GraphFile).
+        dedup (bool): skip the pages whose content is the same (or
+        nearly the same) as a page already parsed.
+        url_filter (bool): don't download the links to resources which
+        are not html pages, the tracking parameters and the crawler traps.
+        max_depth (int): maximum amount of path segments of the links
+        downloaded, it enables url_filter.
+        max_urls_per_pattern (int): maximum amount of links downloaded
+        for each url pattern (numbers and query values excluded), it
+        enables url_filter.
+        connect_timeout (float): seconds to open a connection.
+        read_timeout (float): maximum seconds between two reads of a
+        response.
+        retries (int): retries of the requests failed with a transient
+        error (429, 5xx, timeouts).
+        sitemaps (bool): enqueue the pages listed in the sitemaps of
+        robots.txt (or /sitemap.xml).
+        sitemap_urls (list[str]): sitemaps, sitemap indexes, RSS or
+        Atom feeds whose pages are enqueued.
+        history (str): file with the history of the previous crawls,
+        only the pages likely to have changed are downloaded again, the
+        others are read from the cache (it requires cache_dir).
+        extractor (str): engine retrieving the links of the pages, one
+        of 'anchors' (default), 'dom' or 'scan'.
+        page_buffer_mb (float): MiB of the pages waiting to be parsed,
+        instead of a single page.
+        spill_dir (str): directory where the pages exceeding
+        page_buffer_mb are spilled instead of blocking the downloads.
     
     Returns:
         The dictionary built from crawler with visited web pages
@@ -27,14 +98,58 @@ async def runcrawler(url: str, debug: bool = False) -> dict[str, Page]:
         In case of an error during crawling, an empty dictionary
         is retrieved.
     """
+    import asyncio
+    from utils import is_valid_url
+    from taskmanager import TaskManager
+    from autoscaler import Autoscaler
+    from checkpoint import Checkpoint
+    from dedup import ContentDeduplicator
+    from urlfilter import UrlFilter
+    from sitemaps import SitemapSeeder
+    from recrawl import CrawlHistory
+    from pagebuffer import PageBuffer
+    from parsing import Parser, get_extractor
+    from output import open_sink
+    from metrics import MetricsRegistry, MetricsServer
+    from network.httpmanager import HttpManager
+    from network.httpcache import HttpCache
+
     netUrl = is_valid_url(url)
     if not netUrl:
         logger.error(f'invalid url {url}')
         raise ValueError('Invalid Url', url)
     logger.info(f'Starting webcrawler with root page: {netUrl}')
-    taskMgr = TaskManager(netUrl, debug)
+    cache = HttpCache(cache_dir) if cache_dir else None
+    checkpoint = Checkpoint(checkpoint_dir) if checkpoint_dir else None
+    sink = open_sink(output) if output else None
+    seeder = SitemapSeeder(sitemap_urls or [], discover=sitemaps) \
+        if sitemaps or sitemap_urls else None
+    crawlHistory = CrawlHistory(history) if history else None
+    pageBuffer = PageBuffer(max_pages=0, max_bytes=int(page_buffer_mb * 1024 * 1024),
+                            spill=spill_dir is not None, spill_dir=spill_dir) \
+        if page_buffer_mb else None
+    urlFilter = UrlFilter(max_depth=max_depth, max_urls_per_pattern=max_urls_per_pattern) \
+        if url_filter or max_depth is not None or max_urls_per_pattern is not None else None
+    metrics = MetricsRegistry()
+    metricsServer = MetricsServer(metrics, port=metrics_port) if metrics_port is not None else None
+    taskMgr = TaskManager(netUrl, debug=debug,
+                          httpmgr=HttpManager(netUrl, debug=debug, cache=cache, metrics=metrics,
+                                              connect_timeout=connect_timeout,
+                                              read_timeout=read_timeout, retries=retries),
+                          checkpoint=checkpoint, resume=resume,
+                          metrics=metrics, metrics_interval=metrics_interval,
+                          autoscaler=Autoscaler() if autoscale else None,
+                          output=sink, keep_graph=sink is None or graph_out is not None,
+                          graph_out=graph_out,
+                          dedup=ContentDeduplicator() if dedup else None,
+                          url_filter=urlFilter,
+                          sitemaps=seeder, history=crawlHistory,
+                          parser=Parser(get_extractor(extractor)),
+                          page_buffer=pageBuffer)
     foundPages = {}
     try:
+        if metricsServer:
+            await metricsServer.start()
         t1: float = time.time()
         await taskMgr.crawl()
         t2: float = time.time()
@@ -47,7 +162,8 @@ async def runcrawler(url: str, debug: bool = False) -> dict[str, Page]:
         else:
             elapsed = f'{str(elapsedSeconds)} s'
         logger.info(f'Time to complete: {elapsed}')
-        foundPages = taskMgr.get_all_pages()
+        if sink is None:
+            foundPages = taskMgr.get_all_pages()
         logger.info(f'WebCrawler Completed! Found {taskMgr.get_num_html_pages()} pages')
     except (asyncio.exceptions.CancelledError, KeyboardInterrupt, 
             TimeoutError) as e:
@@ -58,10 +174,16 @@ async def runcrawler(url: str, debug: bool = False) -> dict[str, Page]:
         e.with_traceback()
     finally:
         await taskMgr.shutdown()
+        if metricsServer:
+            await metricsServer.stop()
+        if cache:
+            cache.close()
+        if crawlHistory:
+            crawlHistory.close()
         return foundPages
     
-def visit_page(page: Page, 
-               pages: dict[str, Page], 
+def visit_page(page: 'Page', 
+               pages: dict[str, 'Page'], 
                visited: set[str],
                func: any,
                indent=0,):
@@ -81,24 +203,147 @@ def visit_page(page: Page,
 
                 
 
-def visit_pages(pages: dict[str | Page], apply_func:any):
+def visit_pages(pages: dict[str, 'Page'], apply_func:any):
     visited: set[str] = set()
     for link, page in pages.items():
         if link not in visited:
             visit_page(page, pages, visited, apply_func)
     
 
-if __name__  == '__main__':
-    # Start the webcrawler
+def main():
+    """Entry point of the command line: configures the logging, parses
+    the arguments and runs the crawl"""
+    # the loggers of the modules already imported must stay enabled
+    logging.config.fileConfig('conf/logging.conf', disable_existing_loggers=False)
     if len(sys.argv) < 2:
         logger.error('Usage: python webcrawler.py <url>')
         sys.exit(1)
     parser = argparse.ArgumentParser(description='WebCrawler to collect links into page')
     parser.add_argument('url', type=str, help='http or https url like http://example.com')
     parser.add_argument('-d', '--debug', type=int, required=False, default=0, choices=[0, 1])
+    parser.add_argument('--cache-dir', type=str, required=False, default=None,
+                        help='folder of the http cache used to revalidate the pages on recrawls')
+    parser.add_argument('--checkpoint-dir', type=str, required=False, default=None,
+                        help='folder where the state of the crawl is saved periodically')
+    parser.add_argument('--resume', action='store_true',
+                        help='restart from the last checkpoint stored in --checkpoint-dir')
+    parser.add_argument('--metrics-port', type=int, required=False, default=None,
+                        help='port of the endpoint exposing the metrics of the crawl')
+    parser.add_argument('--metrics-interval', type=float, required=False, default=0,
+                        help='seconds between two log lines with the metrics (0 = disabled)')
+    parser.add_argument('--autoscale', action='store_true',
+                        help='adapt the amount of download and parse tasks during the crawl')
+    parser.add_argument('--output', type=str, required=False, default=None,
+                        help='.jsonl or .csv file where the pages are written during the crawl')
+    parser.add_argument('--graph-out', type=str, required=False, default=None,
+                        help='file where the link graph is written in binary format')
+    parser.add_argument('--dedup', action='store_true',
+                        help='skip the pages with the same content as a page already parsed')
+    parser.add_argument('--url-filter', action='store_true',
+                        help='skip non html resources, tracking parameters and crawler traps')
+    parser.add_argument('--max-depth', type=int, required=False, default=None,
+                        help='maximum amount of path segments of the urls downloaded')
+    parser.add_argument('--max-urls-per-pattern', type=int, required=False, default=None,
+                        help='maximum amount of urls downloaded for each url pattern')
+    parser.add_argument('--connect-timeout', type=float, required=False, default=10,
+                        help='seconds to open a connection')
+    parser.add_argument('--read-timeout', type=float, required=False, default=30,
+                        help='maximum seconds between two reads of a response')
+    parser.add_argument('--retries', type=int, required=False, default=2,
+                        help='retries of the requests failed with a transient error')
+    parser.add_argument('--sitemaps', action='store_true',
+                        help='enqueue the pages of the sitemaps declared in robots.txt')
+    parser.add_argument('--sitemap', type=str, action='append', default=None, dest='sitemap_urls',
+                        help='sitemap, sitemap index, RSS or Atom feed to enqueue (repeatable)')
+    parser.add_argument('--history', type=str, required=False, default=None,
+                        help='file with the history used to recrawl only the changed pages')
+    parser.add_argument('--extractor', type=str, required=False, default='anchors',
+                        choices=list(EXTRACTORS),
+                        help='engine retrieving the links: anchors only, full DOM or markup scan')
+    parser.add_argument('--page-buffer-mb', type=float, required=False, default=None,
+                        help='MiB of downloaded pages waiting to be parsed')
+    parser.add_argument('--spill-dir', type=str, required=False, default=None,
+                        help='directory where the pages beyond --page-buffer-mb are spilled')
+    parser.add_argument('--loop', type=str, required=False, default='asyncio', choices=LOOPS,
+                        help='event loop of the crawl, uvloop falls back to asyncio when missing')
+    parser.add_argument('--log-sample', type=int, required=False, default=None,
+                        help='log one out of N info and debug messages of each kind')
+    parser.add_argument('--log-rate-limit', type=float, required=False, default=None,
+                        help='maximum log messages per second of each kind, errors excluded')
+    parser.add_argument('--shards', type=int, required=False, default=1,
+                        help='amount of worker processes crawling a partition of the urls')
+    parser.add_argument('--partition', type=str, required=False, default='url', choices=PARTITIONS,
+                        help='partition the urls across the shards by canonical url or by host')
     args = parser.parse_args()
+    if args.resume and not args.checkpoint_dir:
+        parser.error('--resume requires --checkpoint-dir')
+    if args.history and not args.cache_dir:
+        parser.error('--history requires --cache-dir')
+    if args.spill_dir and not args.page_buffer_mb:
+        parser.error('--spill-dir requires --page-buffer-mb')
+    if args.log_sample is not None and args.log_sample < 1:
+        parser.error('--log-sample must be at least 1')
+    if args.log_rate_limit is not None and args.log_rate_limit <= 0:
+        parser.error('--log-rate-limit must be positive')
+    if args.shards > 1:
+        # the state of these features belongs to a single process
+        for option, value in (('--checkpoint-dir', args.checkpoint_dir),
+                              ('--output', args.output),
+                              ('--metrics-port', args.metrics_port),
+                              ('--sitemaps', args.sitemaps or None),
+                              ('--sitemap', args.sitemap_urls),
+                              ('--history', args.history)):
+            if value is not None:
+                parser.error(f'{option} is not supported with --shards')
+    # from now on the records are written by a background thread
+    logQueue = LogQueue(sample_every=args.log_sample, rate_limit=args.log_rate_limit)
+    logQueue.start()
+    atexit.register(logQueue.stop)
     try:
-        pages = asyncio.run(runcrawler(args.url, args.debug))
+        if args.shards > 1:
+            from utils import is_valid_url
+            from canonical import UrlCanonicalizer
+            from models import write_graph
+            from distributed import crawl_sharded
+
+            netUrl = is_valid_url(args.url)
+            if not netUrl:
+                raise ValueError('Invalid Url', args.url)
+            graph = crawl_sharded(str(netUrl), args.shards, args.partition,
+                                  debug=bool(args.debug), cache_dir=args.cache_dir,
+                                  metrics_interval=args.metrics_interval,
+                                  autoscale=args.autoscale, dedup=args.dedup,
+                                  url_filter=args.url_filter, max_depth=args.max_depth,
+                                  max_urls_per_pattern=args.max_urls_per_pattern,
+                                  connect_timeout=args.connect_timeout,
+                                  read_timeout=args.read_timeout, retries=args.retries,
+                                  extractor=args.extractor,
+                                  page_buffer_mb=args.page_buffer_mb, spill_dir=args.spill_dir,
+                                  loop=args.loop)
+            if args.graph_out:
+                canonicalizer = UrlCanonicalizer(str(netUrl))
+                write_graph(graph, args.graph_out,
+                            lambda url: not canonicalizer.is_internal(url))
+            logger.info(f'WebCrawler Completed! Found {graph.num_pages()} pages')
+            for pageUrl in graph.pages():
+                print(pageUrl.upper())
+                for link in graph.links(pageUrl):
+                    print(f'\t{link}')
+            sys.exit(0)
+        pages = run(runcrawler(args.url, debug=bool(args.debug), cache_dir=args.cache_dir,
+                               checkpoint_dir=args.checkpoint_dir, resume=args.resume,
+                               metrics_port=args.metrics_port,
+                               metrics_interval=args.metrics_interval,
+                               autoscale=args.autoscale, output=args.output,
+                               graph_out=args.graph_out, dedup=args.dedup,
+                               url_filter=args.url_filter, max_depth=args.max_depth,
+                               max_urls_per_pattern=args.max_urls_per_pattern,
+                               connect_timeout=args.connect_timeout,
+                               read_timeout=args.read_timeout, retries=args.retries,
+                               sitemaps=args.sitemaps, sitemap_urls=args.sitemap_urls,
+                               history=args.history, extractor=args.extractor,
+                               page_buffer_mb=args.page_buffer_mb, spill_dir=args.spill_dir),
+                    args.loop)
         visit_pages(pages, print)
     except ValueError as e:
         logger.error(f'Error: {e}')
@@ -107,4 +352,7 @@ if __name__  == '__main__':
     except Exception as e:
         logger.error(f'Unexpected Error: {e}')
         sys.exit(1)
-    
\ No newline at end of file
+
+
+if __name__  == '__main__':
+    main()